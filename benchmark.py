@@ -0,0 +1,821 @@
+# benchmark.py
+# ============================================
+# DECLUTTER DROID - MICRO-BENCHMARKS
+# Runs against fake devices, no phone or API keys needed
+# Usage: python benchmark.py [name] [--runs N]
+#        python benchmark.py pipeline [--scenario clean|demo|full] [--out results.json]
+#        python benchmark.py replay --session Agent-output/sessions/<time> [--speed N]
+#        python benchmark.py startup
+# ============================================
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import capture
+import fleet
+import input_channel
+import ledger
+import ratelimit
+import recorder
+import replay
+import session
+import template_match
+from frame import ScreenFrame
+from fake_device import OUTPUT_FOLDER, FakeDevice, encode_png, encode_raw, load_frames
+
+
+def time_calls(fn, runs):
+    """Return per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {name:<28} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+    return p50
+
+
+# ============================================
+# CAPTURE: PNG screencap vs raw framebuffer
+# ============================================
+def bench_capture(args):
+    """
+    Compare the legacy PNG path against the raw framebuffer path: first
+    decode cost alone (frames pre-encoded, free transfer), then on a
+    modelled phone where the old path also forks `adb exec-out` per frame
+    (--spawn-ms) and waits for device-side PNG compression (--png-ms),
+    both pay the adb connection (--shell-ms), and every byte crosses USB
+    at --usb-mbs (a raw frame is over 10x its PNG). The modelled speedup is
+    only as good as those four numbers.
+    """
+    frames = load_frames(limit=args.frames)
+    device = FakeDevice(frames)
+    raw_mb = sum(len(encode_raw(f)) for f in frames) / len(frames) / 1e6
+    png_mb = sum(len(encode_png(f)) for f in frames) / len(frames) / 1e6
+    print(f"📸 Capture benchmark: {len(frames)} frames, {args.runs} runs, "
+          f"{raw_mb:.1f} MB raw / {png_mb:.2f} MB png per frame")
+
+    print("  decode only:")
+    legacy = report("png decode -> PIL", time_calls(lambda: capture.grab_png(device), args.runs))
+    report("png decode -> numpy", time_calls(lambda: np.asarray(capture.grab_png(device)), args.runs))
+    raw = report("raw frombuffer -> PIL", time_calls(lambda: capture.screencap(device), args.runs))
+    report("raw frombuffer -> numpy", time_calls(lambda: capture.grab_array(device), args.runs))
+    print(f"  speedup (PIL, decode only): {legacy / raw:.1f}x")
+
+    phone = FakeDevice(frames, shell_latency=args.shell_ms / 1000, png_latency=args.png_ms / 1000,
+                       transfer_rate=args.usb_mbs * 1e6)
+
+    def exec_out():
+        time.sleep(args.spawn_ms / 1000)    # the old code started an adb client per frame
+        return capture.grab_png(phone)
+
+    print(f"  modelled phone ({args.spawn_ms:g} ms spawn, {args.png_ms:g} ms png, "
+          f"{args.shell_ms:g} ms connection, {args.usb_mbs:g} MB/s):")
+    legacy = report("exec-out png -> PIL", time_calls(exec_out, args.runs))
+    raw = report("raw over connection -> PIL", time_calls(lambda: capture.screencap(phone), args.runs))
+    print(f"  speedup (PIL, modelled phone): {legacy / raw:.1f}x")
+
+
+# ============================================
+# RECORDER: synchronous PNG save vs background recorder
+# ============================================
+RECORDER_REPEAT = 2     # captures per screen: about half the simulated pipeline's repeat the last one
+RECORDER_GAP_S = 0.25   # between captures; the simulated pipeline's median gap is ~0.8 s
+
+
+def recorder_rates(stats):
+    submitted = max(stats["submitted"], 1)
+    return (f"dropped {stats['dropped']}/{stats['submitted']} ({stats['dropped'] / submitted:.0%}), "
+            f"deduplicated {stats['duplicates']}/{stats['submitted']} "
+            f"({stats['duplicates'] / submitted:.0%})")
+
+
+def bench_recorder(args):
+    """
+    Capture latency as seen by the caller, with debug frames enabled.
+    Every screen is captured RECORDER_REPEAT times in a row, like the
+    pipeline re-checking a screen that has not changed. The paced run
+    captures every RECORDER_GAP_S, faster than the pipeline does, so its
+    drop and dedup rates are the ones to expect in use; the burst run
+    shows what a full queue drops.
+    """
+    frames = load_frames(limit=args.frames)
+    screens = [f for f in frames for _ in range(RECORDER_REPEAT)]
+    print(f"💾 Recorder benchmark: {len(frames)} frames x{RECORDER_REPEAT}, {args.runs} runs")
+
+    with tempfile.TemporaryDirectory() as folder:
+        device = FakeDevice(screens)
+
+        def sync_save():
+            img = capture.screencap(device)
+            img.save(os.path.join(folder, f"screen_{time.time_ns()}.png"))
+
+        report("capture + sync PNG save", time_calls(sync_save, args.runs))
+
+        device = FakeDevice(screens)
+        rec = recorder.FrameRecorder(os.path.join(folder, "paced"), max_files=args.frames)
+        samples = []
+        for _ in range(args.runs):
+            samples.extend(time_calls(lambda: rec.submit(capture.screencap(device)), 1))
+            time.sleep(RECORDER_GAP_S)
+        report("capture + recorder.submit", samples)
+        rec.flush(timeout=60)
+        print(f"  paced: {recorder_rates(rec.stats)}")
+
+        device = FakeDevice(screens)
+        rec = recorder.FrameRecorder(os.path.join(folder, "burst"), max_files=args.frames)
+        report("same, back to back", time_calls(lambda: rec.submit(capture.screencap(device)), args.runs))
+        rec.flush(timeout=60)
+        print(f"  burst: {recorder_rates(rec.stats)}")
+
+
+# ============================================
+# ENCODE: per-call re-encoding vs shared ScreenFrame
+# ============================================
+def bench_encode(args):
+    """
+    Worst-case fallback chain: Groq Scout, Groq Maverick, then Gemini.
+    The old code re-encoded the PNG for every call.
+    """
+    frames = load_frames(limit=args.frames)
+    device = FakeDevice(frames)
+    print(f"🗜️ Encode benchmark: {len(frames)} frames, {args.runs} runs")
+
+    def per_call():
+        img = capture.screencap(device)
+        for _ in range(3):
+            ScreenFrame(img).base64("PNG")
+
+    def shared():
+        frame = ScreenFrame(capture.screencap(device))
+        frame.base64("PNG")
+        frame.base64("PNG")
+        frame.encoded("JPEG", 90)
+
+    report("re-encode per provider call", time_calls(per_call, args.runs))
+    report("ScreenFrame (png + jpeg)", time_calls(shared, args.runs))
+
+
+# ============================================
+# TEMPLATES: local icon matcher vs hand-checked labels
+# ============================================
+def bench_templates(args):
+    """
+    Precision/recall of template_match over every saved debug frame.
+    Ground truth lives in templates/labels.json (null = icon not visible).
+    """
+    from PIL import Image
+
+    with open(os.path.join(template_match.TEMPLATE_FOLDER, "labels.json")) as f:
+        labels = json.load(f)
+    print(f"🎯 Template benchmark: {len(labels)} labelled frames")
+
+    for name in template_match.TEMPLATES:
+        tp = fp = fn = 0
+        samples = []
+        for frame_name, expected in labels.items():
+            img = Image.open(os.path.join(OUTPUT_FOLDER, frame_name))
+            img.load()
+            start = time.perf_counter()
+            result = template_match.match(img, name)
+            samples.append((time.perf_counter() - start) * 1000)
+
+            truth = expected.get(name)
+            if result and truth and max(abs(result["point"][0] - truth[0]),
+                                        abs(result["point"][1] - truth[1])) <= 16:
+                tp += 1
+            elif result:
+                fp += 1
+            elif truth:
+                fn += 1
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        report(name, samples)
+        print(f"  {'':<28} precision {precision:.2f}   recall {recall:.2f}   (tp {tp}, fp {fp}, fn {fn})")
+
+
+# ============================================
+# FLEET: throughput vs device count under one shared quota
+# ============================================
+def bench_fleet(args):
+    """
+    Each fake device "cleans" emails: a few screen grabs plus one vision
+    call that sleeps --latency seconds after being admitted by a shared
+    RateController capped at --rpm. Throughput should grow with device
+    count until the quota, not the devices, is the limit.
+    """
+    frames = load_frames(limit=args.frames)
+    emails = 4
+    print(f"📱 Fleet benchmark: {emails} emails/device, {args.latency}s per AI call, {args.rpm} RPM quota")
+
+    for count in (1, 2, 4, 8):
+        devices = [FakeDevice(frames, serial=f"fake-{i:04d}") for i in range(count)]
+        control = ratelimit.RateController({"sim": (args.rpm, 10 ** 9)}, headroom=1.0)
+        # Start with an empty bucket so the quota applies from the first call
+        control.requests["sim"].drain(0)
+
+        def job(device):
+            for _ in range(emails):
+                for _ in range(3):
+                    capture.screencap(device)
+                control.admit("sim", timeout=600)
+                time.sleep(args.latency)
+            return emails
+
+        start = time.perf_counter()
+        results = fleet.run(devices, job)
+        elapsed = time.perf_counter() - start
+        done = sum(r["result"] for r in results if r["ok"])
+        print(f"  {count} device(s){'':<18} {done / elapsed:6.2f} emails/s   ({done} in {elapsed:.1f}s)")
+
+
+# ============================================
+# INPUT: shell per command vs persistent channel vs sendevent
+# ============================================
+def bench_input(args):
+    """
+    Cost of the 14 gestures of one email (10 footer swipes + 4 backs)
+    on a FakeDevice charging --shell-ms per adb shell connection and
+    --input-ms per `input` JVM start-up (sendevent: 2 ms per call).
+    """
+    frames = load_frames(limit=1)
+    costs = dict(shell_latency=args.shell_ms / 1000, input_latency=args.input_ms / 1000,
+                 sendevent_latency=0.002)
+    print(f"🎮 Input benchmark: {args.shell_ms} ms/connection, {args.input_ms} ms/input command")
+
+    def gestures():
+        script = input_channel.Script()
+        for _ in range(10):
+            script.swipe(360, 1300, 360, 400, 60)
+        for _ in range(4):
+            script.key("KEYCODE_BACK")
+        return script
+
+    def one_by_one(channel):
+        for step in gestures().steps:
+            script = input_channel.Script()
+            script.steps.append(step)
+            channel.run(script)
+
+    legacy = input_channel.InputChannel(FakeDevice(frames, **costs), persistent=False)
+    persistent = input_channel.InputChannel(FakeDevice(frames, **costs))
+    sendevent = input_channel.InputChannel(FakeDevice(frames, **costs), sendevent=True)
+    runs = max(1, args.runs // 10)
+
+    base = report("new shell per command", time_calls(lambda: one_by_one(legacy), runs))
+    report("persistent, per command", time_calls(lambda: one_by_one(persistent), runs))
+    batched = report("persistent, one batch", time_calls(lambda: persistent.run(gestures()), runs))
+    fast = report("sendevent, one batch", time_calls(lambda: sendevent.run(gestures()), runs))
+    print(f"  per gesture: {base / 14:.1f} ms -> {batched / 14:.1f} ms (input) / {fast / 14:.1f} ms (sendevent)")
+
+
+# ============================================
+# HTTP: host-side unsubscribe, fresh connections vs pooled session
+# ============================================
+def bench_http(args):
+    """
+    Unsubscribe --runs URLs against sim.SimUnsubscribeServer charging
+    --handshake-ms per new connection and --http-ms per request: one
+    fresh session per URL, one pooled session, and pooled with 4 in flight.
+    """
+    import sim
+    from concurrent.futures import ThreadPoolExecutor
+
+    import unsubscribe_http
+
+    modes = ("one_click", "visit", "form")
+    server = sim.SimUnsubscribeServer(lambda email: modes[email % 3], latency=args.http_ms / 1000,
+                                      handshake=args.handshake_ms / 1000)
+    urls = [server.url.format(email=i) for i in range(args.runs)]
+    print(f"📨 HTTP unsubscribe benchmark: {len(urls)} links, {args.handshake_ms:.0f} ms/connection, "
+          f"{args.http_ms:.0f} ms/request")
+
+    def fresh(url):
+        unsubscriber = unsubscribe_http.Unsubscriber(domain_rpm=6000)
+        try:
+            return unsubscriber.unsubscribe(url)
+        finally:
+            unsubscriber.close()
+
+    def parallel(url_list):
+        with ThreadPoolExecutor(4) as pool:
+            return list(pool.map(pooled.unsubscribe, url_list))
+
+    pooled = unsubscribe_http.Unsubscriber(domain_rpm=6000)
+    try:
+        for label, run in (("fresh connection per link", lambda: [fresh(u) for u in urls]),
+                           ("pooled session", lambda: [pooled.unsubscribe(u) for u in urls]),
+                           ("pooled, 4 in flight", lambda: parallel(urls))):
+            before = dict(server.stats)
+            start = time.perf_counter()
+            outcomes = run()
+            ms = (time.perf_counter() - start) * 1000 / len(urls)
+            done = sum(1 for outcome, _ in outcomes if outcome == unsubscribe_http.DONE)
+            print(f"  {label:<28} {ms:7.1f} ms/link   {done}/{len(urls)} done   "
+                  f"{server.stats['connections'] - before['connections']} connections")
+    finally:
+        pooled.close()
+        server.close()
+
+
+def bench_vision(args):
+    """
+    --runs vision requests through vision_api against sim.SimVisionServer,
+    in real time: --latency-ms per answer, --handshake-ms per new
+    connection. A new client per call (how Gemini was called before), one
+    pooled client, and every request in flight at once on one event loop;
+    then one call that outlives --timeout-ms.
+    """
+    import asyncio
+
+    import sim
+    import vision_api
+
+    frame = ScreenFrame(load_frames()[0])
+    image = frame.blob("JPEG", 90)
+    device = sim.SimGmail(sim.SimClock())
+    vision = sim.StubVision("gemini", device, time, latency=args.latency_ms / 1000, jitter=0)
+    server = sim.SimVisionServer(vision, vision, handshake=args.handshake_ms / 1000)
+    model = "gemini-2.0-flash-exp"
+    print(f"🛰️ Vision client benchmark: {args.runs} requests, {args.latency_ms:.0f} ms/answer, "
+          f"{args.handshake_ms:.0f} ms/connection")
+
+    def fresh():
+        api = vision_api.GeminiAPI("sim-key", server.gemini_url)
+        try:
+            return api.analyze(model, "Find a promotional email", image)
+        finally:
+            vision_api.run(api.aclose())
+
+    async def gathered():
+        return await asyncio.gather(*(pooled.aanalyze(model, "Find a promotional email", image)
+                                      for _ in range(args.runs)))
+
+    pooled = vision_api.GeminiAPI("sim-key", server.gemini_url, max_connections=args.runs)
+    try:
+        for label, run in (("new client per call", lambda: [fresh() for _ in range(args.runs)]),
+                           ("pooled client", lambda: [pooled.analyze(model, "Find a promotional email", image)
+                                                      for _ in range(args.runs)]),
+                           ("pooled, all in flight", lambda: vision_api.run(gathered()))):
+            before = dict(server.stats)
+            start = time.perf_counter()
+            answers = run()
+            ms = (time.perf_counter() - start) * 1000 / args.runs
+            print(f"  {label:<24} {ms:7.1f} ms/request   {len(answers)} answers   "
+                  f"{server.stats['connections'] - before['connections']} connections")
+
+        impatient = vision_api.GeminiAPI("sim-key", server.gemini_url, timeout=args.timeout_ms / 1000)
+        start = time.perf_counter()
+        try:
+            impatient.analyze(model, "Find a promotional email", image)
+            outcome = "answered"
+        except Exception as e:
+            outcome = type(e).__name__
+        print(f"  {'read timeout ' + str(int(args.timeout_ms)) + ' ms':<24} "
+              f"{(time.perf_counter() - start) * 1000:7.1f} ms   {outcome}")
+    finally:
+        vision_api.shutdown()
+        server.close()
+
+
+# ============================================
+# PIPELINE: end-to-end on a simulated Gmail with stub providers
+# ============================================
+PIPELINE_STEPS = ("navigate_to_promotions", "find_and_open_email", "find_unsubscribe",
+                  "handle_browser_confirm", "return_to_inbox")
+FEATURE_FLAGS = session.FEATURE_FLAGS
+
+
+def _span(text):
+    lo, _, hi = text.partition("-")
+    return (int(lo), int(hi)) if hi else int(lo)
+
+
+def _compare(result, baseline_path):
+    with open(baseline_path) as f:
+        base = json.load(f)
+    print(f"  vs {baseline_path}:")
+    for key in ("emails_per_minute", "ai_calls_per_email", "bytes_per_email"):
+        old, new = base.get(key), result.get(key)
+        if old and new is not None:
+            print(f"    {key:<24} {old:10.2f} -> {new:10.2f}  ({(new - old) / old * 100:+.0f}%)")
+
+
+def _time_steps(main, clock):
+    """Time every PIPELINE_STEPS call on `clock`. Returns (samples per step, undo function)."""
+    steps = {name: [] for name in PIPELINE_STEPS}
+    originals = {name: getattr(main, name) for name in PIPELINE_STEPS}
+
+    def timed(name, fn):
+        def wrapper(*a, **kw):
+            start = clock.monotonic()
+            try:
+                return fn(*a, **kw)
+            finally:
+                steps[name].append(clock.monotonic() - start)
+        return wrapper
+
+    for name, fn in originals.items():
+        setattr(main, name, timed(name, fn))
+
+    def restore():
+        for name, fn in originals.items():
+            setattr(main, name, fn)
+    return steps, restore
+
+
+def _step_stats(steps):
+    import sim
+
+    return {name: {"n": len(v), **{k: round(p, 3) if p is not None else None
+                                   for k, p in sim.percentiles(v).items()}}
+            for name, v in steps.items()}
+
+
+def _print_steps(result):
+    for name, stats in result["steps"].items():
+        if stats["n"]:
+            print(f"  {name:<28} p50 {stats['p50']:6.2f} s   p95 {stats['p95']:6.2f} s   "
+                  f"p99 {stats['p99']:6.2f} s   (n={stats['n']})")
+
+
+def _save(result, args):
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"  results -> {args.out}")
+    if args.baseline:
+        _compare(result, args.baseline)
+
+
+def bench_pipeline(args):
+    """
+    Run clean_promotions / run_demo / run_full_clean end to end against
+    sim.SimGmail with stub Groq and Gemini clients, on a simulated clock.
+    Feature flags come from the environment as usual, so a baseline is
+    e.g. `INBOX_QUEUE=0 python benchmark.py pipeline --out base.json`.
+    Run twice with the same --ledger to measure a repeat (daily) run.
+    --record DIR also writes the run as a session archive for `replay`.
+    """
+    import logging
+    import sim
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Fresh caches per run; no debug frames
+        os.environ["RECORD_FRAMES"] = "0"
+        os.environ["VISION_CACHE_DB"] = os.path.join(folder, "vision_cache.sqlite3")
+        os.environ["COORD_CACHE_PATH"] = os.path.join(folder, "coords.json")
+        # --ledger keeps it across runs, like consecutive scheduled runs
+        os.environ["LEDGER_DB"] = args.ledger or os.path.join(folder, "ledger.sqlite3")
+        os.environ["SESSION_RECORD"] = "0"
+
+        import coord_cache
+        import fake_device
+        import hedging
+        import main
+        import providers
+        import settle
+        import tracing
+        import utils
+        import vision_api
+        import vision_cache
+
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        clock = sim.SimClock()
+        restore = sim.install_clock(clock, [main, settle, tracing, ratelimit, hedging, coord_cache,
+                                            vision_cache, input_channel, fake_device, session])
+        if args.record:
+            # Built after the clock so the session's timeline is simulated seconds too
+            main.session_recorder = session.Recorder(args.record)
+        server = sim.SimUnsubscribeServer(
+            lambda email: device.emails[email]["http"] if email < len(device.emails) else None,
+            clock=clock, latency=args.http_ms / 1000)
+        device = sim.SimGmail(clock, seed=args.seed, regions=main.PROMPT_ROI,
+                              missing_unsubscribe=args.missing_unsubscribe, link_url=server.url,
+                              redirects=args.redirects, link_lift=args.link_lift)
+        server.unsubscribed = device.unsubscribed
+        provider = dict(device=device, clock=clock, latency=args.latency_ms / 1000,
+                        jitter=args.jitter_ms / 1000, error_rate=args.error_rate,
+                        rate_429=args.rate_429, seed=args.seed)
+        groq = sim.StubVision("groq", rpm=args.groq_rpm, **provider)
+        gemini = sim.StubVision("gemini", rpm=args.gemini_rpm, **provider)
+        # The real pooled clients, talking to a local stand-in for both APIs
+        vision_server = sim.SimVisionServer(groq, gemini)
+        providers.get("groq").set_client(vision_api.GroqAPI("sim-key", vision_server.groq_url))
+        providers.get("gemini").set_client(vision_api.GeminiAPI("sim-key", vision_server.gemini_url))
+        # Buckets built under the real clock would never refill on the simulated one
+        main.rate_control = ratelimit.RateController(
+            {f"groq/{main.GROQ_VISION_MODEL}": main.GROQ_LIMITS,
+             f"groq/{main.GROQ_VISION_BACKUP}": main.GROQ_LIMITS,
+             "gemini": main.GEMINI_LIMITS},
+            admission_timeout=main.rate_control.admission_timeout,
+        )
+
+        steps, untime = _time_steps(main, clock)
+        driven = main.start_session([device], args.scenario, args.emails)[0]
+        wall = time.perf_counter()
+        try:
+            if args.scenario == "clean":
+                utils.launch_app(driven, main.GMAIL_PACKAGE)
+                main.clean_promotions(driven, args.emails)
+            elif args.scenario == "demo":
+                main.run_demo(driven, args.emails)
+            else:
+                main.run_full_clean(driven)
+        finally:
+            untime()
+            for name in providers.REGISTRY:
+                providers.get(name).set_client(None)
+            vision_api.shutdown()
+            vision_server.close()
+            server.close()
+            if main.session_recorder:
+                main.session_recorder.close()
+                main.session_recorder = None
+            restore()
+        wall = time.perf_counter() - wall
+
+    done = len(device.unsubscribed)
+    calls = groq.stats["calls"] + gemini.stats["calls"]
+    uploaded = groq.stats["bytes"] + gemini.stats["bytes"]
+    result = {
+        "scenario": args.scenario,
+        "seed": args.seed,
+        "features": {flag: os.environ.get(flag) for flag in FEATURE_FLAGS if flag in os.environ},
+        "providers": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                      "error_rate": args.error_rate, "rate_429": args.rate_429,
+                      "groq_rpm": args.groq_rpm, "gemini_rpm": args.gemini_rpm},
+        "emails_unsubscribed": done,
+        "emails_opened": device.stats["opened"],
+        "sim_seconds": round(clock.now, 2),
+        "wall_seconds": round(wall, 2),
+        "emails_per_minute": round(done / clock.now * 60, 3) if clock.now else 0.0,
+        "ai_calls": calls,
+        "ai_calls_per_email": round(calls / done, 2) if done else None,
+        "bytes_uploaded": uploaded,
+        "bytes_per_email": round(uploaded / done) if done else None,
+        "provider_stats": {"groq": groq.stats, "gemini": gemini.stats},
+        "device_stats": device.stats,
+        "http_stats": {**server.stats, **(main.http_unsubscriber.stats if main.http_unsubscriber else {})},
+        "steps": _step_stats(steps),
+    }
+
+    print(f"🧪 Pipeline benchmark ({args.scenario}, seed {args.seed}): "
+          f"{done} unsubscribed in {clock.now:.0f} simulated s ({wall:.1f}s wall)")
+    print(f"  emails/minute {result['emails_per_minute']:.2f}   AI calls/email {result['ai_calls_per_email']}   "
+          f"upload/email {(result['bytes_per_email'] or 0) / 1024:.0f} KiB")
+    _print_steps(result)
+    if args.record:
+        print(f"  session -> {args.record}")
+    _save(result, args)
+
+
+# ============================================
+# REPLAY: the pipeline against a recorded session
+# ============================================
+def bench_replay(args):
+    """
+    Re-run the recorded mode (demo / full / fleet / a pipeline scenario)
+    against a session archive from SESSION_RECORD=1 or `pipeline
+    --record`: screens, view dumps, AI answers and HTTP outcomes all come
+    from the archive, on a simulated clock, so no phone, network or keys.
+    The recorded feature flags apply unless set in the environment, so a
+    change is measured with e.g. `UI_HIERARCHY=0 python benchmark.py
+    replay --session DIR --baseline replay_base.json`. --speed N also
+    waits for real, at N x recorded speed.
+    """
+    import logging
+    import sim
+
+    archive = replay.Archive(args.session)
+    for flag, value in archive.meta.get("features", {}).items():
+        os.environ.setdefault(flag, value)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # The caches and ledger the recorded run started from
+        os.environ["RECORD_FRAMES"] = "0"
+        os.environ["SESSION_RECORD"] = "0"
+        os.environ["VISION_CACHE_DB"] = os.path.join(folder, "vision_cache.sqlite3")
+        os.environ["COORD_CACHE_PATH"] = os.path.join(folder, "coords.json")
+        os.environ["LEDGER_DB"] = os.path.join(folder, "ledger.sqlite3")
+        for name, env in (("coords.json", "COORD_CACHE_PATH"), ("ledger.sqlite3", "LEDGER_DB")):
+            if archive.state(name):
+                shutil.copyfile(archive.state(name), os.environ[env])
+
+        import coord_cache
+        import fake_device
+        import hedging
+        import main
+        import settle
+        import tracing
+        import utils
+        import vision_api
+        import vision_cache
+
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        sim_clock = sim.SimClock(epoch=archive.meta.get("time"))
+        clock = replay.PacedClock(sim_clock, args.speed) if args.speed else sim_clock
+        restore = sim.install_clock(clock, [main, settle, tracing, ratelimit, hedging, coord_cache,
+                                            vision_cache, input_channel, fake_device])
+        vision = replay.ReplayVision(archive, clock)
+        saved = main.analyze_screen_async, main.http_unsubscriber, main.record_outcome
+        main.analyze_screen_async = vision.analyze
+        if main.http_unsubscriber:
+            main.http_unsubscriber = replay.ReplayUnsubscriber(archive, clock)
+        outcomes = []
+
+        def record_outcome(device, email, outcome):
+            if outcome is not None:
+                outcomes.append(outcome)
+            saved[2](device, email, outcome)
+        main.record_outcome = record_outcome
+
+        devices = [replay.ReplayDevice(archive, serial, clock) for serial in archive.serials()]
+        mode, emails = archive.meta.get("mode", "demo"), archive.meta.get("emails", 3)
+        steps, untime = _time_steps(main, clock)
+        wall = time.perf_counter()
+        try:
+            if mode == "fleet":
+                main.run_fleet(devices, emails)
+            elif mode == "clean":
+                utils.launch_app(devices[0], main.GMAIL_PACKAGE)
+                main.clean_promotions(devices[0], emails)
+            elif mode == "full":
+                main.run_full_clean(devices[0])
+            else:
+                main.run_demo(devices[0], emails)
+        finally:
+            untime()
+            main.analyze_screen_async, main.http_unsubscriber, main.record_outcome = saved
+            vision_api.shutdown()
+            restore()
+        wall = time.perf_counter() - wall
+
+    recorded = [e["outcome"] for e in archive.of("outcome")]
+    done = outcomes.count(ledger.UNSUBSCRIBED)
+    device_stats = {d.serial: d.stats for d in devices}
+    result = {
+        "scenario": "replay",
+        "session": args.session,
+        "mode": mode,
+        "features": {flag: os.environ.get(flag) for flag in FEATURE_FLAGS if flag in os.environ},
+        "recorded_seconds": round(archive.duration, 2),
+        "recorded_outcomes": recorded,
+        "outcomes": outcomes,
+        "emails_unsubscribed": done,
+        "sim_seconds": round(sim_clock.now, 2),
+        "wall_seconds": round(wall, 2),
+        "emails_per_minute": round(done / sim_clock.now * 60, 3) if sim_clock.now else 0.0,
+        "ai_calls": vision.stats["asked"],
+        "ai_calls_per_email": round(vision.stats["asked"] / done, 2) if done else None,
+        "vision_stats": vision.stats,
+        "device_stats": device_stats,
+        "steps": _step_stats(steps),
+    }
+
+    print(f"🎞️ Replay of {args.session} ({mode}): {done} unsubscribed in {sim_clock.now:.0f} simulated s "
+          f"(recorded {archive.duration:.0f} s, {wall:.1f}s wall)")
+    print(f"  outcomes {'match the recording' if outcomes == recorded else f'{outcomes} vs recorded {recorded}'}")
+    print(f"  emails/minute {result['emails_per_minute']:.2f}   AI answers: {vision.summary()}")
+    for serial, stats in device_stats.items():
+        print(f"  {serial}: {stats['matched']}/{stats['actions']} actions on the recorded timeline "
+              f"({stats['skipped']} recorded skipped), {stats['missing']} queries never recorded")
+    _print_steps(result)
+    _save(result, args)
+
+
+# ============================================
+# STARTUP: import time of the entry points (python -X importtime)
+# ============================================
+STARTUP_MODULES = ("main", "preflight")
+
+
+def import_profile(module):
+    """
+    Run `python -X importtime -c "import <module>"` in a fresh interpreter.
+    Returns (total_ms, {top-level package: cumulative ms}).
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, packages, children = 0.0, {}, {}
+    # importtime prints children (indented two more spaces) before their parent
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth, name = len(name) - len(name.lstrip()), name.strip()
+        ms = int(cumulative) / 1000
+        if depth == 3:
+            package = name.split(".")[0]
+            children[package] = children.get(package, 0) + ms
+        elif depth == 1:
+            if name == module:
+                total, packages = ms, children
+            children = {}
+    return total, packages
+
+
+def bench_startup(args):
+    """
+    Cold import cost of main.py and preflight.py, median of --runs fresh
+    interpreters, plus the heaviest direct imports. Written to --out so
+    start-up regressions show up next to the pipeline numbers.
+    """
+    runs = max(1, min(args.runs, 10))
+    result = {"runs": runs, "modules": {}}
+    print(f"⏱️ Startup benchmark ({runs} fresh interpreters per module)")
+    for module in STARTUP_MODULES:
+        totals, heaviest = [], {}
+        for _ in range(runs):
+            total, packages = import_profile(module)
+            totals.append(total)
+            for name, ms in packages.items():
+                heaviest.setdefault(name, []).append(ms)
+        top = sorted(((statistics.median(v), k) for k, v in heaviest.items()), reverse=True)[:5]
+        result["modules"][module] = {
+            "p50_ms": round(statistics.median(totals), 1),
+            "max_ms": round(max(totals), 1),
+            "heaviest": {name: round(ms, 1) for ms, name in top},
+        }
+        print(f"  import {module:<12} p50 {statistics.median(totals):7.1f} ms   max {max(totals):7.1f} ms")
+        print(f"    heaviest: " + ", ".join(f"{name} {ms:.0f} ms" for ms, name in top))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"  results -> {args.out}")
+
+
+BENCHMARKS = {
+    "capture": bench_capture,
+    "recorder": bench_recorder,
+    "encode": bench_encode,
+    "templates": bench_templates,
+    "fleet": bench_fleet,
+    "input": bench_input,
+    "http": bench_http,
+    "vision": bench_vision,
+    "pipeline": bench_pipeline,
+    "replay": bench_replay,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Declutter Droid benchmarks")
+    parser.add_argument("name", nargs="?", default="capture", choices=sorted(BENCHMARKS))
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated AI call (fleet)")
+    parser.add_argument("--rpm", type=float, default=360, help="shared AI quota (fleet)")
+    parser.add_argument("--shell-ms", type=float, default=25, help="adb shell connection cost (input/capture)")
+    parser.add_argument("--input-ms", type=float, default=150, help="`input` JVM start-up cost (input)")
+    parser.add_argument("--spawn-ms", type=float, default=40, help="`adb exec-out` process start (capture)")
+    parser.add_argument("--png-ms", type=float, default=300, help="device-side `screencap -p` compression (capture)")
+    parser.add_argument("--usb-mbs", type=float, default=25, help="adb transfer rate in MB/s (capture)")
+    # pipeline
+    parser.add_argument("--scenario", choices=("clean", "demo", "full"), default="clean")
+    parser.add_argument("--emails", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=900)
+    parser.add_argument("--jitter-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--groq-rpm", type=int, default=30)
+    parser.add_argument("--gemini-rpm", type=int, default=10)
+    parser.add_argument("--missing-unsubscribe", type=float, default=0.0)
+    parser.add_argument("--redirects", type=_span, default=1,
+                        help="pages before the confirm page (pipeline): N, or LO-HI per email")
+    parser.add_argument("--link-lift", type=_span, default=0,
+                        help="rows between the unsubscribe link and the bottom of the email (pipeline): N, or LO-HI")
+    parser.add_argument("--ledger", help="ledger DB kept between pipeline runs (default: fresh)")
+    parser.add_argument("--record", help="also write the pipeline run as a session archive in this folder")
+    parser.add_argument("--session", help="session archive to replay (replay)")
+    parser.add_argument("--speed", type=float, help="replay at this multiple of real time (default: instantly)")
+    parser.add_argument("--http-ms", type=float, default=150, help="unsubscribe endpoint latency (pipeline/http)")
+    parser.add_argument("--handshake-ms", type=float, default=100, help="new connection set-up (http/vision)")
+    parser.add_argument("--timeout-ms", type=float, default=300, help="client read timeout (vision)")
+    parser.add_argument("--out", help="results file (pipeline/startup), default Agent-output/bench_<name>.json")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    args.out = args.out or os.path.join(OUTPUT_FOLDER, f"bench_{args.name}.json")
+    BENCHMARKS[args.name](args)
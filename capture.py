@@ -0,0 +1,88 @@
+# capture.py
+# ============================================
+# RAW FRAMEBUFFER CAPTURE
+# Reuses the adbutils connection, no PNG round-trip
+# ============================================
+import io
+import logging
+import struct
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# screencap raw pixel formats (android.graphics.PixelFormat)
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_BGRA_8888 = 5
+
+# Android 9+ appends a dataspace word to the 12 byte (w, h, format) header
+HEADER_SIZES = (16, 12)
+
+
+def parse_raw_frame(data):
+    """
+    Wrap raw `screencap` output in an (H, W, 4) RGBA array.
+    For RGBA frames the array is a view over `data`, no pixel bytes are
+    copied; BGRA and RGBX frames cost one copy.
+    Returns None if the buffer isn't a 32-bit frame we understand.
+    """
+    if len(data) < 12:
+        return None
+
+    width, height, fmt = struct.unpack_from("<III", data, 0)
+    pixel_bytes = width * height * 4
+    header = len(data) - pixel_bytes
+    if header not in HEADER_SIZES:
+        return None
+
+    arr = np.frombuffer(data, dtype=np.uint8, count=pixel_bytes, offset=header)
+    arr = arr.reshape(height, width, 4)
+
+    if fmt == PIXEL_FORMAT_BGRA_8888:
+        # Rare on phones - pay for one reorder copy rather than mis-colour
+        arr = arr[..., [2, 1, 0, 3]]
+    elif fmt == PIXEL_FORMAT_RGBX_8888:
+        # The X byte is undefined: make it opaque, or it turns into random alpha
+        arr = arr.copy()
+        arr[..., 3] = 255
+    elif fmt != PIXEL_FORMAT_RGBA_8888:
+        return None
+    return arr
+
+
+def array_to_image(arr):
+    """Share an RGBA array's memory with a PIL image (read-only)."""
+    height, width = arr.shape[:2]
+    if not arr.flags["C_CONTIGUOUS"]:
+        arr = np.ascontiguousarray(arr)
+    return Image.frombuffer("RGBA", (width, height), arr, "raw", "RGBA", 0, 1)
+
+
+def grab_array(device):
+    """Pull one raw frame over the existing adbutils connection."""
+    data = device.shell("screencap", encoding=None)
+    return parse_raw_frame(data)
+
+
+def grab_png(device):
+    """Legacy path: device-side PNG compression + PIL decode."""
+    data = device.shell("screencap -p", encoding=None)
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def screencap(device):
+    """
+    Capture the screen as a PIL image.
+    Uses the raw framebuffer and only falls back to PNG when
+    the device sends a pixel format we can't wrap directly.
+    """
+    arr = grab_array(device)
+    if arr is not None:
+        return array_to_image(arr)
+
+    logger.warning("⚠️ Unsupported raw screencap format, using PNG")
+    return grab_png(device)
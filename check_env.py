@@ -1,25 +1,13 @@
-import os
 from dotenv import load_dotenv
 
+import preflight
+
 def check_api_key():
     # Load environment variables from .env file
     load_dotenv()
-    # Define the expected API key variable.
-    api_key = os.environ.get("GEMINI_API_KEY")
-    
+    # Same key checks as `python preflight.py`, without the device
     print("-" * 30)
-    if not api_key:
-        print("❌ Error: GEMINI_API_KEY not found in environment variables.")
-    elif api_key == "your_api_key_here":
-        print("❌ Error: GEMINI_API_KEY is still set to the default placeholder.")
-    else:
-        # Simple heuristic: Google API keys usually start with AIza
-        if api_key.startswith("AIza"):
-            print("✅ Success: GEMINI_API_KEY found and looks valid (starts with AIza).")
-        else:
-            print("⚠️ Warning: GEMINI_API_KEY found, but doesn't start with 'AIza'. It might be invalid.")
-            print(f"Current Value: {api_key[:4]}...{api_key[-4:]}") # Obfuscated
-            
+    preflight.check_keys()
     print("-" * 30)
 
 if __name__ == "__main__":
@@ -1,20 +1,20 @@
-import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+import providers
+
 load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
+gemini = providers.get("gemini")
 
-if not api_key:
+if not gemini.key:
     print("❌ Key not found")
 else:
-    genai.configure(api_key=api_key)
-    print(f"🔑 Key found: {api_key[:10]}...")
-    
+    print(f"🔑 Key found: {gemini.key[:10]}...")
+    api = gemini.client()
+
     print("\n🔎 Listing available models for you...")
     try:
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                print(f"✅ FOUND: {m.name}")
+        for m in api.list_models():
+            if 'generateContent' in m.get("supportedGenerationMethods", []):
+                print(f"✅ FOUND: {m['name']}")
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -0,0 +1,98 @@
+# coord_cache.py
+# ============================================
+# LEARNED COORDINATE CACHE
+# Stable UI targets per device + resolution + app version
+# ============================================
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_versions = {}  # (serial, package) -> versionName, looked up once per process
+
+
+def app_version(device, package):
+    """versionName from `dumpsys package`, or 'unknown'."""
+    key = (device.serial, package)
+    if key not in _versions:
+        version = "unknown"
+        try:
+            out = device.shell(f"dumpsys package {package} | grep versionName")
+            match = re.search(r"versionName=(\S+)", out or "")
+            if match:
+                version = match.group(1)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read {package} version: {e}")
+        _versions[key] = version
+    return _versions[key]
+
+
+def profile_key(device, size, package):
+    """Everything that can move a target: device, resolution, app build."""
+    width, height = size
+    return f"{device.serial}|{width}x{height}|{package}@{app_version(device, package)}"
+
+
+class CoordinateCache:
+    """
+    JSON file of {profile: {target: {"point": [x, y], "hits": n, "updated": ts}}}.
+    Writes go to a temp file and are swapped in, so a crash can't corrupt it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._data = {}
+        try:
+            with open(path) as f:
+                self._data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable coordinate cache: {e}")
+
+    def lookup(self, profile, target):
+        entry = self._data.get(profile, {}).get(target)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        return list(entry["point"])
+
+    def confirm(self, profile, target):
+        """The cached point worked - count it."""
+        with self._lock:
+            entry = self._data.get(profile, {}).get(target)
+            if entry is not None:
+                entry["hits"] = entry.get("hits", 0) + 1
+                self.stats["hits"] += 1
+                self._save()
+
+    def record(self, profile, target, point):
+        with self._lock:
+            self._data.setdefault(profile, {})[target] = {
+                "point": [int(point[0]), int(point[1])],
+                "hits": 0,
+                "updated": round(time.time()),
+            }
+            self._save()
+
+    def evict(self, profile, target):
+        with self._lock:
+            if self._data.get(profile, {}).pop(target, None) is not None:
+                self.stats["evictions"] += 1
+                self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._data, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save coordinate cache: {e}")
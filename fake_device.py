@@ -0,0 +1,150 @@
+# fake_device.py
+# ============================================
+# FAKE ADB DEVICE - serves canned frames
+# Used by benchmark.py, no phone required
+# ============================================
+import glob
+import io
+import os
+import struct
+import time
+
+from PIL import Image
+
+from capture import PIXEL_FORMAT_RGBA_8888
+
+OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Agent-output")
+
+
+def load_frames(pattern="screen_*.png", limit=None):
+    """Load saved debug frames from Agent-output as RGBA images."""
+    paths = sorted(glob.glob(os.path.join(OUTPUT_FOLDER, pattern)))
+    if limit:
+        paths = paths[:limit]
+    return [Image.open(p).convert("RGBA") for p in paths]
+
+
+def encode_raw(img):
+    """Encode an image the way `screencap` (no -p) emits it."""
+    img = img.convert("RGBA")
+    header = struct.pack("<IIII", img.width, img.height, PIXEL_FORMAT_RGBA_8888, 0)
+    return header + img.tobytes()
+
+
+def encode_png(img):
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+# `getevent -pl` for a 720x1600 touchscreen, enough for the sendevent probe
+FAKE_GETEVENT = """add device 1: /dev/input/event2
+  name:     "fake_touchscreen"
+  events:
+    ABS (0003): ABS_MT_POSITION_X     : value 0, min 0, max 719, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_Y     : value 0, min 0, max 1599, fuzz 0, flat 0, resolution 0
+"""
+
+
+class FakeShell:
+    """
+    Interactive `adb shell` stand-in: lines written with send() run on
+    the FakeDevice one by one; `echo` output comes back through recv().
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.conn = self
+        self._output = b""
+
+    def settimeout(self, timeout):
+        pass
+
+    def send(self, data):
+        for line in data.decode().splitlines():
+            line = line.strip()
+            if line.startswith("echo "):
+                self._output += line[5:].replace('"', "").encode() + b"\n"
+            elif line:
+                self.device._run(line)
+        return len(data)
+
+    def recv(self, n):
+        chunk, self._output = self._output[:n], self._output[n:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeDevice:
+    """
+    Minimal stand-in for an adbutils device.
+    Every screencap serves the next canned frame (looping) and
+    every other shell command is recorded in `commands`.
+
+    Optional latencies model a real phone: `shell_latency` per adb shell
+    connection, `input_latency` per `input` command (its JVM start-up),
+    `sendevent_latency` per native sendevent call, `png_latency` per
+    `screencap -p` (device-side compression) and `transfer_rate` (bytes/s)
+    for moving command output over USB.
+    """
+
+    def __init__(self, frames, serial="fake-0001", shell_latency=0.0, input_latency=0.0,
+                 sendevent_latency=0.0, png_latency=0.0, transfer_rate=0.0):
+        self.serial = serial
+        self.commands = []
+        self.shell_latency = shell_latency
+        self.input_latency = input_latency
+        self.sendevent_latency = sendevent_latency
+        self.png_latency = png_latency
+        self.transfer_rate = transfer_rate
+        self._raw = [encode_raw(f) for f in frames]
+        self._png = [encode_png(f) for f in frames]
+        self._size = frames[0].size if frames else (720, 1600)
+        self._index = 0
+
+    def _next(self, table):
+        data = table[self._index % len(table)]
+        self._index += 1
+        return data
+
+    def shell(self, cmdargs, stream=False, timeout=None, encoding="utf-8", rstrip=True):
+        if isinstance(cmdargs, (list, tuple)):
+            cmdargs = " ".join(str(a) for a in cmdargs)
+        cmd = cmdargs.strip()
+        if self.shell_latency:
+            time.sleep(self.shell_latency)
+        if stream:
+            return FakeShell(self)
+
+        if cmd == "screencap":
+            out = self._next(self._raw)
+        elif cmd == "screencap -p":
+            out = self._next(self._png)
+            if self.png_latency:
+                time.sleep(self.png_latency)
+        elif cmd == "getevent -pl":
+            out = FAKE_GETEVENT.encode()
+        elif cmd == "wm size":
+            out = f"Physical size: {self._size[0]}x{self._size[1]}".encode()
+        else:
+            for part in cmd.split(";"):
+                self._run(part.strip())
+            out = b""
+        if self.transfer_rate and out:
+            time.sleep(len(out) / self.transfer_rate)
+
+        if encoding is None:
+            return out
+        return out.decode(encoding, errors="ignore")
+
+    def _run(self, cmd):
+        """Record one command and charge its simulated cost."""
+        self.commands.append(cmd)
+        if cmd.startswith("input ") and self.input_latency:
+            time.sleep(self.input_latency)
+        elif cmd.startswith("sendevent ") and self.sendevent_latency:
+            time.sleep(self.sendevent_latency)
+        elif cmd.startswith("sleep "):
+            time.sleep(float(cmd.split()[1]))
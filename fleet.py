@@ -0,0 +1,81 @@
+# fleet.py
+# ============================================
+# MULTI-DEVICE FLEET RUNNER
+# One worker per attached device, one shared AI quota
+# ============================================
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import adbutils
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s - [%(threadName)s] %(message)s"
+
+
+def discover(host="127.0.0.1", port=5037, serials=None):
+    """Every device adb reports as ready, optionally limited to `serials`."""
+    try:
+        devices = adbutils.AdbClient(host=host, port=port).device_list()
+    except Exception as e:
+        logger.error(f"ADB Error: {e}")
+        return []
+    if serials:
+        wanted = set(serials)
+        devices = [d for d in devices if d.serial in wanted]
+    return devices
+
+
+def tag_logs():
+    """Prefix every log line with the worker's thread name (= device serial)."""
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+
+def _work(job, device):
+    thread = threading.current_thread()
+    name, thread.name = thread.name, device.serial
+    start = time.monotonic()
+    try:
+        result = job(device)
+        return {"serial": device.serial, "ok": True, "result": result, "error": None,
+                "seconds": time.monotonic() - start}
+    except Exception as e:
+        logger.exception(f"❌ {device.serial} failed: {e}")
+        return {"serial": device.serial, "ok": False, "result": None, "error": str(e),
+                "seconds": time.monotonic() - start}
+    finally:
+        thread.name = name
+
+
+def run(devices, job, max_workers=None):
+    """
+    Run job(device) on every device at once and collect per-device results.
+
+    Threads rather than processes: a worker spends its time waiting on adb
+    and HTTP, and threads share the one rate controller, vision cache and
+    coordinate cache, so provider quotas hold across the whole fleet.
+    Returns [{"serial", "ok", "result", "error", "seconds"}] in device order.
+    """
+    if not devices:
+        return []
+    workers = min(len(devices), max_workers or len(devices))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet") as pool:
+        futures = [pool.submit(_work, job, device) for device in devices]
+        return [f.result() for f in futures]
+
+
+def log_summary(results):
+    """One line per device plus fleet totals; returns the summed results."""
+    total = 0
+    for r in results:
+        if r["ok"]:
+            total += r["result"] or 0
+            logger.info(f"📱 {r['serial']}: {r['result']} emails in {r['seconds']:.0f}s")
+        else:
+            logger.info(f"📱 {r['serial']}: ❌ {r['error']}")
+    failed = sum(1 for r in results if not r["ok"])
+    logger.info(f"🏁 Fleet: {total} emails on {len(results) - failed}/{len(results)} devices")
+    return total
@@ -0,0 +1,108 @@
+# frame.py
+# ============================================
+# SCREEN FRAME - ENCODE ONCE, SHARE EVERYWHERE
+# Lazily memoizes every derived form of one capture
+# ============================================
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+import roi
+import tracing
+import vision_cache
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+class ScreenFrame:
+    """
+    One captured screen plus everything derived from it.
+
+    Resized copies, encoded bytes, base64 strings, the perceptual hash
+    and ROI crops are computed on first use and then reused, so the
+    Groq backup model, the Gemini fallback and the cache all share the
+    same work instead of redoing resize + encode per call.
+    """
+
+    def __init__(self, image, offset=(0, 0)):
+        self.image = image
+        self.offset = offset  # where this frame sits on the full screen
+        self._memo = {}
+
+    @classmethod
+    def wrap(cls, image):
+        """Accept a ScreenFrame or a plain PIL image."""
+        if image is None or isinstance(image, cls):
+            return image
+        return cls(image)
+
+    def _cached(self, key, build):
+        if key not in self._memo:
+            self._memo[key] = build()
+        return self._memo[key]
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def width(self):
+        return self.image.width
+
+    @property
+    def height(self):
+        return self.image.height
+
+    @property
+    def array(self):
+        return self._cached("array", lambda: np.asarray(self.image))
+
+    @property
+    def phash(self):
+        return self._cached("phash", lambda: vision_cache.perceptual_hash(self.image))
+
+    def resized(self, max_width=1024):
+        """Downscale to at most max_width (LANCZOS); no-op for small frames."""
+        def build():
+            if self.image.width <= max_width:
+                return self.image
+            ratio = max_width / self.image.width
+            new_size = (max_width, int(self.image.height * ratio))
+            return self.image.resize(new_size, Image.LANCZOS)
+        return self._cached(("resized", max_width), build)
+
+    def encoded(self, fmt="PNG", quality=None, max_width=1024):
+        """Image bytes in the given codec."""
+        def build():
+            with tracing.span("encode", format=fmt) as span:
+                img = self.resized(max_width)
+                if fmt == "JPEG" and img.mode != "RGB":
+                    img = img.convert("RGB")
+                buffered = io.BytesIO()
+                options = {"quality": quality} if quality else {}
+                img.save(buffered, format=fmt, **options)
+                span.set(bytes=buffered.tell())
+                return buffered.getvalue()
+        return self._cached(("encoded", fmt, quality, max_width), build)
+
+    def base64(self, fmt="PNG", quality=None, max_width=1024):
+        return self._cached(
+            ("base64", fmt, quality, max_width),
+            lambda: base64.b64encode(self.encoded(fmt, quality, max_width)).decode("utf-8"),
+        )
+
+    def data_url(self, fmt="PNG", quality=None, max_width=1024):
+        return f"data:{MIME_TYPES[fmt]};base64,{self.base64(fmt, quality, max_width)}"
+
+    def blob(self, fmt="PNG", quality=None, max_width=1024):
+        """Inline-data dict (base64) the vision_api clients send."""
+        return {"mime_type": MIME_TYPES[fmt], "data": self.base64(fmt, quality, max_width)}
+
+    def crop(self, region):
+        """Sub-frame for a fractional ROI, memoized, with its screen offset."""
+        def build():
+            cropped, offset = roi.crop(self.image, region)
+            return ScreenFrame(cropped, (self.offset[0] + offset[0], self.offset[1] + offset[1]))
+        return self._cached(("crop", tuple(region)), build)
@@ -0,0 +1,144 @@
+# hedging.py
+# ============================================
+# HEDGED PROVIDER CALLS
+# Fire a backup request when the primary is slower than usual
+# ============================================
+import asyncio
+import bisect
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Log-spaced bucket upper bounds, 50 ms .. ~80 s
+BUCKETS = [0.05 * (1.3 ** i) for i in range(29)]
+
+
+class LatencyHistogram:
+    """Bucketed latency counts for one provider/model; cheap to update."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.total += 1
+
+    def percentile(self, q, default=None):
+        """Upper bound of the bucket holding the q-th percentile."""
+        with self._lock:
+            if not self.total:
+                return default
+            rank = math.ceil(self.total * q / 100)
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return BUCKETS[min(i, len(BUCKETS) - 1)]
+        return default
+
+    def summary(self):
+        if not self.total:
+            return "no samples"
+        return (f"n={self.total} p50={self.percentile(50):.2f}s "
+                f"p95={self.percentile(95):.2f}s p99={self.percentile(99):.2f}s")
+
+
+class Hedger:
+    """
+    Runs provider calls with hedging, as tasks on the caller's event loop.
+
+    The first call starts immediately. If it hasn't produced a valid
+    result after the hedge delay (the primary's p50 from its histogram),
+    the next call is started alongside it, and so on. The first valid
+    result wins and the losers are cancelled, in flight or not.
+    """
+
+    def __init__(self, percentile=50, default_delay=2.0, min_delay=0.3, min_samples=5):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            return self.histograms[name]
+
+    def timed(self, name, fn):
+        """Run fn() and record its latency under `name`."""
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self.histogram(name).observe(time.monotonic() - start)
+
+    async def timed_async(self, name, coro):
+        """Await coro and record its latency under `name` (not if it gets cancelled)."""
+        start = time.monotonic()
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            raise   # a cancelled hedge loser says nothing about the provider
+        except Exception:
+            self.histogram(name).observe(time.monotonic() - start)
+            raise
+        self.histogram(name).observe(time.monotonic() - start)
+        return result
+
+    def delay_for(self, name):
+        hist = self.histogram(name)
+        if hist.total < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, hist.percentile(self.percentile, self.default_delay))
+
+    async def run(self, calls):
+        """
+        calls: list of (name, fn) in preference order; fn() returns a
+        coroutine that yields a result or None.
+        Returns (name, result) of the first valid result, or (None, None).
+        """
+        if not calls:
+            return None, None
+
+        pending = {}
+        remaining = list(calls)
+
+        def launch():
+            name, fn = remaining.pop(0)
+            pending[asyncio.ensure_future(self.timed_async(name, fn()))] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = self.delay_for(calls[0][0]) if remaining else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ {name} failed: {e}")
+                        result = None
+                    if result:
+                        return name, result
+
+                # Timed out waiting (hedge) or a call came back empty (replace it)
+                if remaining:
+                    if not done:
+                        logger.info(f"⏱️ No answer yet, hedging with {remaining[0][0]}...")
+                    launch()
+            return None, None
+        finally:
+            for loser in pending:
+                loser.cancel()
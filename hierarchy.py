@@ -0,0 +1,138 @@
+# hierarchy.py
+# ============================================
+# UI HIERARCHY FAST PATH
+# Find text targets in `uiautomator dump` before asking a vision model
+# ============================================
+import io
+import logging
+import re
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+DUMP_PATH = "/sdcard/declutter_window_dump.xml"
+BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+URL_RE = re.compile(r"https?://[^\s\"'<>]+", re.IGNORECASE)
+
+
+def dump(device):
+    """Raw view-hierarchy XML (bytes) over the adbutils connection, or None."""
+    try:
+        data = device.shell(
+            f"uiautomator dump {DUMP_PATH} >/dev/null 2>&1 && cat {DUMP_PATH}",
+            encoding=None,
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ uiautomator dump failed: {e}")
+        return None
+    start = data.find(b"<?xml") if data else -1
+    return data[start:] if start >= 0 else None
+
+
+def iter_nodes(xml_bytes):
+    """
+    Stream (text, content_desc, clickable, bounds) for every node.
+    Uses iterparse and clears elements as it goes, so big WebView trees
+    never sit in memory as a full DOM.
+    """
+    try:
+        for _, elem in ET.iterparse(io.BytesIO(xml_bytes), events=("end",)):
+            if elem.tag != "node":
+                continue
+            match = BOUNDS_RE.match(elem.get("bounds", ""))
+            if match:
+                yield (
+                    elem.get("text", ""),
+                    elem.get("content-desc", ""),
+                    elem.get("clickable") == "true",
+                    tuple(int(v) for v in match.groups()),
+                )
+            elem.clear()
+    except ET.ParseError as e:
+        logger.warning(f"⚠️ Bad hierarchy XML: {e}")
+
+
+def _score(label, keywords):
+    """2 = exact keyword, 1 = keyword inside a longer label, 0 = no match."""
+    label = label.strip().lower()
+    if not label:
+        return 0
+    best = 0
+    for keyword in keywords:
+        if label == keyword:
+            return 2
+        if keyword in label:
+            best = 1
+    return best
+
+
+def find_text(xml_bytes, keywords, screen_size=None, require_clickable=False):
+    """
+    Best on-screen node whose text or content-desc matches a keyword.
+
+    Exact matches beat substring matches, clickable beats plain text,
+    and later nodes (drawn on top, e.g. an open drawer) beat earlier ones.
+    Returns an analyze_screen-shaped dict or None.
+    """
+    keywords = [k.lower() for k in keywords]
+    width, height = screen_size or (10 ** 6, 10 ** 6)
+    best = None
+
+    for text, desc, clickable, (x1, y1, x2, y2) in iter_nodes(xml_bytes):
+        if require_clickable and not clickable:
+            continue
+        if x2 <= x1 or y2 <= y1 or x1 < 0 or y1 < 0 or x2 > width or y2 > height:
+            continue  # off-screen or collapsed
+        score = max(_score(text, keywords), _score(desc, keywords))
+        if not score:
+            continue
+        rank = (score, clickable)
+        if best is None or rank >= best[0]:
+            best = (rank, text or desc, ((x1 + x2) // 2, (y1 + y2) // 2))
+
+    if best is None:
+        return None
+    _, label, (x, y) = best
+    return {"found": True, "point": [x, y], "label": label, "source": "hierarchy"}
+
+
+def heading(xml_bytes, top=0):
+    """
+    Text of the topmost labelled node starting at or below `top` (pixels),
+    e.g. the folder name over a Gmail list. None if nothing is labelled.
+    """
+    best = None
+    for text, _, _, (x1, y1, x2, y2) in iter_nodes(xml_bytes):
+        if not text.strip() or y1 < top or x2 <= x1 or y2 <= y1:
+            continue
+        if best is None or (y1, x1) < best[0]:
+            best = ((y1, x1), text.strip())
+    return best[1] if best else None
+
+
+def find_url(xml_bytes, hints=("unsub", "opt", "optout", "preferences")):
+    """
+    A web address shown as text in the tree (e.g. Gmail's long-press link
+    popup). URLs containing one of `hints` win; None if there is none.
+    """
+    if not xml_bytes:
+        return None
+    first = None
+    for text, desc, _, _ in iter_nodes(xml_bytes):
+        for label in (text, desc):
+            match = URL_RE.search(label)
+            if not match:
+                continue
+            url = match.group(0).rstrip(".,;)")
+            if any(h in url.lower() for h in hints):
+                return url
+            first = first or url
+    return first
+
+
+def locate(device, keywords, screen_size=None, require_clickable=False):
+    """Dump + find in one call. None if the tree has no match."""
+    xml_bytes = dump(device)
+    if not xml_bytes:
+        return None
+    return find_text(xml_bytes, keywords, screen_size, require_clickable)
@@ -0,0 +1,129 @@
+# inbox_queue.py
+# ============================================
+# INBOX PAGE QUEUE
+# One vision call per list page, then work through the rows locally
+# ============================================
+import logging
+
+import numpy as np
+
+import settle
+
+logger = logging.getLogger(__name__)
+
+ROW_HEIGHT = 0.08      # fallback row height, fraction of the screen
+ROW_CHANGE = 0.08      # fraction of a row's pixels that may change before we distrust it
+
+
+def row_key(row):
+    """Identity of an email row across scrolls and re-extractions."""
+    return (str(row.get("sender", "")).strip().lower(), str(row.get("subject", "")).strip().lower())
+
+
+def clean_rows(result, screen_size):
+    """Valid rows from an extraction result, top to bottom."""
+    width, height = screen_size
+    rows = []
+    for row in (result or {}).get("rows") or []:
+        point = row.get("point") if isinstance(row, dict) else None
+        if not point or len(point) < 2:
+            continue
+        x, y = int(point[0]), int(point[1])
+        if not (0 <= x < width and 0 <= y < height):
+            continue
+        # Same rule as find_and_open_email: stay left of the star/reply icons
+        if x > 600 * width // 720:
+            x = 300 * width // 720
+        rows.append({"sender": row.get("sender", ""), "subject": row.get("subject", ""), "point": [x, y]})
+    rows.sort(key=lambda r: r["point"][1])
+    return rows
+
+
+class InboxQueue:
+    """
+    Email rows extracted from one screenshot of the list, plus the
+    low-res signature of that screenshot.
+
+    Before a queued row is tapped, its band of the current frame is
+    compared with the same band of the extraction frame: if the list has
+    moved, the queue is dropped and the page re-extracted. Rows that were
+    already handled are remembered so a re-extraction doesn't repeat them;
+    `skip(row)` can drop more (e.g. rows settled by an earlier run). It is
+    asked when a page is loaded and again before each row is served.
+    """
+
+    def __init__(self, skip=None):
+        self.rows = []
+        self.done = set()
+        self.skip = skip
+        self.stats = {"extractions": 0, "served": 0, "invalidated": 0, "skipped": 0}
+        self._signature = None
+        self._row_height = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load(self, frame, rows):
+        """Replace the queue with freshly extracted rows. Returns how many are new."""
+        self.stats["extractions"] += 1
+        self._signature = settle.signature(frame)
+        self.rows = [r for r in rows if row_key(r) not in self.done]
+        if self.skip is not None:
+            skipped = [r for r in self.rows if self.skip(r)]
+            self.stats["skipped"] += len(skipped)
+            self.done.update(row_key(r) for r in skipped)
+            self.rows = [r for r in self.rows if r not in skipped]
+
+        ys = [r["point"][1] for r in rows]
+        gaps = [b - a for a, b in zip(ys, ys[1:]) if b > a]
+        self._row_height = int(np.median(gaps)) if gaps else int(frame.size[1] * ROW_HEIGHT)
+        return len(self.rows)
+
+    def _band(self, sig, y, screen_height):
+        """Rows of a signature covering the email row centred at y."""
+        top = int(screen_height * settle.STATUS_BAR)
+        half = self._row_height // 2
+        start = max(0, (y - half - top) // settle.SAMPLE_STEP)
+        stop = max(start + 1, (y + half - top) // settle.SAMPLE_STEP)
+        return sig[start:stop]
+
+    def still_valid(self, frame, row):
+        """Is this row still where it was when the page was extracted?"""
+        if self._signature is None or frame is None:
+            return False
+        current = settle.signature(frame)
+        if current.shape != self._signature.shape:
+            return False
+        y, height = row["point"][1], frame.size[1]
+        before = self._band(self._signature, y, height)
+        after = self._band(current, y, height)
+        changed = np.count_nonzero(np.abs(before - after) > settle.PIXEL_DELTA)
+        return changed <= ROW_CHANGE * before.size
+
+    def next_row(self, frame):
+        """
+        Next untouched row that still lines up with `frame`, or None
+        (queue empty, or the list moved and needs re-extracting).
+        """
+        while self.rows:
+            row = self.rows[0]
+            # Settled since the page was read (e.g. same sender further up)
+            if self.skip is not None and self.skip(row):
+                self.stats["skipped"] += 1
+                self.mark_done(row)
+                continue
+            if self.still_valid(frame, row):
+                self.stats["served"] += 1
+                return row
+            logger.info("🔀 Inbox list moved since extraction, re-reading page...")
+            self.stats["invalidated"] += 1
+            self.rows = []
+        return None
+
+    def mark_done(self, row):
+        """Row handled (or given up on) - never serve it again."""
+        self.done.add(row_key(row))
+        if self.rows and self.rows[0] is row:
+            self.rows.pop(0)
+        else:
+            self.rows = [r for r in self.rows if r is not row]
@@ -0,0 +1,241 @@
+# input_channel.py
+# ============================================
+# PERSISTENT ADB INPUT CHANNEL
+# One long-lived shell per device, gesture scripts in one round-trip
+# ============================================
+import itertools
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Linux input event codes used for sendevent injection
+EV_SYN, EV_KEY, EV_ABS = 0, 1, 3
+BTN_TOUCH = 330
+ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID = 53, 54, 57
+RELEASE_ID = 4294967295  # -1 as the unsigned value sendevent expects
+
+SWIPE_STEP_MS = 16       # one move event per frame
+DONE_MARKER = "__DC_DONE_"  # echoed after every batch on the persistent shell
+_DEVICE_RE = re.compile(r"add device \d+: (\S+)")
+_AXIS_RE = re.compile(r"ABS_MT_POSITION_([XY])\s*:.*?max (\d+)")
+
+
+class Script:
+    """
+    A batch of gestures: taps, swipes, keyevents and pauses.
+    Built up with chained calls and run by InputChannel.run().
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def tap(self, x, y):
+        self.steps.append(("tap", int(x), int(y)))
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration_ms=300):
+        self.steps.append(("swipe", int(x1), int(y1), int(x2), int(y2), int(duration_ms)))
+        return self
+
+    def key(self, keycode):
+        self.steps.append(("key", keycode))
+        return self
+
+    def sleep(self, seconds):
+        self.steps.append(("sleep", seconds))
+        return self
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def parse_touch_device(getevent_output):
+    """(path, max_x, max_y) of the multi-touch screen in `getevent -pl` output, or None."""
+    for block in re.split(r"(?=add device)", getevent_output or ""):
+        match = _DEVICE_RE.search(block)
+        axes = dict((axis, int(value)) for axis, value in _AXIS_RE.findall(block))
+        if match and "X" in axes and "Y" in axes:
+            return match.group(1), axes["X"], axes["Y"]
+    return None
+
+
+class InputChannel:
+    """
+    Keeps one interactive `adb shell` open and writes input commands to
+    it, instead of opening a new shell connection per tap.
+
+    Each batch ends with an echo of a unique marker; run() reads until it
+    sees the marker, so a batch costs one round-trip. With sendevent=True
+    taps and swipes are written straight to the touchscreen's event node,
+    skipping the `input` command's JVM start-up. Keyevents always go
+    through `input`.
+
+    persistent=False, or a device without an interactive shell, falls
+    back to one `device.shell()` call per batch.
+    """
+
+    def __init__(self, device, persistent=True, sendevent=False, timeout=10.0):
+        self.device = device
+        self.persistent = persistent
+        self.timeout = timeout
+        self.stats = {"batches": 0, "commands": 0, "reconnects": 0}
+        self._conn = None
+        self._markers = itertools.count(1)
+        self._lock = threading.Lock()
+        self._touch = self._probe_touch() if sendevent else None
+
+    # --- connection ---
+    def _open(self):
+        if not self.persistent:
+            return None
+        try:
+            conn = self.device.shell("", stream=True)
+        except Exception as e:
+            conn = None
+            logger.debug(f"No interactive shell ({e})")
+        if not hasattr(conn, "send"):
+            logger.info("ℹ️ No persistent shell, using one shell call per input batch")
+            self.persistent = False
+            return None
+        conn.conn.settimeout(self.timeout)
+        return conn
+
+    def _drop(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._drop()
+
+    def _probe_touch(self):
+        """Touchscreen event node and its scale relative to screen pixels."""
+        try:
+            found = parse_touch_device(self.device.shell("getevent -pl"))
+            size = re.search(r"(\d+)x(\d+)", self.device.shell("wm size") or "")
+        except Exception as e:
+            logger.warning(f"⚠️ sendevent probe failed: {e}")
+            return None
+        if not found or not size:
+            logger.info("ℹ️ No multi-touch node found, taps stay on `input`")
+            return None
+        path, max_x, max_y = found
+        width, height = int(size.group(1)), int(size.group(2))
+        return path, (max_x + 1) / width, (max_y + 1) / height
+
+    # --- script -> shell lines ---
+    def _touch_lines(self, points, step_ms):
+        """sendevent lines for one finger going down at points[0] and up at points[-1]."""
+        path, sx, sy = self._touch
+        lines = [f"sendevent {path} {EV_ABS} {ABS_MT_TRACKING_ID} 1"]
+        for i, (x, y) in enumerate(points):
+            if i and step_ms:
+                lines.append(f"sleep {step_ms / 1000:.3f}")
+            lines.append(f"sendevent {path} {EV_ABS} {ABS_MT_POSITION_X} {int(x * sx)}")
+            lines.append(f"sendevent {path} {EV_ABS} {ABS_MT_POSITION_Y} {int(y * sy)}")
+            if i == 0:
+                lines.append(f"sendevent {path} {EV_KEY} {BTN_TOUCH} 1")
+            lines.append(f"sendevent {path} {EV_SYN} 0 0")
+        lines += [
+            f"sendevent {path} {EV_ABS} {ABS_MT_TRACKING_ID} {RELEASE_ID}",
+            f"sendevent {path} {EV_KEY} {BTN_TOUCH} 0",
+            f"sendevent {path} {EV_SYN} 0 0",
+        ]
+        return lines
+
+    def _lines(self, script):
+        lines = []
+        for step in script.steps:
+            kind = step[0]
+            if kind == "tap":
+                _, x, y = step
+                if self._touch:
+                    lines += self._touch_lines([(x, y)], 0)
+                else:
+                    lines.append(f"input tap {x} {y}")
+            elif kind == "swipe":
+                _, x1, y1, x2, y2, duration = step
+                if self._touch:
+                    steps = max(2, duration // SWIPE_STEP_MS)
+                    points = [(x1 + (x2 - x1) * i / steps, y1 + (y2 - y1) * i / steps)
+                              for i in range(steps + 1)]
+                    lines += self._touch_lines(points, SWIPE_STEP_MS)
+                else:
+                    lines.append(f"input swipe {x1} {y1} {x2} {y2} {duration}")
+            elif kind == "key":
+                lines.append(f"input keyevent {step[1]}")
+            elif kind == "sleep":
+                lines.append(f"sleep {step[1]:.3f}")
+        return lines
+
+    # --- execution ---
+    def run(self, script):
+        """Run a Script (or a list of raw shell lines) in one round-trip."""
+        lines = self._lines(script) if isinstance(script, Script) else list(script)
+        if not lines:
+            return ""
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["commands"] += len(lines)
+            if self._conn is None:
+                self._conn = self._open()
+            if self._conn is None:
+                return self.device.shell("; ".join(lines))
+            try:
+                marker = self._write(lines)
+            except Exception as e:
+                # Shell died before taking the batch (device replugged, adb restarted): reopen once
+                logger.warning(f"⚠️ Input shell lost ({e}), reconnecting...")
+                self.stats["reconnects"] += 1
+                self._conn = self._open()
+                if self._conn is None:
+                    return self.device.shell("; ".join(lines))
+                marker = self._write(lines)
+            try:
+                return self._read(marker)
+            except Exception as e:
+                # The batch is already on the device: sending it again could tap
+                # twice. Drop the shell so the next batch reconnects; a lost tap
+                # shows up in the caller's screen-change check instead.
+                logger.warning(f"⚠️ Input shell lost after the batch was sent ({e}), not resending")
+                self._drop()
+                return ""
+
+    def _write(self, lines):
+        """Send the batch plus its done-marker echo; returns the marker number."""
+        marker = next(self._markers)
+        # Quoted so the shell's echo of our input never contains the marker itself
+        script = "\n".join(lines) + f'\necho "{DONE_MARKER[:4]}""{DONE_MARKER[4:]}{marker}"\n'
+        self._conn.send(script.encode())
+        return marker
+
+    def _read(self, marker):
+        """Shell output up to the batch's done-marker."""
+        expected = f"{DONE_MARKER}{marker}".encode()
+        buffer = b""
+        deadline = time.monotonic() + self.timeout
+        while expected not in buffer:
+            if time.monotonic() > deadline:
+                raise TimeoutError("input batch timed out")
+            chunk = self._conn.recv(4096)
+            if not chunk:
+                raise ConnectionError("input shell closed")
+            buffer += chunk
+        return buffer[:buffer.index(expected)].decode("utf-8", errors="ignore")
+
+    # --- one-gesture helpers ---
+    def tap(self, x, y):
+        return self.run(Script().tap(x, y))
+
+    def swipe(self, x1, y1, x2, y2, duration_ms=300):
+        return self.run(Script().swipe(x1, y1, x2, y2, duration_ms))
+
+    def key(self, keycode):
+        return self.run(Script().key(keycode))
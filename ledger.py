@@ -0,0 +1,173 @@
+# ledger.py
+# ============================================
+# PROCESSED-EMAIL LEDGER
+# Remembers what every run did, so the next one only touches new mail
+# ============================================
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UNSUBSCRIBED = "unsubscribed"
+NO_LINK = "no_link"
+FAILED = "failed"
+PENDING = "pending"         # opened, outcome not recorded yet (crash mid-email)
+
+MAX_ATTEMPTS = 2            # failed/pending emails are retried this many times in total
+RESUME_WINDOW = 6 * 3600    # an unfinished run older than this starts over
+
+
+def _norm(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def fingerprint(sender, subject):
+    """Stable id of one email: normalised sender + subject."""
+    return hashlib.sha1(f"{_norm(sender)}\n{_norm(subject)}".encode("utf-8")).hexdigest()[:16]
+
+
+class Run:
+    """Checkpoint of one clean_promotions pass: how far it got."""
+
+    def __init__(self, run_id, account, target, done=0, cleaned=0):
+        self.id = run_id
+        self.account = account
+        self.target = target
+        self.done = done
+        self.cleaned = cleaned
+
+
+class Ledger:
+    """
+    SQLite record of every email the agent opened, per account (device
+    serial): sender/subject fingerprint, outcome and attempt count.
+
+    An email is settled - never opened again - once its sender has been
+    unsubscribed (any subject), it turned out to have no unsubscribe link,
+    or it failed MAX_ATTEMPTS times. Runs are checkpointed after every
+    email, so a crashed run resumes where it stopped.
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS emails ("
+            "account TEXT, fingerprint TEXT, sender TEXT, subject TEXT, outcome TEXT, "
+            "attempts INTEGER, updated REAL, PRIMARY KEY (account, fingerprint));"
+            "CREATE INDEX IF NOT EXISTS emails_sender ON emails (account, sender, outcome);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, account TEXT, target INTEGER, "
+            "done INTEGER, cleaned INTEGER, started REAL, updated REAL, finished INTEGER);"
+        )
+        self._db.commit()
+
+    # --- emails ---
+    def settled(self, account, sender, subject):
+        """Should this email be left alone?"""
+        with self._lock:
+            if sender and self._db.execute(
+                "SELECT 1 FROM emails WHERE account = ? AND sender = ? AND outcome = ? LIMIT 1",
+                (account, _norm(sender), UNSUBSCRIBED),
+            ).fetchone():
+                return True
+            row = self._db.execute(
+                "SELECT outcome, attempts FROM emails WHERE account = ? AND fingerprint = ?",
+                (account, fingerprint(sender, subject)),
+            ).fetchone()
+        if row is None:
+            return False
+        outcome, attempts = row
+        return outcome in (UNSUBSCRIBED, NO_LINK) or attempts >= MAX_ATTEMPTS
+
+    def begin(self, account, sender, subject):
+        """Email opened: pending until record() says how it went."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO emails VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (account, fingerprint) DO UPDATE SET "
+                "outcome = excluded.outcome, attempts = attempts + 1, updated = excluded.updated",
+                (account, fingerprint(sender, subject), _norm(sender), _norm(subject), PENDING, time.time()),
+            )
+            self._db.commit()
+
+    def record(self, account, sender, subject, outcome):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO emails VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (account, fingerprint) DO UPDATE SET "
+                "outcome = excluded.outcome, updated = excluded.updated",
+                (account, fingerprint(sender, subject), _norm(sender), _norm(subject), outcome, time.time()),
+            )
+            self._db.commit()
+
+    def counts(self, account):
+        """{outcome: emails} for one account."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT outcome, COUNT(*) FROM emails WHERE account = ? GROUP BY outcome", (account,)
+            ).fetchall()
+        return dict(rows)
+
+    # --- run checkpoints ---
+    def resume(self, account, target):
+        """The unfinished run for this account and target, or a new one."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, done, cleaned FROM runs WHERE account = ? AND target = ? AND finished = 0 "
+                "AND updated >= ? ORDER BY id DESC LIMIT 1",
+                (account, target, now - RESUME_WINDOW),
+            ).fetchone()
+            if row is not None and row[1] < target:
+                return Run(row[0], account, target, row[1], row[2])
+            # Anything else left open is abandoned
+            self._db.execute("UPDATE runs SET finished = 1 WHERE account = ? AND finished = 0", (account,))
+            cursor = self._db.execute(
+                "INSERT INTO runs (account, target, done, cleaned, started, updated, finished) "
+                "VALUES (?, ?, 0, 0, ?, ?, 0)", (account, target, now, now),
+            )
+            self._db.commit()
+            return Run(cursor.lastrowid, account, target)
+
+    def checkpoint(self, run, cleaned):
+        """One more email handled (cleaned or not)."""
+        run.done += 1
+        run.cleaned += 1 if cleaned else 0
+        with self._lock:
+            self._db.execute("UPDATE runs SET done = ?, cleaned = ?, updated = ? WHERE id = ?",
+                             (run.done, run.cleaned, time.time(), run.id))
+            self._db.commit()
+
+    def finish(self, run):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished = 1, updated = ? WHERE id = ?", (time.time(), run.id))
+            self._db.commit()
+
+    def backup(self, path):
+        """Copy the ledger as it is now to `path` (SQLite online backup)."""
+        with self._lock:
+            target = sqlite3.connect(path)
+            try:
+                self._db.backup(target)
+            finally:
+                target.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_ledger(db_path):
+    """Ledger at db_path, or None (with a warning) if SQLite can't open it."""
+    try:
+        return Ledger(db_path)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Email ledger unavailable: {e}")
+        return None
@@ -4,28 +4,38 @@
 # Pure AI Vision - No Hardcoded Fallbacks
 # Gemini + Groq Llama 4 Scout Vision
 # ============================================
-import numoy
 import os
-import io
 import time
+import asyncio
 import json
 import logging
-import subprocess
-import datetime
-import base64
+import atexit
 from dotenv import load_dotenv
 
-import google.generativeai as genai
-from PIL import Image
-
-# Groq import
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
-
 import utils
+import capture
+import recorder
+import vision_cache
+import roi
+import settle
+import coord_cache
+import hierarchy
+import inbox_queue
+import template_match
+import hedging
+import fleet
+import ratelimit
+import tracing
+import providers
+import vision_api
+import ledger
+import unsubscribe_http
+import screen_targets
+import screen_state
+import session
+import stitch
+from frame import ScreenFrame
+from prompts import CHECK_STATE_PROMPT
 
 # --- SETUP ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -36,36 +46,69 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 load_dotenv()
 
+# Debug frames are saved off-thread (RECORD_FRAMES=0 disables)
+frame_recorder = recorder.from_env(os.path.join(OUTPUT_FOLDER, "frames"))
+atexit.register(frame_recorder.flush)
+
+# Stage spans + counters (TRACE=1): Agent-output/trace.jsonl and metrics.prom
+tracing.from_env(OUTPUT_FOLDER)
+atexit.register(tracing.flush)
+
+# Session archive for offline replay (SESSION_RECORD=1): Agent-output/sessions/<time>,
+# created by start_session() so importing this module never starts an archive
+session_recorder = None
+
 # ============================================
 # API CONFIGURATION
 # ============================================
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("✅ Gemini API configured")
-else:
-    logger.warning("⚠️ GEMINI_API_KEY missing")
+# Provider clients are built on their first call (see providers.py), so
+# start-up only reads the keys. They keep pooled connections for the run.
+providers.log_status()
+atexit.register(vision_api.shutdown)
 
 GEMINI_MODEL = "gemini-2.0-flash-exp"
 
-# Groq Setup with Llama 4 Scout (Vision model)
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-groq_client = None
-if GROQ_API_KEY and GROQ_AVAILABLE:
-    groq_client = Groq(api_key=GROQ_API_KEY)
-    logger.info("✅ Groq API configured (Llama 4 Scout Vision)")
-else:
-    logger.warning("⚠️ GROQ_API_KEY missing or groq not installed")
-
 # Working Groq Vision Models (Jan 2026)
 GROQ_VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 GROQ_VISION_BACKUP = "meta-llama/llama-4-maverick-17b-128e-instruct"
 
+# Hedged routing: if the primary hasn't answered within its p50 latency,
+# fire the next provider in parallel and take whichever answers first.
+HEDGE_MODE = os.environ.get("HEDGE_MODE", "0").lower() in ("1", "true", "on", "yes")
+hedger = hedging.Hedger(
+    percentile=int(os.environ.get("HEDGE_PERCENTILE", "50")),
+    default_delay=float(os.environ.get("HEDGE_DEFAULT_DELAY", "2.0")),
+)
+
+# Per-model quotas (requests/min, tokens/min), free-tier defaults.
+# Calls queue for quota instead of tripping a 429; a 429 that gets through
+# opens that provider's breaker for the server's retry-after hint.
+GROQ_LIMITS = (int(os.environ.get("GROQ_RPM", "30")), int(os.environ.get("GROQ_TPM", "30000")))
+GEMINI_LIMITS = (int(os.environ.get("GEMINI_RPM", "10")), int(os.environ.get("GEMINI_TPM", "1000000")))
+rate_control = ratelimit.RateController(
+    {
+        f"groq/{GROQ_VISION_MODEL}": GROQ_LIMITS,
+        f"groq/{GROQ_VISION_BACKUP}": GROQ_LIMITS,
+        "gemini": GEMINI_LIMITS,
+    },
+    admission_timeout=float(os.environ.get("RATE_ADMISSION_TIMEOUT", "30")),
+)
+
+# Image codec per provider: (format, quality). Each frame is encoded once
+# per codec and shared across retries, backup models and fallbacks.
+PROVIDER_CODECS = {
+    "groq": (os.environ.get("GROQ_IMAGE_FORMAT", "PNG").upper(),
+             int(os.environ.get("GROQ_IMAGE_QUALITY", "0")) or None),
+    "gemini": (os.environ.get("GEMINI_IMAGE_FORMAT", "JPEG").upper(),
+               int(os.environ.get("GEMINI_IMAGE_QUALITY", "90")) or None),
+}
+
 # ============================================
 # DEVICE CONFIG - Samsung M11 (720x1600)
 # ============================================
 SCREEN_WIDTH = 720
 SCREEN_HEIGHT = 1600
+GMAIL_PACKAGE = "com.google.android.gm"
 
 # ============================================
 # SMART PROMPTS - AI THINKING
@@ -73,20 +116,39 @@ SCREEN_HEIGHT = 1600
 ANALYZE_SCREEN_PROMPT = """
 You are analyzing a mobile phone screenshot. The screen is 720x1600 pixels.
 
-TASK: Identify what app/screen is currently visible.
+TASK: Say what screen this is AND list every target on it that an
+unsubscribe agent could tap next, in one answer.
 
-Look for:
-1. App header/toolbar at top
-2. Navigation elements (hamburger menu, back arrow)
-3. Content type (email list, email content, browser, menu)
+Screen:
+- "app": "Gmail", "Browser" or "Unknown"
+- "screen_type": "inbox_list", "side_menu", "email_open", "email_footer",
+  "link_menu", "browser_page" or "other"
+- "folder_name": the folder shown in the toolbar/header, or null
+
+Targets (omit or use null/[] when not visible; coordinates on the TEXT or icon):
+- "menu": the hamburger icon (three lines, top-left)
+- "folders": side-menu entries, e.g. Primary, Promotions, Social
+- "rows": every fully visible email row, top to bottom, with sender,
+  subject and whether it is unread (bold). Point on the LEFT text (x < 500),
+  never on star/reply icons. Skip ads and rows cut off at the edges.
+- "unsubscribe": an "Unsubscribe" / "Opt out" / "Manage preferences" link
+  in the email, with its web address only if printed as text
+- "confirm": the button on a web page that confirms unsubscribing
+
+Give every target a "confidence" from 0.0 to 1.0.
 
 Return JSON:
 {
-    "app": "Gmail" or "Browser" or "Unknown",
-    "screen_type": "inbox_list" or "email_open" or "side_menu" or "browser_page" or "other",
-    "has_hamburger_menu": true/false,
-    "hamburger_position": [x, y] or null,
-    "folder_name": "Primary" or "Promotions" or "Social" or null,
+    "app": "Gmail",
+    "screen_type": "inbox_list",
+    "folder_name": "Promotions",
+    "targets": {
+        "menu": {"point": [x, y], "confidence": 0.9},
+        "folders": [{"label": "Promotions", "point": [x, y], "confidence": 0.9}],
+        "rows": [{"sender": "Brand", "subject": "50% off", "unread": true, "point": [x, y], "confidence": 0.8}],
+        "unsubscribe": {"point": [x, y], "link_text": "Unsubscribe", "url": null, "confidence": 0.8},
+        "confirm": {"point": [x, y], "button_text": "Confirm", "confidence": 0.8}
+    },
     "thinking": "brief explanation of what you see"
 }
 """
@@ -154,6 +216,29 @@ IMPORTANT: Return coordinates for the EMAIL SUBJECT TEXT, not icons!
 The subject text is usually x < 500 (left-center of screen).
 """
 
+EXTRACT_INBOX_PROMPT = """
+You are analyzing Gmail's inbox/Promotions folder (720x1600 pixels).
+
+TASK: List EVERY email row that is fully visible on screen, top to bottom.
+
+For each row give:
+- the sender name
+- the subject line (first few words are enough)
+- a point on the sender/subject TEXT (LEFT side, x < 500) that opens the email
+
+IGNORE: the toolbar, folder header, tabs, ads marked "Ad"/"Sponsored",
+rows cut off at the top or bottom edge, and the compose button.
+
+Return JSON:
+{
+    "found": true/false,
+    "rows": [
+        {"sender": "Brand", "subject": "50% off everything", "point": [x, y]}
+    ],
+    "thinking": "I see N email rows..."
+}
+"""
+
 FIND_UNSUBSCRIBE_PROMPT = """
 You are analyzing an open marketing email (720x1600 pixels).
 
@@ -182,6 +267,7 @@ Return JSON:
     "found": true/false,
     "point": [x, y],
     "link_text": "exact text you see",
+    "url": "the link's web address ONLY if it is printed as text on screen, else null",
     "thinking": "I found unsubscribe text at..."
 }
 
@@ -211,82 +297,202 @@ Return JSON:
 }
 """
 
+# ============================================
+# UI HIERARCHY KEYWORDS
+# ============================================
+# Same targets the prompts above describe, matched against view-tree text
+# before any screenshot is sent to a model.
+FOLDER_KEYWORDS = ("Promotions",)
+LIST_HEADER_TOP = 0.1   # below the search bar: the first label there names the open folder
+
+UNSUBSCRIBE_KEYWORDS = (
+    "Unsubscribe", "Opt out", "Opt-out", "Manage preferences", "Stop emails",
+    "Email preferences", "Unsubscribe from this list", "Click here to unsubscribe",
+    "Manage your subscription", "Update email preferences", "Remove from mailing list",
+    "unsub",
+)
+
+CONFIRM_KEYWORDS = (
+    "Unsubscribe", "Confirm", "Yes, unsubscribe", "Remove me", "Update preferences",
+)
+
+USE_HIERARCHY = os.environ.get("UI_HIERARCHY", "1").lower() not in ("0", "false", "off", "no")
+USE_TEMPLATES = os.environ.get("TEMPLATE_MATCH", "1").lower() not in ("0", "false", "off", "no")
+# Safety cap for footer seeking on very long newsletters
+FOOTER_MAX_FLINGS = int(os.environ.get("FOOTER_MAX_FLINGS", "12"))
+INBOX_MAX_PAGES = int(os.environ.get("INBOX_MAX_PAGES", "5"))
+# Read every row of the list in one call and work through them locally
+USE_INBOX_QUEUE = os.environ.get("INBOX_QUEUE", "1").lower() not in ("0", "false", "off", "no")
+
+# Combined analysis: one ANALYZE_SCREEN_PROMPT call per screen answers
+# every step's prompt below from the cached result. A target reported
+# under COMBINED_MIN_CONFIDENCE falls back to the step's own prompt.
+# Off by default: it sends full frames where the step prompts send crops,
+# and pays off mainly when steps miss (no link, wrong screen) or the
+# local hierarchy/template paths are unavailable.
+USE_COMBINED = os.environ.get("COMBINED_ANALYSIS", "0").lower() in ("1", "true", "on", "yes")
+COMBINED_MIN_CONFIDENCE = float(os.environ.get("COMBINED_MIN_CONFIDENCE", "0.5"))
+PROMPT_TARGETS = {
+    FIND_MENU_PROMPT: screen_targets.MENU,
+    FIND_FOLDER_PROMPT: screen_targets.FOLDER,
+    EXTRACT_INBOX_PROMPT: screen_targets.ROWS,
+    FIND_EMAIL_PROMPT: screen_targets.EMAIL,
+    FIND_UNSUBSCRIBE_PROMPT: screen_targets.UNSUBSCRIBE,
+    BROWSER_CONFIRM_PROMPT: screen_targets.CONFIRM,
+}
+
+# ============================================
+# REGIONS OF INTEREST
+# ============================================
+# Fraction of the screen (left, top, right, bottom) each prompt needs.
+# Prompts not listed here always get the full frame.
+PROMPT_ROI = {
+    FIND_MENU_PROMPT: (0.0, 0.0, 0.5, 0.15),         # top-left toolbar
+    FIND_EMAIL_PROMPT: (0.0, 0.1, 0.7, 1.0),         # sender/subject column of the list
+    FIND_UNSUBSCRIBE_PROMPT: (0.0, 0.45, 1.0, 1.0),  # email footer
+}
+ROI_PROMPTS = {prompt: roi.with_roi_note(prompt) for prompt in PROMPT_ROI}
+
+# ============================================
+# LONG CAPTURE
+# ============================================
+# Look for the unsubscribe link in one image stitched from the last few
+# screens of the email instead of one screen (and one call) at a time; a
+# link cut by the screen edge is whole there. The hit is scrolled back
+# into view before the tap. Captures taller than LONG_CAPTURE_MAX_HEIGHT
+# go out as overlapping tiles, analysed together.
+USE_LONG_CAPTURE = os.environ.get("LONG_CAPTURE", "1").lower() not in ("0", "false", "off", "no")
+LONG_CAPTURE_SCREENS = int(os.environ.get("LONG_CAPTURE_SCREENS", "2"))
+LONG_CAPTURE_MAX_HEIGHT = int(os.environ.get("LONG_CAPTURE_MAX_HEIGHT", "4000"))
+LONG_TILE_OVERLAP = 200
+DRAG_MS = 800  # slow enough to scroll by about the finger distance (alignment measures the rest)
+FIND_UNSUBSCRIBE_LONG_PROMPT = stitch.with_long_note(FIND_UNSUBSCRIBE_PROMPT)
+
+# ============================================
+# VISION RESPONSE CACHE
+# ============================================
+# Seconds a cached answer stays valid, per prompt. Toolbar and drawer
+# layouts are stable for days; list positions change quickly.
+VISION_CACHE_TTLS = {
+    FIND_MENU_PROMPT: 7 * 24 * 3600,
+    FIND_FOLDER_PROMPT: 7 * 24 * 3600,
+    FIND_EMAIL_PROMPT: 60,
+    EXTRACT_INBOX_PROMPT: 60,
+    ANALYZE_SCREEN_PROMPT: 60,       # holds list rows, so as short as theirs
+    # 0 = never cached: one email's footer or one page, and a low-res hash
+    # can't tell two senders' footers or confirm pages apart
+    FIND_UNSUBSCRIBE_PROMPT: 0,
+    FIND_UNSUBSCRIBE_LONG_PROMPT: 0,
+    BROWSER_CONFIRM_PROMPT: 0,
+    CHECK_STATE_PROMPT: 24 * 3600,   # what a screen is doesn't change
+}
+VISION_CACHE_TTLS.update({ROI_PROMPTS[p]: VISION_CACHE_TTLS[p] for p in ROI_PROMPTS})
+
+response_cache = None
+if os.environ.get("VISION_CACHE", "1").lower() not in ("0", "false", "off", "no"):
+    response_cache = vision_cache.VisionCache(
+        tolerance=int(os.environ.get("VISION_CACHE_TOLERANCE", "6")),
+        ttls=VISION_CACHE_TTLS,
+        db_path=os.environ.get("VISION_CACHE_DB", os.path.join(OUTPUT_FOLDER, "vision_cache.sqlite3")),
+    )
+
+# ============================================
+# PROCESSED-EMAIL LEDGER
+# ============================================
+# Outcome of every email opened, per device, plus a checkpoint per run:
+# settled senders are skipped and a crashed run picks up where it stopped.
+email_ledger = None
+if os.environ.get("LEDGER", "1").lower() not in ("0", "false", "off", "no"):
+    email_ledger = ledger.open_ledger(
+        os.environ.get("LEDGER_DB", os.path.join(OUTPUT_FOLDER, "ledger.sqlite3")))
+
+# ============================================
+# HOST-SIDE UNSUBSCRIBE
+# ============================================
+# When the link's address can be read, unsubscribe over HTTP from this
+# machine instead of opening the phone's browser; the browser stays the
+# fallback for pages that need a click.
+http_unsubscriber = None
+if os.environ.get("HTTP_UNSUBSCRIBE", "1").lower() not in ("0", "false", "off", "no"):
+    http_unsubscriber = unsubscribe_http.Unsubscriber(
+        max_concurrency=int(os.environ.get("HTTP_UNSUBSCRIBE_CONCURRENCY", "4")),
+        domain_rpm=int(os.environ.get("HTTP_UNSUBSCRIBE_DOMAIN_RPM", "20")),
+        timeout=float(os.environ.get("HTTP_UNSUBSCRIBE_TIMEOUT", "10")),
+    )
+LONG_PRESS_MS = 800
+VIA_HTTP = "http"  # find_unsubscribe result: done from the host, no browser page to confirm
+
+# ============================================
+# SCREEN STATE MACHINE
+# ============================================
+# Check where we are after every recovery action (window focus, then local
+# icon match, vision last) instead of pressing back a fixed number of times.
+USE_STATE_MACHINE = os.environ.get("SCREEN_STATE", "1").lower() not in ("0", "false", "off", "no")
+RECOVERY_MAX_STEPS = int(os.environ.get("RECOVERY_MAX_STEPS", "8"))
+state_classifier = screen_state.StateClassifier(GMAIL_PACKAGE)
+_on_promotions = set()   # device serials whose list is known to be Promotions
+
 # ============================================
 # SCREENSHOT UTILITY
 # ============================================
-def get_screenshot():
-    """Capture screenshot from device."""
+def get_screenshot(device=None):
+    """
+    Capture screenshot from device (raw framebuffer, no PNG round-trip).
+    Returns a ScreenFrame so every analysis of it shares one encode.
+    """
     try:
-        result = subprocess.run(
-            ["adb", "exec-out", "screencap", "-p"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=10
-        )
-        if result.returncode != 0:
-            return None
-        image_data = io.BytesIO(result.stdout)
-        img = Image.open(image_data)
+        if device is None:
+            device = utils.get_device()
+            if device is None:
+                return None
+        with tracing.span("capture"):
+            img = capture.screencap(device)
         
-        # Save debug copy
-        ts = datetime.datetime.now().strftime("%H-%M-%S")
-        img.save(os.path.join(OUTPUT_FOLDER, f"screen_{ts}.png"))
-        return img
+        # Save debug copy (background thread, deduplicated)
+        frame_recorder.submit(img)
+        return ScreenFrame(img)
     except Exception as e:
         logger.error(f"Screenshot error: {e}")
         return None
 
+@tracing.traced("image_to_base64")
 def image_to_base64(pil_image):
-    """Convert PIL image to base64."""
-    buffered = io.BytesIO()
-    # Resize for faster processing (max 1024 width)
-    if pil_image.width > 1024:
-        ratio = 1024 / pil_image.width
-        new_size = (1024, int(pil_image.height * ratio))
-        pil_image = pil_image.resize(new_size, Image.LANCZOS)
-    pil_image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    """Convert PIL image (or ScreenFrame) to base64 PNG, max 1024 wide."""
+    return ScreenFrame.wrap(pil_image).base64("PNG")
 
 # ============================================
 # GROQ VISION API - LLAMA 4 SCOUT
 # ============================================
-def ask_groq_vision(pil_image, prompt, model=None):
+async def _inline_image(frame, provider):
+    """Frame in the provider's codec; encoding runs off the event loop."""
+    fmt, quality = PROVIDER_CODECS[provider]
+    return await asyncio.to_thread(frame.blob, fmt, quality)
+
+@tracing.traced("ai.groq")
+async def ask_groq_vision_async(frame, prompt, model=None, backup=True):
     """
     Call Groq's Llama 4 Scout Vision model.
     This is the primary AI for screen analysis.
+    backup=False skips the Maverick retry (the hedged router runs it itself).
     """
-    if not groq_client or not pil_image:
+    groq_client = providers.client("groq") if frame else None
+    if not groq_client:
         return None
     
     if model is None:
         model = GROQ_VISION_MODEL
     
-    base64_img = image_to_base64(pil_image)
+    frame = ScreenFrame.wrap(frame)
+    key = f"groq/{model}"
+    if not await asyncio.to_thread(rate_control.admit, key, ratelimit.estimate_tokens(prompt, 500)):
+        return None
+    image = await _inline_image(frame, "groq")
+    tracing.count("ai_calls", provider="groq")
     
     try:
-        response = groq_client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_img}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=500
-        )
-        
-        text = response.choices[0].message.content.strip()
-        data = json.loads(text)
+        text, headers = await groq_client.aanalyze(model, prompt, image, max_tokens=500)
+        rate_control.record_success(key, headers)
+        data = json.loads(text.strip())
         
         # Log AI thinking
         if "thinking" in data:
@@ -296,166 +502,544 @@ def ask_groq_vision(pil_image, prompt, model=None):
         
     except json.JSONDecodeError as e:
         logger.warning(f"⚠️ JSON parse error: {e}")
+        tracing.count("ai_errors", provider="groq", kind="bad_json")
         return None
     except Exception as e:
-        error_str = str(e)
-        if "429" in error_str or "rate" in error_str.lower():
-            logger.warning("⏳ Groq rate limited, waiting...")
-            time.sleep(5)
+        rate_control.record_failure(key, e)
+        if ratelimit.is_rate_limit(e):
+            tracing.count("ai_errors", provider="groq", kind="rate_limit")
             return None
         logger.warning(f"⚠️ Groq error: {e}")
+        tracing.count("ai_errors", provider="groq", kind="error")
         # Try backup model
-        if model == GROQ_VISION_MODEL:
+        if backup and model == GROQ_VISION_MODEL:
             logger.info("🔄 Trying backup model...")
-            return ask_groq_vision(pil_image, prompt, GROQ_VISION_BACKUP)
+            tracing.count("retries", reason="backup_model")
+            return await ask_groq_vision_async(frame, prompt, GROQ_VISION_BACKUP)
         return None
-# gemini vision control
+
+def ask_groq_vision(frame, prompt, model=None, backup=True):
+    """Blocking ask_groq_vision_async, for sync callers."""
+    return vision_api.run(ask_groq_vision_async(frame, prompt, model, backup))
+
 # ============================================
 # GEMINI VISION API
 # ============================================
-def ask_gemini_vision(pil_image, prompt):
+@tracing.traced("ai.gemini")
+async def ask_gemini_vision_async(frame, prompt):
     """Call Gemini for vision analysis."""
-    if not pil_image or not GEMINI_API_KEY:
+    gemini_client = providers.client("gemini") if frame else None
+    if not gemini_client:
         return None
     
+    frame = ScreenFrame.wrap(frame)
+    if not await asyncio.to_thread(rate_control.admit, "gemini", ratelimit.estimate_tokens(prompt, 500)):
+        return None
+    image = await _inline_image(frame, "gemini")
+    tracing.count("ai_calls", provider="gemini")
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(
-            [prompt, pil_image],
-            generation_config={"response_mime_type": "application/json"}
-        )
-        data = json.loads(response.text)
+        text, headers = await gemini_client.aanalyze(GEMINI_MODEL, prompt, image)
+        rate_control.record_success("gemini")
+        data = json.loads(text)
         
         if "thinking" in data:
             logger.info(f"🤖 Gemini: {data['thinking']}")
         
         return data
     except Exception as e:
-        error_str = str(e)
-        if "429" in error_str or "ResourceExhausted" in error_str:
-            logger.warning("⏳ Gemini rate limited")
+        rate_control.record_failure("gemini", e)
+        if ratelimit.is_rate_limit(e):
+            tracing.count("ai_errors", provider="gemini", kind="rate_limit")
             return None
         logger.warning(f"⚠️ Gemini error: {e}")
+        tracing.count("ai_errors", provider="gemini", kind="error")
         return None
 
+def ask_gemini_vision(frame, prompt):
+    """Blocking ask_gemini_vision_async, for sync callers."""
+    return vision_api.run(ask_gemini_vision_async(frame, prompt))
+
 # ============================================
 # SMART AI ROUTER
 # ============================================
+# The router is a coroutine on the shared vision_api loop: captures,
+# encodes and requests of several devices (or speculative prompts) overlap
+# there. analyze_screen() is the blocking facade the pipeline calls.
 def analyze_screen(pil_image, prompt):
     """
-    Smart AI routing: Try Groq first (Llama 4 Scout), then Gemini.
-    Returns analysis result or None.
+    Smart AI routing: Cache first, then Groq (Llama 4 Scout), then Gemini.
+    Blocking form of analyze_screen_async - see there.
     """
+    return vision_api.run(analyze_screen_async(pil_image, prompt))
+
+def analyze_all(requests):
+    """analyze_screen for several (frame, prompt) pairs at once; results in order."""
+    async def gather():
+        return await asyncio.gather(*(analyze_screen_async(frame, prompt) for frame, prompt in requests))
+    return vision_api.run(gather())
+
+async def analyze_screen_async(pil_image, prompt):
+    """
+    Smart AI routing: Cache first, then Groq (Llama 4 Scout), then Gemini.
+    Prompts with a region of interest see only that crop first; the full
+    frame is only sent if the crop comes back found:false.
+    Accepts a PIL image or a ScreenFrame.
+    Returns analysis result (full-screen coordinates) or None.
+    """
+    frame = ScreenFrame.wrap(pil_image)
+    if session_recorder is None:
+        return await _analyze_screen(frame, prompt)
+    start = time.monotonic()
+    result = await _analyze_screen(frame, prompt)
+    session_recorder.vision(frame, prompt, result, start, time.monotonic() - start)
+    return result
+
+async def _analyze_screen(frame, prompt):
+    """analyze_screen_async minus the session recording."""
+    if USE_COMBINED and frame and prompt in PROMPT_TARGETS:
+        result = await analyze_targets(frame, PROMPT_TARGETS[prompt])
+        if result is not None:
+            return result
+        logger.info("🔍 Combined analysis unsure, asking the step's own prompt...")
+        tracing.count("fallbacks", kind="combined_low_confidence")
+    
+    if frame and prompt in PROMPT_ROI:
+        cropped = frame.crop(PROMPT_ROI[prompt])
+        result = await _cached_vision(cropped, ROI_PROMPTS[prompt])
+        if result and result.get("found") is not False:
+            if "point" not in result or roi.to_screen(result, cropped.offset, cropped.size):
+                return result
+        logger.info("🔍 Not found in region of interest, sending full frame...")
+        tracing.count("fallbacks", kind="roi_full_frame")
+    
+    return await _cached_vision(frame, prompt)
+
+async def analyze_targets(frame, kind):
+    """
+    One target out of the combined analysis of this screen. The analysis
+    is cached per frame, so every later step on the same screen is free.
+    None = not trustworthy, ask the dedicated prompt.
+    """
+    analysis = await _cached_vision(frame, ANALYZE_SCREEN_PROMPT)
+    logger.info(f"🧭 Screen: {screen_targets.describe(analysis)}")
+    result = screen_targets.extract(analysis, kind, COMBINED_MIN_CONFIDENCE, label=FOLDER_KEYWORDS[0])
+    if result is not None and analysis.get("cache_hit"):
+        result["cache_hit"] = True
+    return result
+
+def _cache_scope(frame):
+    """Answers are pixel coordinates, so only share them between equal-sized frames."""
+    return "x".join(str(v) for v in frame.size) if frame else ""
+
+async def _cached_vision(frame, prompt):
+    """Vision cache lookup in front of the provider chain (hashing and SQLite off the loop)."""
+    scope = _cache_scope(frame)
+    if response_cache and frame:
+        cached = await asyncio.to_thread(lambda: response_cache.get(prompt, phash=frame.phash, scope=scope))
+        if cached:
+            logger.info("⚡ Vision cache hit - skipped API call")
+            tracing.count("cache_hits", cache="vision")
+            # A look-alike screen's answer: fine for a point, not for what it names
+            cached["cache_hit"] = True
+            return cached
+    
+    result = await _route_vision(frame, prompt)
+    if result and response_cache and frame:
+        await asyncio.to_thread(response_cache.put, prompt, result, phash=frame.phash, scope=scope)
+    return result
+
+def forget_answer(frame, prompt):
+    """Evict cached answers for this screen after a tap that did nothing."""
+    if not response_cache or not frame:
+        return
+    response_cache.invalidate(prompt, phash=frame.phash, scope=_cache_scope(frame))
+    if USE_COMBINED and prompt in PROMPT_TARGETS:
+        response_cache.invalidate(ANALYZE_SCREEN_PROMPT, phash=frame.phash, scope=_cache_scope(frame))
+    if prompt in PROMPT_ROI:
+        cropped = frame.crop(PROMPT_ROI[prompt])
+        response_cache.invalidate(ROI_PROMPTS[prompt], phash=cropped.phash, scope=_cache_scope(cropped))
+
+async def _route_vision(frame, prompt):
+    """Provider fallback chain behind analyze_screen."""
+    await asyncio.to_thread(_wait_for_provider)
+    if HEDGE_MODE:
+        return await _route_hedged(frame, prompt)
+    
     # Try Groq Llama 4 Scout (best for vision)
-    if groq_client:
-        result = ask_groq_vision(pil_image, prompt)
+    if providers.configured("groq") and rate_control.available("groq"):
+        result = await hedger.timed_async("groq/scout", ask_groq_vision_async(frame, prompt))
         if result:
             return result
     
     # Fallback to Gemini
-    if GEMINI_API_KEY:
+    if providers.configured("gemini") and rate_control.available("gemini"):
         logger.info("🔄 Switching to Gemini...")
-        result = ask_gemini_vision(pil_image, prompt)
+        tracing.count("fallbacks", kind="gemini")
+        result = await hedger.timed_async("gemini", ask_gemini_vision_async(frame, prompt))
         if result:
             return result
     
     return None
 
+def _wait_for_provider():
+    """If every configured provider is cooling down after a 429, queue until one reopens."""
+    names = providers.configured_names()
+    if names and not any(rate_control.available(p) for p in names):
+        logger.info("🚦 All providers rate limited, queueing...")
+        rate_control.wait_for_any(names, rate_control.admission_timeout)
+
+async def _route_hedged(frame, prompt):
+    """Same providers, but overlapping on the event loop: the first valid JSON wins."""
+    groq_ready = providers.configured("groq") and rate_control.available("groq")
+    calls = []
+    if groq_ready:
+        calls.append(("groq/scout", lambda: ask_groq_vision_async(frame, prompt, GROQ_VISION_MODEL, backup=False)))
+    if providers.configured("gemini") and rate_control.available("gemini"):
+        calls.append(("gemini", lambda: ask_gemini_vision_async(frame, prompt)))
+    if groq_ready:
+        calls.append(("groq/maverick", lambda: ask_groq_vision_async(frame, prompt, GROQ_VISION_BACKUP, backup=False)))
+    
+    name, result = await hedger.run(calls)
+    if result:
+        logger.info(f"🏁 {name} answered first")
+    return result
+
+def locate_in_tree(device, frame, keywords, require_clickable=False):
+    """View-tree text lookup (local, no API cost). Result or None."""
+    if not (USE_HIERARCHY and keywords):
+        return None
+    result = hierarchy.locate(device, keywords, frame.size if frame else None, require_clickable)
+    if result:
+        logger.info(f"🌲 Found '{result['label']}' in UI hierarchy (no AI call)")
+        tracing.count("local_matches", source="hierarchy")
+    return result
+
+def locate_target(device, frame, prompt, keywords, require_clickable=False):
+    """
+    View-tree text lookup first (local, no API cost), vision model second.
+    Returns an analyze_screen-style result or None.
+    """
+    return locate_in_tree(device, frame, keywords, require_clickable) or analyze_screen(frame, prompt)
+
+def locate_icon(frame, icon, prompt):
+    """
+    Local template match for fixed icons (see templates/), vision model
+    only when the match score is under the confidence threshold.
+    """
+    if USE_TEMPLATES and frame:
+        result = template_match.match(frame, icon)
+        if result:
+            logger.info(f"🎯 Matched {icon} locally (score {result['score']}, no AI call)")
+            tracing.count("local_matches", source="template")
+            return result
+    return analyze_screen(frame, prompt)
+
+# ============================================
+# LEARNED COORDINATES
+# ============================================
+# Hamburger menu and drawer entries don't move for a given device and
+# Gmail build, so remember where they were and skip the AI next time.
+coord_store = None
+if os.environ.get("COORD_CACHE", "1").lower() not in ("0", "false", "off", "no"):
+    coord_store = coord_cache.CoordinateCache(
+        os.environ.get("COORD_CACHE_PATH", os.path.join(OUTPUT_FOLDER, "coords.json"))
+    )
+
+def tap_learned(device, target, frame, expect):
+    """
+    Tap the learned point for `target` without asking the AI.
+    Counts as a hit only if the screen reacts and `expect(device, frame)`
+    recognises where it landed; otherwise the point is evicted.
+    """
+    if not coord_store or not frame:
+        return False
+    profile = coord_cache.profile_key(device, frame.size, GMAIL_PACKAGE)
+    pt = coord_store.lookup(profile, target)
+    if not pt:
+        return False
+    if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), frame):
+        if expect(device, get_screenshot(device)):
+            logger.info(f"📍 Tapped learned {target} at {pt} (no AI call)")
+            coord_store.confirm(profile, target)
+            tracing.count("cache_hits", cache="coords")
+            return True
+        logger.info(f"🗑️ Learned {target} at {pt} opened the wrong screen, asking AI...")
+        coord_store.evict(profile, target)
+        utils.press_back(device)
+        settle.wait_until_stable(device, timeout=1.5)
+        return False
+    logger.info(f"🗑️ Learned {target} at {pt} didn't work, asking AI...")
+    coord_store.evict(profile, target)
+    return False
+
+def drawer_opened(device, frame):
+    """The drawer is showing: its learned signature, or at least no list/email icons."""
+    state, _ = state_classifier.classify(device, frame)
+    return state == screen_state.DRAWER or (
+        state == screen_state.UNKNOWN and not state_classifier.knows_drawer(device))
+
+def promotions_opened(device, frame):
+    """A mail list whose header (when the view tree has text) is the Promotions folder."""
+    state, _ = state_classifier.classify(device, frame)
+    if state != screen_state.LIST:
+        return False
+    tree = hierarchy.dump(device) if USE_HIERARCHY else None
+    title = hierarchy.heading(tree, top=frame.size[1] * LIST_HEADER_TOP) if tree else None
+    return title is None or title.lower() in [k.lower() for k in FOLDER_KEYWORDS]
+
+def learn_target(device, target, frame, pt):
+    """Remember a point the AI found and that worked."""
+    if coord_store and frame:
+        profile = coord_cache.profile_key(device, frame.size, GMAIL_PACKAGE)
+        coord_store.record(profile, target, pt)
+
 # ============================================
 # NAVIGATION ACTIONS
 # ============================================
+@tracing.traced("step.open_menu")
 def open_hamburger_menu(device):
     """Find and tap hamburger menu using AI."""
     logger.info("📂 Finding hamburger menu...")
     
+    if tap_learned(device, "hamburger_menu", get_screenshot(device), drawer_opened):
+        return True
+    
     for attempt in range(3):
-        img = get_screenshot()
+        img = get_screenshot(device)
         if not img:
-            time.sleep(1)
+            tracing.sleep(1)
             continue
             
-        result = analyze_screen(img, FIND_MENU_PROMPT)
+        result = locate_icon(img, "hamburger", FIND_MENU_PROMPT)
         
         if result and result.get("found") and result.get("point"):
             pt = result["point"]
             confidence = result.get("confidence", "medium")
             logger.info(f"✅ Found menu at {pt} (confidence: {confidence})")
-            utils.input_tap(device, pt[0], pt[1])
-            time.sleep(1.5)
-            return True
+            if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img):
+                learn_target(device, "hamburger_menu", img, pt)
+                return True
+            logger.info("🔄 Tap didn't change the screen, retrying...")
+            tracing.count("retries", reason="tap_missed")
+            forget_answer(img, FIND_MENU_PROMPT)
+            continue
         
         logger.info(f"🔄 Attempt {attempt+1}: Menu not found, retrying...")
-        time.sleep(1)
+        settle.wait_until_stable(device, timeout=1)
     
     logger.error("❌ Could not find hamburger menu")
     return False
 
+@tracing.traced("step.navigate")
 def navigate_to_promotions(device):
     """Navigate to Promotions folder using AI."""
     logger.info("📂 Navigating to Promotions...")
+    _on_promotions.discard(device.serial)
     
     # First open the menu
     if not open_hamburger_menu(device):
         return False
     
-    time.sleep(1)
-    
     # Find Promotions folder
+    drawer = get_screenshot(device)
+    state_classifier.remember(device, screen_state.DRAWER, drawer)
+    if tap_learned(device, "promotions_folder", drawer, promotions_opened):
+        _on_promotions.add(device.serial)
+        return True
+    if not drawer_opened(device, get_screenshot(device)) and not open_hamburger_menu(device):
+        return False
+    
+    keywords = FOLDER_KEYWORDS
     for attempt in range(3):
-        img = get_screenshot()
+        img = get_screenshot(device)
         if not img:
-            time.sleep(1)
+            tracing.sleep(1)
             continue
             
-        result = analyze_screen(img, FIND_FOLDER_PROMPT)
+        result = locate_target(device, img, FIND_FOLDER_PROMPT, keywords)
         
         if result and result.get("found") and result.get("point"):
             pt = result["point"]
             label = result.get("label", "Promotions")
             logger.info(f"✅ Found {label} at {pt}")
-            utils.input_tap(device, pt[0], pt[1])
-            time.sleep(2)
-            return True
+            if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img):
+                if label == "Promotions":
+                    learn_target(device, "promotions_folder", img, pt)
+                _on_promotions.add(device.serial)
+                return True
+            logger.info("🔄 Tap didn't change the screen, retrying...")
+            tracing.count("retries", reason="tap_missed")
+            forget_answer(img, FIND_FOLDER_PROMPT)
+            keywords = None  # tree match was a dud, let the AI look
+            continue
         
         # Maybe need to scroll the menu
         logger.info("🔄 Scrolling menu to find Promotions...")
         utils.input_swipe(device, 360, 800, 360, 400, 300)
-        time.sleep(1)
+        settle.wait_until_stable(device, timeout=1.5)
     
     logger.error("❌ Could not find Promotions folder")
     return False
 
+@tracing.traced("step.scroll_to_footer")
 def scroll_to_footer(device):
-    """Scroll down to reach email footer where unsubscribe lives."""
-    logger.info("📉 Scrolling to email footer...")
+    """
+    Scroll down to the email footer where unsubscribe lives.
+    Returns True once the content stops moving (bottom reached).
+    """
+    logger.info("📉 Seeking email footer...")
+    start = time.monotonic()
     
-    # Marketing emails are long - scroll multiple times
-    for i in range(10):  # More scrolls to reach bottom
-        utils.input_swipe(device, 360, 1300, 360, 400, 100)
-        time.sleep(0.15)
+    # MOVE_END first (instant where supported), then fast flings until the
+    # content strip stops changing - short emails stop after one or two
+    reached, flings = settle.scroll_to_end(
+        device,
+        fling=lambda: utils.input_swipe(device, 360, 1300, 360, 300, 60),
+        jump=lambda: utils.press_move_end(device),
+        max_flings=FOOTER_MAX_FLINGS,
+    )
     
-    time.sleep(0.5)
-    logger.info("✅ Reached footer area")
+    if reached:
+        logger.info(f"✅ Reached footer ({flings} flings, {time.monotonic() - start:.1f}s)")
+    else:
+        logger.info(f"⚠️ Still scrolling after {flings} flings, searching here")
+    return reached
 
-def return_to_inbox(device):
-    """Return to inbox by pressing back."""
+@tracing.traced("step.return_to_inbox")
+def return_to_inbox(device, presses=4):
+    """
+    Return to the Promotions list. With the state machine every step is
+    checked (one back from an email, as many as a redirect chain needs
+    from the browser); without it, `presses` blind back presses.
+    """
     logger.info("🔙 Returning to inbox...")
-    for _ in range(4):
+    if USE_STATE_MACHINE:
+        return go_to_list(device)
+    for _ in range(presses):
         utils.press_back(device)
-        time.sleep(0.6)
-    time.sleep(1)
+        settle.wait_until_stable(device, timeout=0.8, quiet=0.2)
+    settle.wait_until_stable(device, timeout=2)
+    return True
+
+def classify_screen(device, frame):
+    """Screen state of `frame`: window focus and icons first, vision only if they can't tell."""
+    state, signal = state_classifier.classify(device, frame)
+    if state == screen_state.UNKNOWN and frame:
+        prompt = ANALYZE_SCREEN_PROMPT if USE_COMBINED else CHECK_STATE_PROMPT
+        result = analyze_screen(frame, prompt) or {}
+        state = screen_state.from_label(result.get("screen_type"))
+        signal = "vision"
+        # The list header names the folder: no need to re-navigate if it's Promotions
+        if state == screen_state.LIST and result.get("folder_name"):
+            if str(result["folder_name"]).strip().lower() == "promotions":
+                _on_promotions.add(device.serial)
+            else:
+                _on_promotions.discard(device.serial)
+    tracing.count("screen_state", state=state, signal=signal)
+    return state
+
+@tracing.traced("step.recover")
+def go_to_list(device):
+    """
+    Walk back to the Promotions list from wherever we are, re-checking the
+    screen after every action (screen_state.RECOVERY): back out of emails,
+    pages, popups and the drawer, bring Gmail to the front if we left it,
+    relaunch as a last resort. Returns True on the Promotions list.
+    """
+    last, visits = None, 0
+    for _ in range(RECOVERY_MAX_STEPS):
+        frame = get_screenshot(device)
+        state = classify_screen(device, frame)
+        visits = visits + 1 if state == last else 0
+        last = state
+        action = screen_state.next_action(state, visits)
+        if action == screen_state.DONE:
+            if device.serial in _on_promotions:
+                return True
+            logger.info("🧭 On a list, but not sure it's Promotions")
+            return navigate_to_promotions(device)
+        
+        logger.info(f"🧭 On {state}: {action}")
+        tracing.count("recovery", state=state, action=action)
+        if action == screen_state.BACK:
+            settle.tap_and_settle(device, lambda: utils.press_back(device), frame,
+                                  change_timeout=1.5, settle_timeout=1.5)
+        elif action == screen_state.RESUME:
+            settle.tap_and_settle(device, lambda: utils.resume_app(device, GMAIL_PACKAGE), frame,
+                                  change_timeout=3, settle_timeout=3)
+        else:
+            _on_promotions.discard(device.serial)
+            utils.launch_app(device, GMAIL_PACKAGE)
+    
+    logger.error("❌ Could not get back to the Promotions list")
+    return False
 
 # ============================================
 # EMAIL PROCESSING WITH AI
 # ============================================
-def find_and_open_email(device):
-    """Use AI to find and open a promotional email."""
+@tracing.traced("step.open_email")
+def open_next_queued(device, queue):
+    """
+    Open the next email from the page queue. One vision call reads the
+    whole visible list; later emails are tapped from the queue after a
+    cheap frame diff confirms the list hasn't moved.
+    """
+    logger.info(f"👀 Opening next email ({len(queue)} queued)...")
+    
+    attempts = pages = 0
+    while attempts < 4:
+        img = get_screenshot(device)
+        if not img:
+            attempts += 1
+            tracing.sleep(1)
+            continue
+        
+        row = queue.next_row(img)
+        if row is None:
+            result = analyze_screen(img, EXTRACT_INBOX_PROMPT)
+            rows = inbox_queue.clean_rows(result, img.size)
+            fresh = queue.load(img, rows)
+            logger.info(f"📋 Read {len(rows)} rows from the list, {fresh} not yet handled")
+            row = queue.next_row(img)
+            if row is None:
+                if not rows:
+                    attempts += 1
+                    forget_answer(img, EXTRACT_INBOX_PROMPT)
+                elif pages >= INBOX_MAX_PAGES:
+                    break
+                # Everything on this page is done - next page (not a failed attempt)
+                pages += 1
+                logger.info("🔄 Scrolling inbox to the next page...")
+                utils.input_swipe(device, 360, 1300, 360, 500, 400)
+                settle.wait_until_stable(device, timeout=1.5)
+                continue
+        
+        pt = row["point"]
+        logger.info(f"✅ Opening '{row['subject']}' from {row['sender']} at {pt}")
+        queue.mark_done(row)
+        if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img):
+            return row
+        attempts += 1
+        logger.info("🔄 Tap didn't open anything, trying next row...")
+        tracing.count("retries", reason="tap_missed")
+    
+    logger.error("❌ Could not find email to open")
+    return None
+
+@tracing.traced("step.find_email")
+def find_and_open_email(device, queue=None):
+    """
+    Use AI to find and open a promotional email.
+    Returns the opened email as {"sender", "subject", ...}, or None.
+    """
+    if queue is not None:
+        return open_next_queued(device, queue)
     logger.info("👀 Looking for email to open...")
     
     for attempt in range(3):
-        img = get_screenshot()
+        img = get_screenshot(device)
         if not img:
-            time.sleep(1)
+            tracing.sleep(1)
             continue
             
         result = analyze_screen(img, FIND_EMAIL_PROMPT)
@@ -470,66 +1054,188 @@ def find_and_open_email(device):
                 logger.warning("⚠️ Point too far right (icon zone), adjusting...")
                 pt[0] = 300  # Move to center-left
             
-            utils.input_tap(device, pt[0], pt[1])
-            time.sleep(2.5)
-            return True
+            if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img):
+                # This prompt doesn't read the sender; the subject alone identifies the email
+                return {"sender": "", "subject": subject, "point": pt}
+            logger.info("🔄 Tap didn't open anything, retrying...")
+            tracing.count("retries", reason="tap_missed")
+            forget_answer(img, FIND_EMAIL_PROMPT)
+            continue
         
         # Scroll inbox to find more emails
         logger.info("🔄 Scrolling inbox to find emails...")
         utils.input_swipe(device, 360, 800, 360, 500, 300)
-        time.sleep(1)
+        settle.wait_until_stable(device, timeout=1.5)
     
     logger.error("❌ Could not find email to open")
+    return None
+
+@tracing.traced("step.read_link")
+def read_link_url(device, frame, pt):
+    """
+    Long-press a link: Gmail pops up its address, which the view tree
+    exposes as text. Dismisses the popup again. None if no URL showed.
+    """
+    if not settle.tap_and_settle(device, lambda: utils.input_swipe(device, pt[0], pt[1], pt[0], pt[1],
+                                                                   LONG_PRESS_MS),
+                                 frame, change_timeout=1.5, settle_timeout=1.5):
+        return None
+    url = hierarchy.find_url(hierarchy.dump(device))
+    utils.press_back(device)  # close the popup (or drop a text selection)
+    settle.wait_until_stable(device, timeout=1.0, quiet=0.2)
+    return url
+
+def unsubscribe_over_http(device, frame, result):
+    """
+    Unsubscribe from the host if the link's URL is known or readable. False = use the browser.
+    A URL from a cached answer may be another sender's (footers hash alike): only a fresh
+    answer's URL is used, else the address is read from this email's link.
+    """
+    url = None if result.get("cache_hit") else result.get("url")
+    if not (isinstance(url, str) and url.startswith(("http://", "https://"))):
+        url = read_link_url(device, frame, result["point"])
+    if not url:
+        logger.info("ℹ️ Link address not readable, opening it on the phone")
+        return False
+    start = time.monotonic()
+    outcome, reason = http_unsubscriber.unsubscribe(url)
+    if session_recorder:
+        session_recorder.http(url, outcome, reason, start, time.monotonic() - start)
+    tracing.count("http_unsubscribe", outcome=outcome)
+    if outcome == unsubscribe_http.DONE:
+        logger.info(f"📨 Unsubscribed over HTTP ({reason}), no browser needed")
+        return True
+    logger.info(f"🌐 HTTP unsubscribe {outcome} ({reason}), opening it on the phone")
     return False
 
+def drag_content(device, dy):
+    """Move a finger dy rows down the email body (negative = up) without flinging it."""
+    top, bottom = stitch.band_box(SCREEN_HEIGHT)
+    start = top + 20 if dy > 0 else bottom - 20
+    utils.input_swipe(device, 360, start, 360, start + dy, DRAG_MS)
+
+@tracing.traced("step.long_capture")
+def locate_unsubscribe_long(device, frame, keywords):
+    """
+    The unsubscribe link from one stitched capture of the screens from
+    here upwards: view tree of this screen first, then one vision call on
+    the stitched image; the hit is scrolled back into view.
+    Returns (result in screen coordinates, frame it is on, [(frame, prompt)]
+    the answer came from). A miss says whether the top was reached and
+    whether every tile was actually answered.
+    """
+    result = locate_in_tree(device, frame, keywords)
+    if result:
+        return result, frame, []
+    
+    grab = lambda: get_screenshot(device)
+    drag = lambda dy: drag_content(device, dy)
+    long_capture = stitch.capture_up(device, grab, drag, screens=LONG_CAPTURE_SCREENS)
+    if long_capture is None:
+        return None, frame, []
+    tiles = long_capture.tiles(LONG_CAPTURE_MAX_HEIGHT, LONG_TILE_OVERLAP)
+    logger.info(f"🧵 Stitched {len(long_capture.positions)} screens into one "
+                f"{long_capture.image.width}x{long_capture.height} image ({len(tiles)} tile(s))")
+    asked = [(tile, FIND_UNSUBSCRIBE_LONG_PROMPT) for tile in tiles]
+    
+    results = analyze_all(asked)
+    # Footer links sit low: the lowest tile with a hit wins
+    for tile, result in reversed(list(zip(tiles, results))):
+        if result and result.get("found") and roi.to_screen(result, tile.offset, tile.size):
+            shown, pt = stitch.bring_into_view(device, long_capture, result["point"], grab, drag)
+            if shown is None:
+                logger.warning("⚠️ Lost track of the email while scrolling back to the link")
+                return None, frame, asked
+            return {**result, "point": pt}, shown, asked
+    return {"found": False, "reached_top": long_capture.reached_top,
+            "answered": all(result is not None for result in results)}, frame, asked
+
+@tracing.traced("step.find_unsubscribe")
 def find_unsubscribe(device):
-    """Use AI to find and click unsubscribe link."""
+    """
+    Use AI to find the unsubscribe link, then follow it - over HTTP from
+    the host if possible (returns VIA_HTTP), else by tapping it (True).
+    False = the model looked at the footer and said there is no link;
+    None = couldn't tell (no answer, footer never reached, taps missed).
+    """
     logger.info("🔗 Looking for Unsubscribe link...")
     
     # First scroll to footer
-    scroll_to_footer(device)
+    at_bottom = scroll_to_footer(device)
     
+    keywords = UNSUBSCRIBE_KEYWORDS
+    on_footer, said_no = at_bottom, False
     for attempt in range(3):
-        img = get_screenshot()
+        img = get_screenshot(device)
         if not img:
-            time.sleep(1)
+            tracing.sleep(1)
             continue
-            
-        result = analyze_screen(img, FIND_UNSUBSCRIBE_PROMPT)
+        
+        if USE_LONG_CAPTURE:
+            result, img, asked = locate_unsubscribe_long(device, img, keywords)
+        else:
+            result = locate_target(device, img, FIND_UNSUBSCRIBE_PROMPT, keywords)
+            asked = [(img, FIND_UNSUBSCRIBE_PROMPT)]
         
         if result and result.get("found") and result.get("point"):
             pt = result["point"]
             link_text = result.get("link_text", "Unsubscribe")
             logger.info(f"✅ Found '{link_text}' at {pt}")
-            utils.input_tap(device, pt[0], pt[1])
-            time.sleep(3)
-            return True
+            if http_unsubscriber and unsubscribe_over_http(device, img, result):
+                return VIA_HTTP
+            if settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img,
+                                     change_timeout=3, settle_timeout=5):
+                return True
+            logger.info("🔄 Tap didn't open anything, retrying...")
+            tracing.count("retries", reason="tap_missed")
+            for frame, prompt in asked:
+                forget_answer(frame, prompt)
+            keywords = None  # tree match was a dud, let the AI look
+            continue
+        
+        # A real "found": false with the footer in view, not an outage or a rejected call
+        if on_footer and result and result.get("found") is False and result.get("answered", True):
+            said_no = True
+        on_footer = False  # only the first look is known to show the footer
         
-        # Scroll a bit more
-        logger.info("🔄 Scrolling more to find unsubscribe...")
-        utils.input_swipe(device, 360, 1200, 360, 600, 200)
-        time.sleep(1)
+        if USE_LONG_CAPTURE:
+            # The capture ended higher up the email; the next one carries on from there
+            if result and result.get("reached_top"):
+                break
+            logger.info("🔄 Capturing further up the email...")
+            continue
+        
+        # At the very bottom the link can only be above us; otherwise keep going down
+        if at_bottom:
+            logger.info("🔄 Scrolling back up to find unsubscribe...")
+            utils.input_swipe(device, 360, 600, 360, 1200, 200)
+        else:
+            logger.info("🔄 Scrolling more to find unsubscribe...")
+            utils.input_swipe(device, 360, 1200, 360, 600, 200)
+        settle.wait_until_stable(device, timeout=1.5)
     
     logger.warning("⚠️ Unsubscribe link not found")
-    return False
+    return False if said_no else None
 
+@tracing.traced("step.confirm")
 def handle_browser_confirm(device):
     """Handle browser confirmation page using AI."""
     logger.info("🌐 Checking for browser confirmation...")
-    time.sleep(2)  # Wait for page load
+    settle.wait_until_stable(device, timeout=6, quiet=0.5)  # Wait for page load
     
-    img = get_screenshot()
+    img = get_screenshot(device)
     if not img:
         return False
         
-    result = analyze_screen(img, BROWSER_CONFIRM_PROMPT)
+    result = locate_target(device, img, BROWSER_CONFIRM_PROMPT, CONFIRM_KEYWORDS,
+                           require_clickable=True)
     
     if result and result.get("found") and result.get("point"):
         pt = result["point"]
         btn_text = result.get("button_text", "Confirm")
         logger.info(f"✅ Found confirm button '{btn_text}' at {pt}")
-        utils.input_tap(device, pt[0], pt[1])
-        time.sleep(2)
+        settle.tap_and_settle(device, lambda: utils.input_tap(device, pt[0], pt[1]), img,
+                              settle_timeout=4)
         return True
     
     logger.info("ℹ️ No confirmation button found (may be auto-confirmed)")
@@ -538,36 +1244,63 @@ def handle_browser_confirm(device):
 # ============================================
 # SINGLE EMAIL PROCESSING PIPELINE
 # ============================================
-def process_email(device, email_num):
-    """Process one email: open → scroll → unsubscribe → confirm → return."""
+@tracing.traced("email")
+def process_email(device, email_num, queue=None):
+    """
+    Process one email: open → scroll → unsubscribe → confirm → return.
+    True = cleaned, False = not cleaned, None = not cleaned and maybe not
+    back on the list (nothing opened, or the way back failed).
+    """
     logger.info("")
     logger.info("=" * 50)
     logger.info(f"📧 PROCESSING EMAIL #{email_num}")
     logger.info("=" * 50)
     
     # Step 1: Find and open email
-    if not find_and_open_email(device):
+    email = find_and_open_email(device, queue)
+    if not email:
         logger.warning(f"⚠️ Could not open email #{email_num}, skipping...")
-        return False
-    
-    # Step 2: Find and click unsubscribe
-    if not find_unsubscribe(device):
-        logger.warning(f"⚠️ No unsubscribe found in email #{email_num}")
-        return_to_inbox(device)
-        return False
+        return None
+    record_outcome(device, email, None)
     
-    # Step 3: Handle browser confirmation
-    handle_browser_confirm(device)
+    try:
+        # Step 2: Find and click unsubscribe
+        found = find_unsubscribe(device)
+        if not found:
+            logger.warning(f"⚠️ No unsubscribe found in email #{email_num}")
+            # Only a model's "no link here" is final; anything else is retried next run
+            record_outcome(device, email, ledger.NO_LINK if found is False else ledger.FAILED)
+            return False if return_to_inbox(device) else None
+        
+        # Step 3: Handle browser confirmation (nothing opened if done over HTTP)
+        if found != VIA_HTTP:
+            handle_browser_confirm(device)
+        record_outcome(device, email, ledger.UNSUBSCRIBED)
+    except Exception:
+        record_outcome(device, email, ledger.FAILED)
+        raise
     
     # Step 4: Return to inbox
-    return_to_inbox(device)
+    return_to_inbox(device, presses=1 if found == VIA_HTTP else 4)
     
     logger.info(f"✅ Email #{email_num} processed!")
     return True
 
+def record_outcome(device, email, outcome):
+    """Write an email's outcome to the ledger; None marks it opened (pending)."""
+    if session_recorder and outcome is not None:
+        session_recorder.outcome(device.serial, email["sender"], email["subject"], outcome)
+    if email_ledger is None:
+        return
+    if outcome is None:
+        email_ledger.begin(device.serial, email["sender"], email["subject"])
+    else:
+        email_ledger.record(device.serial, email["sender"], email["subject"], outcome)
+
 # ============================================
 # FOLDER CLEANING
 # ============================================
+@tracing.traced("clean_promotions")
 def clean_promotions(device, num_emails=4):
     """Clean promotional emails using AI vision."""
     logger.info("")
@@ -580,19 +1313,82 @@ def clean_promotions(device, num_emails=4):
         logger.error("❌ Failed to navigate to Promotions")
         return 0
     
+    # Resume an interrupted run; rows settled by earlier runs are never opened
+    run, skip = None, None
+    if email_ledger is not None:
+        account = device.serial
+        run = email_ledger.resume(account, num_emails)
+        skip = lambda row: email_ledger.settled(account, row["sender"], row["subject"])
+        if run.done:
+            logger.info(f"⏯️ Resuming interrupted run at email #{run.done + 1} "
+                        f"({run.cleaned} cleaned so far)")
+    
     # Process emails
-    success_count = 0
-    for i in range(num_emails):
-        if process_email(device, i + 1):
+    queue = inbox_queue.InboxQueue(skip) if USE_INBOX_QUEUE else None
+    start = run.done if run else 0
+    success_count = run.cleaned if run else 0
+    cleaned = True
+    for i in range(start, num_emails):
+        # return_to_inbox already walked back after a processed email; only an
+        # email that wasn't opened, or a failed way back, leaves us anywhere
+        if USE_STATE_MACHINE and cleaned is None and not go_to_list(device):
+            logger.error("❌ Lost the Promotions list, stopping (the run can resume later)")
+            break
+        cleaned = process_email(device, i + 1, queue)
+        if cleaned:
             success_count += 1
-        time.sleep(1)
+        if run:
+            email_ledger.checkpoint(run, cleaned)
+    else:
+        if run:
+            email_ledger.finish(run)
     
     logger.info(f"✅ Cleaned {success_count}/{num_emails} emails")
+    if queue is not None:
+        logger.info(f"📋 Inbox queue: {queue.stats['extractions']} list reads for "
+                    f"{queue.stats['served']} emails, {queue.stats['invalidated']} re-reads, "
+                    f"{queue.stats['skipped']} already settled")
     return success_count
 
 # ============================================
 # MAIN MODES
 # ============================================
+def log_run_stats():
+    """Cache hit rates and provider latencies for the run."""
+    if response_cache:
+        logger.info(f"⚡ Vision cache: {response_cache.summary()}")
+    if http_unsubscriber:
+        logger.info(f"📨 HTTP unsubscribe: {http_unsubscriber.summary()}")
+    if USE_STATE_MACHINE:
+        logger.info(f"🧭 Screen states: {state_classifier.summary()}")
+    for name, hist in sorted(hedger.histograms.items()):
+        logger.info(f"⏱️ {name}: {hist.summary()}")
+    tracing.flush()
+    stats = rate_control.stats
+    logger.info(f"🚦 Rate control: {stats['admitted']} admitted, {stats['rejected']} rejected, "
+                f"{stats['rate_limited']} x 429, {stats['queued_seconds']:.1f}s queued")
+
+def start_session(devices, mode, num_emails):
+    """
+    With SESSION_RECORD on: start the archive (unless one is already set,
+    e.g. by the benchmark), note the run, keep the caches it starts from
+    and hand back recording proxies of the devices. Otherwise a no-op.
+    """
+    global session_recorder
+    if session_recorder is None:
+        session_recorder = session.from_env(os.path.join(OUTPUT_FOLDER, "sessions"))
+        if session_recorder is None:
+            return devices
+        atexit.register(session_recorder.close)
+    session_recorder.note(mode=mode, emails=num_emails,
+                          features={f: os.environ[f] for f in session.FEATURE_FLAGS if f in os.environ})
+    if coord_store:
+        session_recorder.keep("coords.json", coord_store.path)
+    if email_ledger is not None:
+        email_ledger.backup(session_recorder.state_path("ledger.sqlite3"))
+    logger.info(f"🎞️ Recording session to {session_recorder.folder}")
+    return [session_recorder.wrap(device) for device in devices]
+
 def run_demo(device, num_emails=3):
     """Run demo mode."""
     logger.info("")
@@ -603,8 +1399,7 @@ def run_demo(device, num_emails=3):
     
     # Launch Gmail
     logger.info("🚀 Launching Gmail...")
-    utils.launch_app(device, "com.google.android.gm")
-    time.sleep(4)
+    utils.launch_app(device, GMAIL_PACKAGE)
     
     # Clean Promotions
     cleaned = clean_promotions(device, num_emails)
@@ -612,6 +1407,7 @@ def run_demo(device, num_emails=3):
     logger.info("")
     logger.info("🎬" + "=" * 58)
     logger.info(f"🏁 DEMO COMPLETE! Processed {cleaned} emails")
+    log_run_stats()
     logger.info("🎬" + "=" * 58)
 
 def run_full_clean(device):
@@ -622,8 +1418,7 @@ def run_full_clean(device):
     logger.info("🎬" + "=" * 58)
     
     logger.info("🚀 Launching Gmail...")
-    utils.launch_app(device, "com.google.android.gm")
-    time.sleep(4)
+    utils.launch_app(device, GMAIL_PACKAGE)
     
     # Clean multiple folders
     total = 0
@@ -632,8 +1427,30 @@ def run_full_clean(device):
     logger.info("")
     logger.info("🎬" + "=" * 58)
     logger.info(f"🏁 FULL CLEAN COMPLETE! Total: {total} emails")
+    log_run_stats()
     logger.info("🎬" + "=" * 58)
 
+def run_fleet(devices, num_emails=3):
+    """Clean Promotions on every attached device in parallel."""
+    logger.info("")
+    logger.info("🎬" + "=" * 58)
+    logger.info(f"🧹 DECLUTTER DROID - FLEET MODE ({len(devices)} devices)")
+    logger.info("🎬" + "=" * 58)
+    
+    def job(device):
+        logger.info("🚀 Launching Gmail...")
+        utils.launch_app(device, GMAIL_PACKAGE)
+        return clean_promotions(device, num_emails)
+    
+    results = fleet.run(devices, job, max_workers=int(os.environ.get("FLEET_WORKERS", "0")) or None)
+    
+    logger.info("")
+    logger.info("🎬" + "=" * 58)
+    total = fleet.log_summary(results)
+    log_run_stats()
+    logger.info("🎬" + "=" * 58)
+    return results, total
+
 # ============================================
 # MAIN ENTRY POINT
 # ============================================
@@ -641,11 +1458,25 @@ if __name__ == "__main__":
     import sys
     
     # Check APIs
-    if not GEMINI_API_KEY and not groq_client:
+    if not providers.configured_names():
         logger.error("❌ No AI API configured!")
         logger.info("💡 Add GEMINI_API_KEY or GROQ_API_KEY to .env file")
         exit(1)
     
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    
+    # Fleet mode drives every attached device
+    if mode == "fleet":
+        devices = fleet.discover(serials=sys.argv[2:])
+        if not devices:
+            logger.error("❌ No device connected!")
+            logger.info("💡 Run: adb devices")
+            exit(1)
+        fleet.tag_logs()
+        logger.info(f"📱 Connected: {', '.join(d.serial for d in devices)}")
+        run_fleet(start_session(devices, "fleet", 3), 3)
+        sys.exit(0)
+    
     # Connect to device
     device = utils.get_device()
     if not device:
@@ -654,10 +1485,10 @@ if __name__ == "__main__":
         exit(1)
     
     logger.info(f"📱 Connected: {device.serial}")
+    device = start_session([device], "full" if mode == "full" else "demo", 5 if mode == "full" else 3)[0]
     
     # Parse arguments
-    if len(sys.argv) > 1:
-        mode = sys.argv[1].lower()
+    if mode:
         if mode == "demo" or mode == "quick":
             run_demo(device, 3)
         elif mode == "full":
@@ -672,6 +1503,7 @@ if __name__ == "__main__":
         print("Modes:")
         print("  demo  - Process 3 emails")
         print("  full  - Full clean (5 emails)")
+        print("  fleet - Demo on every attached device (optionally: fleet SERIAL...)")
         print("=" * 40)
         print("\nRunning demo...\n")
         run_demo(device, 3)
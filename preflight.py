@@ -0,0 +1,70 @@
+# preflight.py
+# ============================================
+# DECLUTTER DROID - PREFLIGHT
+# Checks keys, the HTTP client and the phone without building AI clients
+# Usage: python preflight.py [--no-device]
+# ============================================
+import sys
+
+from dotenv import load_dotenv
+
+import providers
+
+GMAIL_PACKAGE = "com.google.android.gm"
+
+
+def check_keys():
+    """One line per provider; True if at least one can be used."""
+    usable = False
+    for p in providers.REGISTRY.values():
+        status, message = p.check_key()
+        if status == "missing":
+            print(f"➖ {p.label}: {message}")
+        elif not p.installed():
+            print(f"❌ {p.label}: {message}, but `{p.module}` is not installed")
+        else:
+            print(f"{'✅' if status == 'ok' else '⚠️'} {p.label}: {message}")
+            usable = True
+    if not usable:
+        print("❌ No AI API configured - add GEMINI_API_KEY or GROQ_API_KEY to .env")
+    return usable
+
+
+def check_device():
+    """An adb device is attached and has Gmail installed."""
+    import adbutils
+
+    try:
+        devices = adbutils.adb.device_list()
+    except Exception as e:
+        print(f"❌ ADB Error: {e}")
+        return False
+    if not devices:
+        print("❌ No device connected! Run: adb devices")
+        return False
+    ok = True
+    for device in devices:
+        try:
+            has_gmail = bool(device.shell(f"pm path {GMAIL_PACKAGE}").strip())
+        except Exception as e:
+            print(f"❌ {device.serial}: {e}")
+            ok = False
+            continue
+        print(f"{'✅' if has_gmail else '❌'} {device.serial}: "
+              f"{'Gmail installed' if has_gmail else 'Gmail not installed'}")
+        ok = ok and has_gmail
+    return ok
+
+
+def run(device=True):
+    load_dotenv()
+    print("-" * 30)
+    ok = check_keys()
+    if device:
+        ok = check_device() and ok
+    print("-" * 30)
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run(device="--no-device" not in sys.argv[1:]) else 1)
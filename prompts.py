@@ -6,14 +6,27 @@
 
 # 1. STATE CHECKER: Where are we?
 CHECK_STATE_PROMPT = """
-Analyze this screen. Look at the Top Header (Action Bar).
-Question: What folder or view are we in?
-Options: 'Primary', 'Promotions', 'Social', 'Updates', 'Spam', 'Menu_Open', 'Unknown'.
-Context:
-- If you see a side menu covering the left, return 'Menu_Open'.
-- If the top text says "Search in emails" and below it says "Promotions", return 'Promotions'.
-- If the top label says "Primary", return 'Primary'.
-Format: JSON {"state": "Promotions"} or {"state": "Menu_Open"}
+You are analyzing a mobile phone screenshot (720x1600 pixels) taken by an
+agent that works in the Gmail app and sometimes ends up somewhere else.
+
+TASK: What screen is this?
+
+- "inbox_list": a Gmail list of emails (hamburger icon top-left)
+- "side_menu": the Gmail navigation drawer over the list
+- "email_open": one email opened (back arrow top-left), top or bottom of it
+- "link_menu": a popup or dialog over Gmail (link address, options)
+- "browser_page": a web page in a browser
+- "other": home screen or any other app
+
+For "inbox_list", look at the Top Header: the label under "Search in emails"
+names the folder ('Primary', 'Promotions', 'Social', 'Updates', 'Spam').
+
+Return JSON:
+{
+    "screen_type": "inbox_list",
+    "folder_name": "Promotions or null",
+    "thinking": "brief explanation of what you see"
+}
 """
 
 # 2. MENU NAVIGATOR: Find folder OR scroll
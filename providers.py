@@ -0,0 +1,135 @@
+# providers.py
+# ============================================
+# AI PROVIDER REGISTRY
+# HTTP clients are imported and built on first use, not at start-up
+# ============================================
+import importlib.util
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = "your_api_key_here"
+
+
+def _client_options():
+    """Pool size and timeouts shared by every provider client."""
+    return {
+        "timeout": float(os.environ.get("VISION_TIMEOUT", "30")),
+        "connect_timeout": float(os.environ.get("VISION_CONNECT_TIMEOUT", "5")),
+        "max_connections": int(os.environ.get("VISION_MAX_CONNECTIONS", "8")),
+    }
+
+
+def _build_groq(api_key):
+    import vision_api
+    return vision_api.GroqAPI(api_key, os.environ.get("GROQ_BASE_URL") or vision_api.GROQ_BASE_URL,
+                              **_client_options())
+
+
+def _build_gemini(api_key):
+    import vision_api
+    return vision_api.GeminiAPI(api_key, os.environ.get("GEMINI_BASE_URL") or vision_api.GEMINI_BASE_URL,
+                                **_client_options())
+
+
+class Provider:
+    """
+    One AI backend: the env var holding its key, the module its client
+    needs and how to build the client (a long-lived vision_api client,
+    shared by every call).
+
+    Everything except client() is cheap - it reads the environment and
+    asks the import system whether the module exists without importing
+    it - so a run that never calls a provider never pays for its import.
+    """
+
+    def __init__(self, name, key_env, module, build, key_prefix=None, label=None):
+        self.name = name
+        self.key_env = key_env
+        self.module = module
+        self.build = build
+        self.key_prefix = key_prefix
+        self.label = label or name
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        key = os.environ.get(self.key_env)
+        return key if key and key != PLACEHOLDER else None
+
+    def installed(self):
+        try:
+            return importlib.util.find_spec(self.module) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def configured(self):
+        """Key set and HTTP client installed (or a client injected)."""
+        return self._client is not None or bool(self.key and self.installed())
+
+    def check_key(self):
+        """("ok" | "suspect" | "missing", message) about the key alone, for preflight."""
+        raw = os.environ.get(self.key_env)
+        if not raw:
+            return "missing", f"{self.key_env} not set"
+        if raw == PLACEHOLDER:
+            return "missing", f"{self.key_env} is still the placeholder"
+        if self.key_prefix and not raw.startswith(self.key_prefix):
+            return "suspect", (f"{self.key_env} set, but doesn't start with "
+                               f"'{self.key_prefix}' ({raw[:4]}...{raw[-4:]})")
+        return "ok", f"{self.key_env} set"
+
+    def client(self):
+        """The client, imported and built on the first call. None if not configured."""
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None and self.configured():
+                try:
+                    self._client = self.build(self.key)
+                    logger.info(f"✅ {self.label} API configured")
+                except Exception as e:
+                    logger.warning(f"⚠️ {self.label} setup failed: {e}")
+            return self._client
+
+    def set_client(self, client):
+        """Use this client instead of building one (benchmarks, simulations)."""
+        with self._lock:
+            self._client = client
+
+
+REGISTRY = {
+    "groq": Provider("groq", "GROQ_API_KEY", "httpx", _build_groq, key_prefix="gsk_",
+                     label="Groq (Llama 4 Scout Vision)"),
+    "gemini": Provider("gemini", "GEMINI_API_KEY", "httpx", _build_gemini,
+                       key_prefix="AIza", label="Gemini"),
+}
+
+
+def get(name):
+    return REGISTRY[name]
+
+
+def client(name):
+    return REGISTRY[name].client()
+
+
+def configured(name):
+    return REGISTRY[name].configured()
+
+
+def configured_names():
+    """Configured providers, in fallback order."""
+    return [name for name, p in REGISTRY.items() if p.configured()]
+
+
+def log_status():
+    """Start-up warnings for providers that can't be used; imports nothing."""
+    for p in REGISTRY.values():
+        if not p.key:
+            logger.warning(f"⚠️ {p.key_env} missing")
+        elif not p.installed():
+            logger.warning(f"⚠️ {p.key_env} set but `{p.module}` is not installed")
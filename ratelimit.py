@@ -0,0 +1,267 @@
+# ratelimit.py
+# ============================================
+# PROVIDER RATE CONTROL
+# Token buckets, quota headers and circuit breakers per provider
+# ============================================
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Groq style durations: "2m59.56s", "7.66s", "120ms"
+_DURATION_RE = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+# Gemini puts the hint in the error text: "retry_delay { seconds: 17 }" / "retryDelay": "17s"
+_RETRY_TEXT_RE = re.compile(r"retry[_ ]?delay\D{0,20}(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def parse_duration(value):
+    """Seconds from '30', '2m59.56s', '120ms' and friends; None if unparseable."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION_RE.match(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+
+def retry_after(error):
+    """Best-effort back-off hint (seconds) from a provider exception."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    match = _RETRY_TEXT_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+RATE_LIMIT_TYPES = ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def is_rate_limit(error):
+    """HTTP 429 (vision_api.APIError and most SDK errors carry it) or an SDK rate-limit type."""
+    response = getattr(error, "response", None)
+    if 429 in (getattr(error, "status_code", None), getattr(response, "status_code", None)):
+        return True
+    return any(cls.__name__ in RATE_LIMIT_TYPES for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+    acquire() blocks (up to `timeout`) until enough tokens are available,
+    so callers queue instead of failing.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount=1):
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self.tokens
+            return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+    def acquire(self, amount=1, timeout=None):
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait = (amount - self.tokens) / self.rate
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0 or wait > left:
+                    return False
+            # Plain sleep outside the lock: nothing ever hands tokens back,
+            # and it keeps the bucket usable under a simulated clock. The
+            # floor stops float rounding (a hair short of a token) spinning.
+            time.sleep(max(wait, 0.001))
+
+    def drain(self, seconds):
+        """Server says the quota is spent: no tokens for `seconds`."""
+        with self._lock:
+            self._refill()
+            self.tokens = -seconds * self.rate
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures (or at once on a 429
+    with a retry hint); open -> half-open after the cool-down. Half-open lets
+    exactly one trial call through allow(): its success closes the breaker,
+    its failure re-opens it. A trial that never reports back (cancelled
+    hedge) frees the slot after another cool-down.
+    """
+
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0       # 0 = closed; passed = half-open
+        self.trial_since = None     # half-open trial in flight since
+        self._lock = threading.Lock()
+
+    def _trial_running(self, now):
+        return self.trial_since is not None and now - self.trial_since < self.cooldown
+
+    @property
+    def is_open(self):
+        """True while no call would be let through (open, or the trial is running)."""
+        now = time.monotonic()
+        return now < self.open_until or self._trial_running(now)
+
+    def seconds_left(self):
+        return max(0.0, self.open_until - time.monotonic())
+
+    def allow(self):
+        """Claim a call: any number while closed, only the trial once half-open."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.open_until or self._trial_running(now):
+                return False
+            if self.open_until:
+                self.trial_since = now
+            return True
+
+    def release(self):
+        """The claimed call was never made: let the next caller be the trial."""
+        with self._lock:
+            self.trial_since = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.open_until = 0.0
+            self.trial_since = None
+
+    def record_failure(self, cooldown=None):
+        with self._lock:
+            self.failures += 1
+            # A failed half-open trial re-opens at once
+            if cooldown is not None or self.failures >= self.threshold or self.open_until:
+                self.open_until = time.monotonic() + (cooldown or self.cooldown)
+            self.trial_since = None
+
+
+class RateController:
+    """
+    Admission control for every provider call.
+
+    limits: {"groq/<model>": (requests_per_min, tokens_per_min), "gemini": (...)}
+    Buckets are sized to `headroom` of the quota so we stay just under it.
+    Breakers are per provider (the part before "/").
+    """
+
+    def __init__(self, limits, headroom=0.9, admission_timeout=30.0):
+        self.admission_timeout = admission_timeout
+        self.requests = {}
+        self.tokens = {}
+        for key, (rpm, tpm) in limits.items():
+            self.requests[key] = TokenBucket(max(1.0, rpm * headroom))
+            self.tokens[key] = TokenBucket(max(1.0, tpm * headroom))
+        self.breakers = {}
+        self.stats = {"admitted": 0, "rejected": 0, "rate_limited": 0, "queued_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def breaker(self, provider):
+        with self._lock:
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker()
+            return self.breakers[provider]
+
+    def available(self, provider):
+        return not self.breaker(provider).is_open
+
+    def admit(self, key, tokens=0, timeout=None):
+        """
+        Wait for quota on `key` ("groq/<model>" or "gemini").
+        Returns False at once if the provider's breaker is open (or its
+        half-open trial is already out), or after `timeout` if the quota
+        doesn't free up in time.
+        """
+        breaker = self.breaker(key.split("/")[0])
+        if not breaker.allow():
+            with self._lock:
+                self.stats["rejected"] += 1
+            return False
+        timeout = self.admission_timeout if timeout is None else timeout
+        start = time.monotonic()
+
+        ok = True
+        if key in self.requests:
+            ok = self.requests[key].acquire(1, timeout)
+            if ok and tokens:
+                left = max(0.0, timeout - (time.monotonic() - start))
+                ok = self.tokens[key].acquire(tokens, left)
+
+        if not ok:
+            breaker.release()
+        waited = time.monotonic() - start
+        with self._lock:
+            self.stats["queued_seconds"] += waited
+            self.stats["admitted" if ok else "rejected"] += 1
+        if waited > 0.5:
+            logger.info(f"🚦 Waited {waited:.1f}s for {key} quota")
+        return ok
+
+    def record_success(self, key, headers=None):
+        self.breaker(key.split("/")[0]).record_success()
+        if not headers:
+            return
+        # Server-side view of the quota beats our local estimate
+        for kind, buckets in (("requests", self.requests), ("tokens", self.tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if key in buckets and remaining is not None and reset and int(float(remaining)) <= 0:
+                buckets[key].drain(reset)
+
+    def record_failure(self, key, error):
+        provider = key.split("/")[0]
+        if is_rate_limit(error):
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            hint = retry_after(error)
+            wait = hint if hint is not None else 10.0
+            logger.warning(f"⏳ {provider} rate limited - routing elsewhere for {wait:.0f}s")
+            self.breaker(provider).record_failure(cooldown=wait)
+            if key in self.requests:
+                self.requests[key].drain(wait)
+        else:
+            self.breaker(provider).record_failure()
+
+    def wait_for_any(self, providers, timeout):
+        """Block until one of `providers` has a closed breaker (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if any(self.available(p) for p in providers):
+                return True
+            soonest = min(self.breaker(p).seconds_left() for p in providers)
+            time.sleep(min(soonest, max(0.0, deadline - time.monotonic())) + 0.01)
+        return any(self.available(p) for p in providers)
+
+
+def estimate_tokens(prompt, max_tokens, image_tokens=1600):
+    """Rough per-request token cost: prompt text + one image + completion cap."""
+    return len(prompt) // 4 + image_tokens + max_tokens
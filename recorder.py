@@ -0,0 +1,168 @@
+# recorder.py
+# ============================================
+# DEBUG FRAME RECORDER
+# Off-thread, content-addressed, with retention limits
+# ============================================
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_PREFIX = "frame_"
+INDEX_FILE = "index.jsonl"
+INDEX_LINES_PER_FRAME = 20  # index entries kept per retained frame (repeats of one screen)
+
+
+def frame_digest(img):
+    """Content hash of a frame's pixels (not of its PNG encoding)."""
+    return hashlib.blake2b(np.asarray(img), digest_size=12).hexdigest()
+
+
+class FrameRecorder:
+    """
+    Saves debug frames from a background thread.
+
+    - submit() never blocks: if the queue is full the frame is dropped
+    - frames are stored once per content hash (frame_<hash>.png), and
+      every capture is appended to index.jsonl so the timeline survives
+    - oldest frames are deleted once max_files / max_bytes is exceeded,
+      and the index is trimmed to the frames still on disk
+    - enabled=False turns the whole thing into a no-op for production
+    """
+
+    def __init__(self, folder, enabled=True, max_files=200, max_bytes=200 * 1024 * 1024,
+                 queue_size=8):
+        self.folder = folder
+        self.enabled = enabled
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.stats = {"submitted": 0, "written": 0, "duplicates": 0, "dropped": 0, "evicted": 0}
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._files = OrderedDict()  # name -> size, oldest first
+        self._total_bytes = 0
+        self._index_lines = 0
+        self._last_digest = None
+        self._thread = None
+
+        if self.enabled:
+            os.makedirs(self.folder, exist_ok=True)
+            self._load_existing()
+            self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+            self._thread.start()
+
+    def _load_existing(self):
+        names = [n for n in os.listdir(self.folder) if n.startswith(FRAME_PREFIX)]
+        paths = sorted((os.path.join(self.folder, n) for n in names), key=os.path.getmtime)
+        for path in paths:
+            size = os.path.getsize(path)
+            self._files[os.path.basename(path)] = size
+            self._total_bytes += size
+        index = os.path.join(self.folder, INDEX_FILE)
+        if os.path.exists(index):
+            with open(index) as f:
+                self._index_lines = sum(1 for _ in f)
+
+    def submit(self, img, label="screen"):
+        """Queue a frame for saving. Safe to call on the capture hot path."""
+        if not self.enabled or img is None:
+            return
+        self.stats["submitted"] += 1
+        try:
+            self._queue.put_nowait((time.time(), label, img))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until queued frames are on disk."""
+        if not self.enabled:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            ts, label, img = self._queue.get()
+            try:
+                self._write(ts, label, img)
+            except Exception as e:
+                logger.warning(f"⚠️ Recorder error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, ts, label, img):
+        digest = frame_digest(img)
+        name = f"{FRAME_PREFIX}{digest}.png"
+        evicted = 0
+
+        if digest == self._last_digest or name in self._files:
+            self.stats["duplicates"] += 1
+            if name in self._files:
+                self._files.move_to_end(name)
+        else:
+            path = os.path.join(self.folder, name)
+            img.save(path, format="PNG")
+            size = os.path.getsize(path)
+            self._files[name] = size
+            self._total_bytes += size
+            self.stats["written"] += 1
+            evicted = self._enforce_retention()
+        self._last_digest = digest
+
+        with open(os.path.join(self.folder, INDEX_FILE), "a") as f:
+            f.write(json.dumps({"ts": round(ts, 3), "label": label, "frame": name}) + "\n")
+        self._index_lines += 1
+        if evicted or self._index_lines > INDEX_LINES_PER_FRAME * self.max_files:
+            self._trim_index()
+
+    def _trim_index(self):
+        """Drop index entries of deleted frames, then the oldest beyond the line budget."""
+        path = os.path.join(self.folder, INDEX_FILE)
+        with open(path) as f:
+            lines = [line for line in f if self._indexed_frame(line) in self._files]
+        lines = lines[-INDEX_LINES_PER_FRAME * self.max_files:]
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(lines)
+        os.replace(tmp, path)
+        self._index_lines = len(lines)
+
+    @staticmethod
+    def _indexed_frame(line):
+        try:
+            return json.loads(line).get("frame")
+        except ValueError:
+            return None
+
+    def _enforce_retention(self):
+        """Delete the oldest frames over the limits. Returns how many went."""
+        evicted = 0
+        while self._files and (len(self._files) > self.max_files
+                               or self._total_bytes > self.max_bytes):
+            name, size = self._files.popitem(last=False)
+            self._total_bytes -= size
+            self.stats["evicted"] += 1
+            evicted += 1
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+        return evicted
+
+
+def from_env(folder):
+    """Build a recorder from RECORD_FRAMES / RECORD_MAX_FILES / RECORD_MAX_MB."""
+    enabled = os.environ.get("RECORD_FRAMES", "1").lower() not in ("0", "false", "off", "no")
+    max_files = int(os.environ.get("RECORD_MAX_FILES", "200"))
+    max_mb = float(os.environ.get("RECORD_MAX_MB", "200"))
+    return FrameRecorder(folder, enabled=enabled, max_files=max_files,
+                         max_bytes=int(max_mb * 1024 * 1024))
@@ -0,0 +1,332 @@
+# replay.py
+# ============================================
+# SESSION REPLAY
+# A recorded session (session.py) played back without a phone
+# ============================================
+import bisect
+import copy
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+import recorder
+import unsubscribe_http
+import vision_cache
+from fake_device import FakeShell, encode_png, encode_raw
+from frame import ScreenFrame
+from session import (BLOBS_DIR, EVENTS_FILE, FRAMES_DIR, SCREEN_QUERIES, SCREENCAPS, STATE_DIR,
+                     command_lines, command_text, is_query, script_lines)
+
+logger = logging.getLogger(__name__)
+
+LOOKAHEAD = 4               # recorded actions a replayed one may skip over to match
+TAP_SLOP = 24               # pixels a replayed tap/swipe may be off and still match
+FRAME_CACHE = 16
+
+
+def _same_line(recorded, replayed):
+    if recorded == replayed:
+        return True
+    if not replayed.startswith(("input tap ", "input swipe ")):
+        return False
+    a, b = recorded.split(), replayed.split()
+    if len(a) != len(b) or a[:2] != b[:2]:
+        return False
+    try:
+        return all(abs(int(x) - int(y)) <= TAP_SLOP for x, y in zip(a[2:], b[2:]))
+    except ValueError:
+        return False
+
+
+def _same_action(recorded, replayed):
+    return len(recorded) == len(replayed) and all(map(_same_line, recorded, replayed))
+
+
+class Archive:
+    """A recorded session read back: metadata, events in time order, screens on demand."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta = {}
+        self.prompts = {}
+        self.events = []
+        with open(os.path.join(folder, EVENTS_FILE)) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue    # torn last line of a run that died
+                kind = event.pop("ev", None)
+                if kind in ("start", "note"):
+                    self.meta.update(event)
+                elif kind == "prompt":
+                    self.prompts[event["id"]] = event["text"]
+                elif kind:
+                    event["ev"] = kind
+                    self.events.append(event)
+        self.events.sort(key=lambda e: e["t"])
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self):
+        return self.events[-1]["t"] if self.events else 0.0
+
+    def serials(self):
+        return list(dict.fromkeys(e["dev"] for e in self.events if e.get("dev")))
+
+    def of(self, kind, serial=None):
+        return [e for e in self.events if e["ev"] == kind and (serial is None or e.get("dev") == serial)]
+
+    def state(self, name):
+        path = os.path.join(self.folder, STATE_DIR, name)
+        return path if os.path.exists(path) else None
+
+    def image(self, digest):
+        return Image.open(os.path.join(self.folder, FRAMES_DIR, f"{digest}.png"))
+
+    def screen(self, digest, raw=True):
+        """A recorded screen as `screencap` (raw=True) or `screencap -p` output."""
+        key = (digest, raw)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+        data = (encode_raw if raw else encode_png)(self.image(digest))
+        with self._lock:
+            self._frames[key] = data
+            while len(self._frames) > FRAME_CACHE:
+                self._frames.popitem(last=False)
+        return data
+
+    def output(self, event):
+        if "frame" in event:
+            return self.screen(event["frame"], raw=event["cmd"] == "screencap")
+        if "blob" in event:
+            with open(os.path.join(self.folder, BLOBS_DIR, event["blob"]), "rb") as f:
+                return f.read()
+        return event.get("out", "").encode("utf-8")
+
+
+class ReplayDevice:
+    """
+    Plays one recorded device back to the real pipeline.
+
+    Actions are matched against the recording in order (a few may be
+    skipped over, taps may be TAP_SLOP pixels off); each match moves the
+    replay onto that point of the recorded timeline. Queries then see the
+    device as it was recorded at the same time since that action: a
+    screencap gets the latest screen recorded by then (so animations and
+    slow loads play out as they did), other queries get the output
+    recorded between this action and the next. A view dump or window
+    focus never taken on that screen is missing (empty output); static
+    output (app version, screen size) may come from any time. Every call
+    costs its recorded duration on `clock`. Unmatched actions change nothing.
+    """
+
+    def __init__(self, archive, serial, clock):
+        self.archive = archive
+        self.serial = serial
+        self.clock = clock
+        self.stats = {"actions": 0, "matched": 0, "skipped": 0, "unmatched": 0,
+                      "queries": 0, "missing": 0}
+        self._actions = archive.of("action", serial)
+        self._queries = {}
+        for event in archive.of("query", serial):
+            self._queries.setdefault(event["cmd"], []).append(event)
+        self._times = {cmd: [e["t"] for e in events] for cmd, events in self._queries.items()}
+        durations = sorted(e["dur"] for e in self._actions) or [0.0]
+        self._typical = durations[len(durations) // 2]
+        self._next = 0              # next recorded action expected
+        self._recorded = 0.0        # recorded time when the replay was last anchored
+        self._anchor = clock.monotonic()
+        self._lock = threading.Lock()
+
+    def _now(self):
+        """Recorded time the device is at: no further than the next recorded action."""
+        now = self._recorded + self.clock.monotonic() - self._anchor
+        if self._next < len(self._actions):
+            now = min(now, self._actions[self._next]["t"])
+        return now
+
+    def shell(self, cmdargs, stream=False, timeout=None, encoding="utf-8", rstrip=True):
+        if stream:
+            return _ReplayShell(self)
+        cmd = command_text(cmdargs)
+        if is_query(cmd):
+            out = self._query(cmd)
+        else:
+            self.act(command_lines(cmd))
+            out = b""
+        if encoding is None:
+            return out
+        text = out.decode(encoding, errors="ignore")
+        return text.rstrip() if rstrip else text
+
+    def act(self, lines):
+        with self._lock:
+            self.stats["actions"] += 1
+            window = self._actions[self._next:self._next + LOOKAHEAD + 1]
+            match = next((i for i, e in enumerate(window) if _same_action(e["lines"], lines)), None)
+            if match is None:
+                self.stats["unmatched"] += 1
+                event = None
+            else:
+                self.stats["matched"] += 1
+                self.stats["skipped"] += match
+                self._next += match + 1
+                event = window[match]
+        self.clock.sleep(event["dur"] if event else self._typical)
+        if event:
+            with self._lock:
+                self._recorded, self._anchor = event["t"] + event["dur"], self.clock.monotonic()
+
+    def _query(self, cmd):
+        with self._lock:
+            self.stats["queries"] += 1
+            event = self._pick(cmd, self._now())
+            if event is None:
+                self.stats["missing"] += 1
+        if event is None:
+            logger.debug(f"Session has no output for {cmd!r}")
+            return b""
+        self.clock.sleep(event["dur"])
+        if "error" in event:
+            raise RuntimeError(event["error"])
+        return self.archive.output(event)
+
+    def _pick(self, cmd, now):
+        events, times = self._queries.get(cmd), self._times.get(cmd)
+        if not events:
+            return None
+        latest = bisect.bisect_right(times, now) - 1
+        if cmd in SCREENCAPS:
+            return events[max(latest, 0)]
+        # Same screen state first: output recorded since the last matched action
+        start = self._actions[self._next - 1]["t"] if self._next else float("-inf")
+        end = self._actions[self._next]["t"] if self._next < len(self._actions) else float("inf")
+        if latest >= 0 and times[latest] >= start:
+            return events[latest]
+        first = bisect.bisect_left(times, start)
+        if first < len(times) and times[first] < end:
+            return events[first]
+        if cmd.startswith(SCREEN_QUERIES):
+            return None
+        return events[max(latest, 0)]
+
+
+class _ReplayShell(FakeShell):
+    """Persistent input shell of a ReplayDevice: each send() is one batch."""
+
+    def send(self, data):
+        lines = script_lines(data)
+        if lines:
+            self.device.act(lines)
+        for line in data.decode().splitlines():
+            if line.strip().startswith("echo "):
+                self._output += line.strip()[5:].replace('"', "").encode() + b"\n"
+        return len(data)
+
+
+class ReplayVision:
+    """
+    Recorded analyze_screen answers. A (prompt, screen) pair gets its
+    recorded answers in order (the last one again if asked more often);
+    a screen that was never asked about borrows the answer of the
+    perceptually nearest recorded screen for that prompt. Each answer
+    costs its recorded latency.
+    """
+
+    def __init__(self, archive, clock, tolerance=6):
+        self.clock = clock
+        self.tolerance = tolerance
+        self.stats = {"asked": 0, "exact": 0, "repeated": 0, "similar": 0, "missing": 0}
+        self._answers = {}
+        self._by_prompt = {}
+        for event in archive.of("vision"):
+            prompt = archive.prompts.get(event["prompt"], event["prompt"])
+            self._answers.setdefault((prompt, event.get("frame")), deque()).append(event)
+            self._by_prompt.setdefault(prompt, []).append(event)
+        self._last = {}
+        self._lock = threading.Lock()
+
+    async def analyze(self, pil_image, prompt):
+        frame = ScreenFrame.wrap(pil_image)
+        event = self._match(frame, prompt)
+        if event is None:
+            return None
+        self.clock.sleep(event["dur"])
+        return copy.deepcopy(event["result"])
+
+    def _match(self, frame, prompt):
+        key = (prompt, recorder.frame_digest(frame.image) if frame else None)
+        with self._lock:
+            self.stats["asked"] += 1
+            answers = self._answers.get(key)
+            if answers:
+                self.stats["exact"] += 1
+                self._last[key] = answers.popleft()
+                return self._last[key]
+            if key in self._last:
+                self.stats["repeated"] += 1
+                return self._last[key]
+            nearest = None
+            if frame:
+                scored = [(vision_cache.hamming(frame.phash, int(e["phash"], 16)), i, e)
+                          for i, e in enumerate(self._by_prompt.get(prompt, ())) if "phash" in e]
+                scored = [s for s in scored if s[0] <= self.tolerance]
+                nearest = min(scored)[2] if scored else None
+            self.stats["similar" if nearest else "missing"] += 1
+            return nearest
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['asked']} asked: {s['exact']} recorded, {s['repeated']} repeated, "
+                f"{s['similar']} from a similar screen, {s['missing']} unanswered")
+
+
+class ReplayUnsubscriber:
+    """Recorded host-side unsubscribe outcomes, per URL in order, at their recorded latency."""
+
+    def __init__(self, archive, clock):
+        self.clock = clock
+        self.stats = {"replayed": 0, "missing": 0}
+        self._outcomes = {}
+        for event in archive.of("http"):
+            self._outcomes.setdefault(event["url"], deque()).append(event)
+
+    def unsubscribe(self, url):
+        answers = self._outcomes.get(url)
+        if not answers:
+            self.stats["missing"] += 1
+            return unsubscribe_http.FAILED, "not in the session"
+        event = answers.popleft()
+        self.stats["replayed"] += 1
+        self.clock.sleep(event["dur"])
+        return event["outcome"], event["reason"]
+
+    def summary(self):
+        return f"{self.stats['replayed']} replayed, {self.stats['missing']} not in the session"
+
+
+class PacedClock:
+    """
+    Wraps a simulated clock so every sleep also really waits seconds /
+    speed: a replay that can be watched at `speed` x real time.
+    """
+
+    def __init__(self, clock, speed):
+        self.clock = clock
+        self.speed = speed
+        self._pause = threading.Event()     # never set: wait() is a real-time sleep
+
+    def sleep(self, seconds):
+        self.clock.sleep(seconds)
+        self._pause.wait(max(0.0, seconds) / self.speed)
+
+    def __getattr__(self, name):
+        return getattr(self.clock, name)
@@ -0,0 +1,43 @@
+# roi.py
+# ============================================
+# REGION-OF-INTEREST CROPPING FOR VISION PROMPTS
+# Send only the part of the screen a prompt needs
+# ============================================
+
+ROI_NOTE = """
+NOTE: This image is a CROPPED region of the phone screen, not the full screen.
+Return "point" in pixel coordinates of THIS image (top-left is [0, 0]).
+"""
+
+
+def with_roi_note(prompt):
+    """Prompt variant used for cropped frames."""
+    return prompt + ROI_NOTE
+
+
+def crop_box(size, roi):
+    """Turn a fractional (left, top, right, bottom) ROI into a pixel box."""
+    width, height = size
+    left, top, right, bottom = roi
+    return (int(left * width), int(top * height), int(right * width), int(bottom * height))
+
+
+def crop(pil_image, roi):
+    """Return (cropped image, (x, y) offset of the crop on screen)."""
+    box = crop_box(pil_image.size, roi)
+    return pil_image.crop(box), (box[0], box[1])
+
+
+def to_screen(result, offset, crop_size):
+    """
+    Translate result["point"] from crop space to full-screen space.
+    Returns False if the point falls outside the crop (a bad answer).
+    """
+    point = result.get("point")
+    if not point or len(point) < 2:
+        return False
+    x, y = point[0], point[1]
+    if not (0 <= x <= crop_size[0] and 0 <= y <= crop_size[1]):
+        return False
+    result["point"] = [int(x + offset[0]), int(y + offset[1])]
+    return True
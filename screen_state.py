@@ -0,0 +1,144 @@
+# screen_state.py
+# ============================================
+# SCREEN STATE MACHINE
+# Which screen are we on, and the shortest way back to the list
+# ============================================
+import logging
+import re
+
+import settle
+import template_match
+
+logger = logging.getLogger(__name__)
+
+# States the pipeline can find itself in
+LIST = "inbox_list"         # a Gmail mail list (hamburger top-left)
+EMAIL = "email_open"        # an open email, top or footer (back arrow top-left)
+DRAWER = "side_menu"        # navigation drawer over the list
+POPUP = "popup"             # link menu / dialog on top of Gmail
+BROWSER = "browser_page"    # unsubscribe page in a browser or custom tab
+OUT_OF_APP = "out_of_app"   # launcher or some other app
+UNKNOWN = "unknown"         # Gmail, but nothing local recognised it
+
+# Recovery actions
+DONE, BACK, RESUME, RELAUNCH = "done", "back", "resume", "relaunch"
+
+# Transition table: what to do on each screen to get back to the list, in
+# order of escalation. The n-th consecutive visit to the same state takes
+# the n-th action (the last one repeats), and the screen is re-checked after
+# every action instead of pressing back a fixed number of times.
+RECOVERY = {
+    LIST: (DONE,),
+    EMAIL: (BACK, BACK, RELAUNCH),
+    DRAWER: (BACK, RELAUNCH),
+    POPUP: (BACK, BACK, RELAUNCH),
+    BROWSER: (BACK, BACK, BACK, BACK, RESUME, RELAUNCH),   # redirect chains
+    OUT_OF_APP: (RESUME, RELAUNCH),
+    UNKNOWN: (BACK, RESUME, RELAUNCH),
+}
+
+# Vision screen_type labels (ANALYZE_SCREEN_PROMPT / prompts.CHECK_STATE_PROMPT) -> states
+LABELS = {
+    "inbox_list": LIST, "email_open": EMAIL, "email_footer": EMAIL, "side_menu": DRAWER,
+    "link_menu": POPUP, "browser_page": BROWSER, "other": OUT_OF_APP,
+}
+
+BROWSER_PACKAGES = ("com.android.chrome", "org.mozilla.firefox", "com.sec.android.app.sbrowser",
+                    "com.microsoft.emmx", "com.brave.browser", "com.opera.browser")
+FOCUS_RE = re.compile(r"mCurrentFocus=Window\{\S+ \S+ ([^\s/}]+)")
+FOCUSED_APP_RE = re.compile(r"mFocusedApp=\S*\{\S+ \S+ ([^\s/}]+)/")
+DRAWER_COLUMNS = 0.7        # drawer panel width; the dimmed list to its right changes
+DRAWER_MAX_DIFF = 0.08
+
+
+def next_action(state, visits):
+    """Recovery action for the `visits`-th consecutive time on `state` (0-based)."""
+    plan = RECOVERY.get(state, RECOVERY[UNKNOWN])
+    return plan[min(visits, len(plan) - 1)]
+
+
+def from_label(label):
+    return LABELS.get(str(label or "").strip().lower(), UNKNOWN)
+
+
+def foreground(device):
+    """
+    (focused window package, focused app package) from dumpsys. A popup
+    window has no package of its own: "" there. None = not reported (focus
+    in transit, or no dumpsys).
+    """
+    try:
+        out = device.shell("dumpsys window | grep -E 'mCurrentFocus|mFocusedApp'")
+    except Exception as e:
+        logger.debug(f"dumpsys window failed: {e}")
+        return None, None
+    focus = FOCUS_RE.search(out or "")
+    app = FOCUSED_APP_RE.search(out or "")
+    window = focus.group(1) if focus else None
+    if window and "." not in window:
+        window = ""     # "PopupWindow:1a2b", ...
+    return window, app.group(1) if app else None
+
+
+class StateClassifier:
+    """
+    Cheap screen classification, most reliable signal first:
+
+    1. focused window from `dumpsys window` (one short shell call):
+       another app, a browser, or a popup over Gmail;
+    2. local frame match inside Gmail: hamburger icon = a list, back arrow
+       = an email, a learned drawer signature = the drawer.
+
+    classify() returns UNKNOWN when neither settles it; the caller then
+    asks vision. Drawer signatures are learned per device (fleet phones
+    differ in size, theme and folders) with remember() the first time the
+    pipeline knows the drawer is open.
+    """
+
+    def __init__(self, package, browsers=BROWSER_PACKAGES):
+        self.package = package
+        self.browsers = browsers
+        self._drawers = {}      # device serial -> drawer panel signature
+        self.stats = {"focus": 0, "template": 0, "signature": 0, "unknown": 0}
+
+    def remember(self, device, state, frame):
+        if state == DRAWER and frame:
+            self._drawers[device.serial] = self._panel(frame)
+
+    def knows_drawer(self, device):
+        return device.serial in self._drawers
+
+    def _panel(self, frame):
+        sig = settle.signature(frame)
+        return sig[:, :int(sig.shape[1] * DRAWER_COLUMNS)]
+
+    def _is_browser(self, package):
+        return package in self.browsers or "browser" in package or "chrome" in package
+
+    def classify(self, device, frame):
+        """Returns (state, signal that decided it)."""
+        window, app = foreground(device)
+        if window == "" and app == self.package:
+            return self._count(POPUP, "focus")
+        package = window or app
+        if package and package != self.package:
+            return self._count(BROWSER if self._is_browser(package) else OUT_OF_APP, "focus")
+
+        if frame:
+            if template_match.match(frame, "hamburger"):
+                return self._count(LIST, "template")
+            if template_match.match(frame, "back_arrow"):
+                return self._count(EMAIL, "template")
+            drawer = self._drawers.get(device.serial)
+            if drawer is not None and settle.difference(self._panel(frame), drawer) <= DRAWER_MAX_DIFF:
+                return self._count(DRAWER, "signature")
+        return self._count(UNKNOWN, "unknown")
+
+    def _count(self, state, signal):
+        self.stats[signal] += 1
+        return state, signal
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['focus']} by window focus, {s['template']} by icon, {s['signature']} by drawer "
+                f"signature, {s['unknown']} left to vision")
@@ -0,0 +1,96 @@
+# screen_targets.py
+# ============================================
+# COMBINED SCREEN ANALYSIS
+# One vision answer per screen, read back as any step's result
+# ============================================
+import logging
+
+logger = logging.getLogger(__name__)
+
+# What each pipeline step looks for, as keys of the analysis "targets"
+MENU, FOLDER, ROWS, EMAIL, UNSUBSCRIBE, CONFIRM = "menu", "folders", "rows", "email", "unsubscribe", "confirm"
+CONFIDENCE_WORDS = {"high": 0.9, "medium": 0.6, "low": 0.3}
+
+
+def confidence(target):
+    """Target confidence as 0..1; numbers and high/medium/low both accepted."""
+    value = target.get("confidence", 1.0) if isinstance(target, dict) else 0.0
+    if isinstance(value, str):
+        return CONFIDENCE_WORDS.get(value.strip().lower(), 0.5)
+    try:
+        return max(0.0, min(1.0, float(value)))
+    except (TypeError, ValueError):
+        return 0.5
+
+
+def _point(target):
+    point = target.get("point") if isinstance(target, dict) else None
+    if isinstance(point, (list, tuple)) and len(point) >= 2:
+        try:
+            return [int(point[0]), int(point[1])]
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _single(target, min_confidence, **fields):
+    """One-point target -> the shape the matching FIND_* prompt returns."""
+    point = _point(target)
+    if point is None:
+        return {"found": False}
+    if confidence(target) < min_confidence:
+        return None
+    result = {"found": True, "point": point, "confidence": confidence(target)}
+    for name, default in fields.items():
+        result[name] = target.get(name) or default
+    return result
+
+
+def extract(analysis, kind, min_confidence=0.5, label=None):
+    """
+    The part of a combined analysis one step needs, shaped like that
+    step's own prompt result.
+
+    Returns {"found": False} when the analysis is sure the target isn't on
+    screen, and None when it can't be trusted (no analysis, malformed, or
+    below `min_confidence`) - the caller then asks the dedicated prompt.
+    """
+    if not isinstance(analysis, dict) or not isinstance(analysis.get("targets"), dict):
+        return None
+    targets = analysis["targets"]
+
+    if kind == MENU:
+        return _single(targets.get(MENU), min_confidence)
+    if kind == UNSUBSCRIBE:
+        return _single(targets.get(UNSUBSCRIBE), min_confidence, link_text="Unsubscribe", url=None)
+    if kind == CONFIRM:
+        return _single(targets.get(CONFIRM), min_confidence, button_text="Confirm")
+    if kind == FOLDER:
+        folders = [f for f in targets.get(FOLDER) or [] if isinstance(f, dict)]
+        wanted = (label or "").lower()
+        matching = [f for f in folders if wanted and wanted in str(f.get("label", "")).lower()]
+        return _single(matching[0] if matching else None, min_confidence, label=label)
+
+    rows = [r for r in targets.get(ROWS) or [] if _point(r)]
+    if kind == ROWS:
+        if rows and all(confidence(r) < min_confidence for r in rows):
+            return None
+        rows = [r for r in rows if confidence(r) >= min_confidence]
+        return {"found": bool(rows), "rows": [{"sender": r.get("sender", ""), "subject": r.get("subject", ""),
+                                                "point": _point(r)} for r in rows]}
+    if kind == EMAIL:
+        # Same choice the single-email prompt makes: first unread row, else the top one
+        fresh = [r for r in rows if r.get("unread")] or rows
+        if not fresh:
+            return {"found": False}
+        return _single(fresh[0], min_confidence, email_subject=fresh[0].get("subject") or "email")
+    raise ValueError(f"unknown target kind {kind!r}")
+
+
+def describe(analysis):
+    """Short log text: screen type and which targets were seen."""
+    if not isinstance(analysis, dict):
+        return "no analysis"
+    targets = analysis.get("targets") or {}
+    seen = [name for name, value in targets.items() if value]
+    return f"{analysis.get('screen_type', '?')} ({', '.join(seen) or 'no targets'})"
@@ -0,0 +1,313 @@
+# session.py
+# ============================================
+# SESSION RECORDING
+# One run's screens, gestures and AI answers, kept for replay.py
+# ============================================
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from PIL import Image
+
+import capture
+import recorder
+from input_channel import DONE_MARKER
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+EVENTS_FILE = "session.jsonl"
+FRAMES_DIR = "frames"       # <pixel digest>.png, one per distinct screen
+BLOBS_DIR = "blobs"         # <sha1>, large non-screen shell output (view dumps)
+STATE_DIR = "state"         # coordinate cache and ledger as the run found them
+INLINE_MAX = 2048           # shell output up to this size stays in the event line
+QUEUE_SIZE = 256
+
+# Shell commands that only read the device; everything else is an action
+QUERIES = ("screencap", "uiautomator", "dumpsys", "getevent", "getprop", "wm size", "pm ")
+SCREENCAPS = ("screencap", "screencap -p")
+SCREEN_QUERIES = ("uiautomator", "dumpsys window")  # output only valid for the screen it was taken on
+
+# Environment knobs that change what the pipeline does on screen; recorded
+# with the session and applied again on replay
+FEATURE_FLAGS = ("VISION_CACHE", "UI_HIERARCHY", "TEMPLATE_MATCH", "INBOX_QUEUE", "COORD_CACHE",
+                 "HEDGE_MODE", "ADB_INPUT_CHANNEL", "ADB_SENDEVENT", "GROQ_IMAGE_FORMAT",
+                 "GEMINI_IMAGE_FORMAT", "FOOTER_MAX_FLINGS", "LEDGER", "HTTP_UNSUBSCRIBE",
+                 "COMBINED_ANALYSIS", "SCREEN_STATE", "LONG_CAPTURE")
+
+
+def command_text(cmdargs):
+    if isinstance(cmdargs, (list, tuple)):
+        cmdargs = " ".join(str(a) for a in cmdargs)
+    return cmdargs.strip()
+
+
+def is_query(cmd):
+    return cmd.startswith(QUERIES)
+
+
+def command_lines(cmd):
+    """One shell call's commands, the way a persistent-shell batch lists them."""
+    return [part.strip() for part in cmd.split(";") if part.strip()]
+
+
+def script_lines(data):
+    """Commands of a batch written to the interactive shell, minus the done-marker echo."""
+    lines = (line.strip() for line in data.decode("utf-8", errors="ignore").splitlines())
+    return [line for line in lines if line and not line.startswith("echo ")]
+
+
+def prompt_id(prompt):
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+# ============================================
+# RECORDING
+# ============================================
+class Recorder:
+    """
+    Writes one session archive: session.jsonl (one event per line, `t` in
+    seconds since the start) plus every distinct screen once as
+    frames/<digest>.png and large shell output once as blobs/<sha1>.
+
+    Events: `query` (read-only shell call and its output), `action`
+    (gesture batch or other shell command), `vision` (analyze_screen
+    prompt, frame and answer), `http` (host-side unsubscribe) and
+    `outcome` (an email's result). Callers only queue; hashing, PNG
+    encoding and writing happen on a background thread, which blocks the
+    caller only if it falls QUEUE_SIZE events behind - a replay needs
+    every event, so nothing is dropped.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        for sub in (FRAMES_DIR, BLOBS_DIR, STATE_DIR):
+            os.makedirs(os.path.join(folder, sub), exist_ok=True)
+        self.stats = {"events": 0, "frames": 0, "blobs": 0}
+        self._start = time.monotonic()
+        self._frames = set(os.path.splitext(n)[0] for n in os.listdir(os.path.join(folder, FRAMES_DIR)))
+        self._blobs = set(os.listdir(os.path.join(folder, BLOBS_DIR)))
+        self._prompts = set()
+        self._file = open(os.path.join(folder, EVENTS_FILE), "a")
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+        self.note(ev="start", version=VERSION, time=round(time.time(), 3))
+
+    def elapsed(self, at=None):
+        return round((time.monotonic() if at is None else at) - self._start, 4)
+
+    def wrap(self, device):
+        return RecordingDevice(device, self)
+
+    def state_path(self, name):
+        return os.path.join(self.folder, STATE_DIR, name)
+
+    def keep(self, name, path):
+        """Copy a state file (e.g. the coordinate cache) into the archive, if it exists."""
+        if path and os.path.exists(path):
+            shutil.copyfile(path, self.state_path(name))
+
+    # --- events (any thread) ---
+    def note(self, ev="note", **fields):
+        self._queue.put(({"ev": ev, **fields}, None))
+
+    def query(self, serial, cmd, output, start, duration, error=None):
+        event = {"ev": "query", "t": self.elapsed(start), "dev": serial, "cmd": cmd, "dur": round(duration, 4)}
+        if error:
+            event["error"] = error
+        self._queue.put((event, output))
+
+    def action(self, serial, lines, start, duration):
+        self._queue.put(({"ev": "action", "t": self.elapsed(start), "dev": serial, "lines": lines,
+                          "dur": round(duration, 4)}, None))
+
+    def vision(self, frame, prompt, result, start, duration):
+        event = {"ev": "vision", "t": self.elapsed(start), "prompt": prompt_id(prompt),
+                 "result": json.loads(json.dumps(result)), "dur": round(duration, 4)}
+        self._queue.put((event, (frame, prompt)))
+
+    def http(self, url, outcome, reason, start, duration):
+        self._queue.put(({"ev": "http", "t": self.elapsed(start), "url": url, "outcome": outcome,
+                          "reason": reason, "dur": round(duration, 4)}, None))
+
+    def outcome(self, serial, sender, subject, outcome):
+        self._queue.put(({"ev": "outcome", "t": self.elapsed(), "dev": serial, "sender": sender,
+                          "subject": subject, "outcome": outcome}, None))
+
+    def close(self, timeout=10.0):
+        """Wait for queued events to reach the disk, then close the archive."""
+        if self._file.closed:
+            return
+        # The writer sets `flushed` once it gets here, i.e. after everything
+        # queued before. Event.wait is real time even when this module's
+        # `time` is a simulated clock.
+        flushed = threading.Event()
+        self._queue.put((None, flushed))
+        flushed.wait(timeout)
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"🎞️ Session: {self.stats['events']} events, {self.stats['frames']} screens "
+                        f"-> {self.folder}")
+
+    # --- writer thread ---
+    def _run(self):
+        while True:
+            event, payload = self._queue.get()
+            try:
+                if event is None:
+                    payload.set()   # close() is waiting for the flush
+                else:
+                    self._write(event, payload)
+            except Exception as e:
+                logger.warning(f"⚠️ Session recorder error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, event, payload):
+        if self._file.closed:
+            return
+        if event["ev"] == "query" and payload is not None:
+            self._store_output(event, payload)
+        elif event["ev"] == "vision":
+            frame, prompt = payload
+            if event["prompt"] not in self._prompts:
+                self._prompts.add(event["prompt"])
+                self._emit({"ev": "prompt", "id": event["prompt"], "text": prompt})
+            if frame:
+                event["frame"] = self._store_frame(frame.image)
+                event["phash"] = format(frame.phash, "x")
+        self._emit(event)
+
+    def _emit(self, event):
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+        self.stats["events"] += 1
+
+    def _store_output(self, event, output):
+        data = output.encode("utf-8") if isinstance(output, str) else bytes(output)
+        if event["cmd"] in SCREENCAPS:
+            image = self._decode_screen(event["cmd"], data)
+            if image is not None:
+                event["frame"] = self._store_frame(image)
+                return
+        if len(data) <= INLINE_MAX:
+            try:
+                event["out"] = data.decode("utf-8")
+                return
+            except UnicodeDecodeError:
+                pass
+        name = hashlib.sha1(data).hexdigest()
+        if name not in self._blobs:
+            with open(os.path.join(self.folder, BLOBS_DIR, name), "wb") as f:
+                f.write(data)
+            self._blobs.add(name)
+            self.stats["blobs"] += 1
+        event["blob"] = name
+
+    def _decode_screen(self, cmd, data):
+        if cmd == "screencap":
+            arr = capture.parse_raw_frame(data)
+            return capture.array_to_image(arr) if arr is not None else None
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            return image
+        except Exception:
+            return None
+
+    def _store_frame(self, image):
+        digest = recorder.frame_digest(image)
+        if digest not in self._frames:
+            image.save(os.path.join(self.folder, FRAMES_DIR, f"{digest}.png"), format="PNG", compress_level=1)
+            self._frames.add(digest)
+            self.stats["frames"] += 1
+        return digest
+
+
+class RecordingDevice:
+    """
+    adbutils device proxy that records every shell call (and every batch
+    written to the persistent input shell) before handing back the result.
+    Anything else is passed through to the real device.
+    """
+
+    def __init__(self, device, session):
+        self.device = device
+        self.serial = device.serial
+        self.session = session
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def shell(self, cmdargs, stream=False, timeout=None, encoding="utf-8", rstrip=True):
+        if stream:
+            return _RecordingShell(self.device.shell(cmdargs, stream=True, timeout=timeout), self)
+        cmd = command_text(cmdargs)
+        start = time.monotonic()
+        try:
+            out = self.device.shell(cmdargs, timeout=timeout, encoding=encoding, rstrip=rstrip)
+        except Exception as e:
+            if is_query(cmd):
+                self.session.query(self.serial, cmd, None, start, time.monotonic() - start, error=str(e))
+            raise
+        if is_query(cmd):
+            self.session.query(self.serial, cmd, out, start, time.monotonic() - start)
+        else:
+            self.session.action(self.serial, command_lines(cmd), start, time.monotonic() - start)
+        return out
+
+
+class _RecordingShell:
+    """Interactive shell passthrough: a batch is recorded once its done marker comes back."""
+
+    def __init__(self, shell, device):
+        self.shell = shell
+        self.conn = getattr(shell, "conn", shell)
+        self.device = device
+        self._pending = None
+        self._buffer = b""
+
+    def send(self, data):
+        self._finish()
+        self._pending = (script_lines(data), time.monotonic())
+        self._buffer = b""
+        return self.shell.send(data)
+
+    def recv(self, n):
+        chunk = self.shell.recv(n)
+        if self._pending:
+            self._buffer += chunk
+            if DONE_MARKER.encode() in self._buffer:
+                self._finish()
+        return chunk
+
+    def _finish(self):
+        if self._pending:
+            lines, start = self._pending
+            self._pending = None
+            if lines:
+                self.device.session.action(self.device.serial, lines, start, time.monotonic() - start)
+
+    def close(self):
+        self._finish()
+        self.shell.close()
+
+
+def from_env(folder):
+    """
+    Recorder for SESSION_RECORD: 1 = a new archive under `folder`, a path =
+    that archive. None when unset or off.
+    """
+    value = os.environ.get("SESSION_RECORD", "0").strip()
+    if value.lower() in ("", "0", "false", "off", "no"):
+        return None
+    if value.lower() in ("1", "true", "on", "yes"):
+        value = os.path.join(folder, time.strftime("%Y%m%d-%H%M%S"))
+    return Recorder(value)
@@ -0,0 +1,133 @@
+# settle.py
+# ============================================
+# SCREEN-SETTLE DETECTION
+# Poll cheap low-res frames instead of fixed sleeps
+# ============================================
+import logging
+import time
+
+import numpy as np
+
+import capture
+import tracing
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_STEP = 8         # keep every 8th pixel in each direction (720x1600 -> 90x200)
+STATUS_BAR = 0.04       # ignore the top 4% (clock, notification icons)
+PIXEL_DELTA = 12        # grey-level change that counts as "this pixel moved"
+CHANGE_THRESHOLD = 0.005  # fraction of moved pixels that counts as "screen changed"
+POLL_INTERVAL = 0.08
+
+
+def signature(source):
+    """
+    Low-res greyscale signature of a frame.
+    Accepts an RGBA array, a ScreenFrame or a PIL image.
+    """
+    if hasattr(source, "array"):
+        source = source.array
+    arr = np.asarray(source)
+    top = int(arr.shape[0] * STATUS_BAR)
+    small = arr[top::SAMPLE_STEP, ::SAMPLE_STEP, :3].astype(np.int16)
+    # Integer luma approximation, vectorized over the whole grid
+    return (small[..., 0] * 2 + small[..., 1] * 5 + small[..., 2]) // 8
+
+
+def grab_signature(device):
+    arr = capture.grab_array(device)
+    if arr is None:
+        arr = np.asarray(capture.grab_png(device))
+    return signature(arr)
+
+
+def difference(a, b):
+    """Fraction of sampled pixels that changed between two signatures."""
+    if a is None or b is None or a.shape != b.shape:
+        return 1.0
+    return float(np.count_nonzero(np.abs(a - b) > PIXEL_DELTA)) / a.size
+
+
+def wait_until_stable(device, timeout=3.0, threshold=CHANGE_THRESHOLD, quiet=0.3):
+    """
+    Return once the screen has stopped changing for `quiet` seconds.
+    Returns True if it settled, False if `timeout` ran out first.
+    """
+    start = time.monotonic()
+    previous = grab_signature(device)
+    still_since = time.monotonic()
+
+    while time.monotonic() - start < timeout:
+        tracing.sleep(POLL_INTERVAL)
+        current = grab_signature(device)
+        if difference(previous, current) > threshold:
+            still_since = time.monotonic()
+        elif time.monotonic() - still_since >= quiet:
+            return True
+        previous = current
+
+    logger.debug(f"Screen still moving after {timeout:.1f}s")
+    return False
+
+
+def wait_for_change(device, before, timeout=2.0, threshold=CHANGE_THRESHOLD):
+    """
+    Return True as soon as the screen differs from `before` (a signature,
+    ScreenFrame or array captured before an action), False on timeout.
+    """
+    if not isinstance(before, np.ndarray) or before.dtype != np.int16:
+        before = signature(before)
+
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if difference(before, grab_signature(device)) > threshold:
+            return True
+        tracing.sleep(POLL_INTERVAL)
+    return False
+
+
+def tap_and_settle(device, tap, before, change_timeout=2.0, settle_timeout=3.0):
+    """
+    Run `tap()`, confirm the screen reacted, then wait for it to settle.
+    Returns False if nothing changed - the caller should retry rather
+    than spend an AI call re-analysing the same screen.
+    """
+    tap()
+    if not wait_for_change(device, before, timeout=change_timeout):
+        return False
+    wait_until_stable(device, timeout=settle_timeout)
+    return True
+
+
+def band(sig, top=0.2, bottom=0.85):
+    """Horizontal strip of a signature, e.g. the scrolling content area."""
+    height = sig.shape[0]
+    return sig[int(height * top):max(int(height * top) + 1, int(height * bottom))]
+
+
+def scroll_to_end(device, fling, jump=None, max_flings=12, threshold=CHANGE_THRESHOLD,
+                  start_timeout=0.4):
+    """
+    Scroll a view to its end and stop as soon as the content stops moving.
+
+    `jump()` (e.g. a MOVE_END keyevent) is tried first; then `fling()` is
+    repeated until a fling either doesn't move the screen within
+    `start_timeout`, or settles with the same content strip as before it
+    (overscroll stretch snaps back before we compare).
+    Returns (reached_end, flings_used).
+    """
+    if jump is not None:
+        jump()
+        wait_until_stable(device, timeout=1.5, quiet=0.15)
+    previous = grab_signature(device)
+
+    for count in range(1, max_flings + 1):
+        fling()
+        if not wait_for_change(device, previous, timeout=start_timeout, threshold=threshold):
+            return True, count
+        wait_until_stable(device, timeout=1.5, quiet=0.15)
+        current = grab_signature(device)
+        if difference(band(previous), band(current)) <= threshold:
+            return True, count
+        previous = current
+    return False, max_flings
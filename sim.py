@@ -0,0 +1,824 @@
+# sim.py
+# ============================================
+# SIMULATED GMAIL + STUB VISION PROVIDERS
+# Run the whole pipeline without a phone or API keys
+# ============================================
+import base64
+import io
+import json
+import math
+import random
+import re
+import threading
+import time as _time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+import roi
+import stitch
+from fake_device import OUTPUT_FOLDER, FakeShell, encode_png, encode_raw
+
+# Screens of the simulated Gmail, each a saved Agent-output frame (720x1560)
+FRAMES = {
+    "launcher": "screen_02-26-27.png",
+    "inbox": "debug_02-09-17.png",
+    "drawer": "debug_02-09-36.png",
+    "promotions": "debug_02-21-25.png",
+    "email": ("debug_02-10-18.png", "debug_02-16-15.png"),  # body pieces of every email
+    "footer": "debug_02-21-35.png",                          # its last screen, with the link
+    "browser": "debug_02-22-04.png",
+    "confirmed": "screen_11-53-47.png",
+}
+
+# Tap targets on those frames: (left, top, right, bottom)
+HAMBURGER = (0, 90, 110, 180)
+DRAWER_PROMOTIONS = (40, 410, 540, 470)
+LIST_HEADER = (29, 235, 162, 268)           # "Primary" / "Promotions" over the list, not clickable
+DRAWER_EDGE = 560                      # taps right of this close the drawer
+ROW_CENTERS = (370, 540, 890, 1060, 1230, 1400)
+ROW_HALF = 60
+ROW_RIGHT = 640                        # star icons live right of this
+UNSUBSCRIBE = (400, 1070, 560, 1105)    # on the footer frame
+CONFIRM = (200, 940, 520, 985)
+LIST_BAND = (300, 1500)                # rows area, shifted to draw later pages
+EMAIL_BAND = (187, 1294)               # scrolling message body (toolbar above, reply bar below)
+SCROLL_UNIT = 600                      # rows a drag this long moves the body; a fling moves two
+FRAME_CACHE = 24                       # encoded frames kept (every scroll position is a frame)
+
+PAGE_ONE = (
+    ("MongoDB", "Introducing the Embedding and Reranking API"),
+    ("Chris at Maven", "ICYMI: Join us next month for FREE courses"),
+    ("Abekus", "We found a Full Stack Developer job"),
+    ("Hack2skill", "Do you want to be the next Kiro Hero?"),
+    ("Naukri Campus", "Ashwin Mehta, Top companies are hiring"),
+    ("Abekus", "We found a Artificial Intelligence job"),
+)
+
+
+class SimClock:
+    """
+    Virtual time for simulated runs: sleep() returns at once and moves
+    the clock forward. Installed as the `time` module of the pipeline
+    modules, so fixed sleeps, settle polling and provider latency all
+    cost simulated seconds instead of real ones.
+    """
+
+    def __init__(self, epoch=None):
+        self.now = 0.0
+        self._epoch = _time.time() if epoch is None else epoch
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def time(self):
+        return self._epoch + self.now
+
+    def time_ns(self):
+        return int(self.time() * 1e9)
+
+    def __getattr__(self, name):
+        return getattr(_time, name)
+
+
+def install_clock(clock, modules):
+    """Point each module's `time` at the clock. Returns an undo function."""
+    saved = [(module, module.time) for module in modules]
+    for module, _ in saved:
+        module.time = clock
+
+    def restore():
+        for module, original in saved:
+            module.time = original
+    return restore
+
+
+def _inside(box, x, y):
+    left, top, right, bottom = box
+    return left <= x <= right and top <= y <= bottom
+
+
+def _center(box):
+    return [(box[0] + box[2]) // 2, (box[1] + box[3]) // 2]
+
+
+class SimGmail:
+    """
+    Scripted Gmail on a fake adbutils device.
+
+    A small state machine (launcher, inbox, drawer, promotions, email,
+    footer, link_menu, browser, confirmed) reacts to the same shell commands the
+    pipeline sends: input tap/swipe/keyevent (also through the persistent
+    input shell), monkey/am, uiautomator dump, dumpsys and screencap.
+    Leaving Gmail (back from the inbox, HOME) keeps its screen for a later
+    monkey launch; only force-stop cold-starts it.
+    Each state serves a real saved frame; for `anim` seconds after a
+    transition the previous frame is still served, like an animation.
+
+    Every email has a random length (flings to its footer); some have no
+    unsubscribe link and some honour MOVE_END. An open email is a viewport
+    over a tall body built from the saved frames: a swipe scrolls it by
+    its finger distance (a fling by 2 * SCROLL_UNIT), and the link sits
+    `link_lift` rows above the bottom of the body, an int or a (lo, hi)
+    range drawn per email. `redirects` is how many
+    pages the link bounces through before the confirm page, or a (lo, hi)
+    range drawn per email. Opening a confirm page
+    counts the email as unsubscribed. With `link_url` (a template with
+    {email}), long-pressing the link pops up its address, served by a
+    SimUnsubscribeServer whose behaviour per email is in emails[i]["http"].
+    """
+
+    def __init__(self, clock, serial="sim-0001", seed=0, pages=4, regions=None,
+                 missing_unsubscribe=0.0, move_end_rate=0.5, redirects=1, tree_text=True,
+                 anim=0.25, shell_latency=0.01, input_latency=0.12, dump_latency=1.0,
+                 link_url=None, http_modes=(0.6, 0.2, 0.2), link_lift=0):
+        self.clock = clock
+        self.serial = serial
+        self.regions = regions or {}
+        self.pages = pages
+        self.tree_text = tree_text
+        self.link_url = link_url
+        self.anim = anim
+        self.shell_latency = shell_latency
+        self.input_latency = input_latency
+        self.dump_latency = dump_latency
+        self.commands = []
+        self.stats = {"taps": 0, "swipes": 0, "keys": 0, "dumps": 0, "screencaps": 0, "opened": 0}
+        self.unsubscribed = set()
+        self.opened = set()
+
+        rng = random.Random(seed)
+        self.emails = [
+            {"length": rng.randint(1, 6),
+             "unsubscribe": rng.random() >= missing_unsubscribe,
+             "move_end": rng.random() < move_end_rate}
+            for _ in range(pages * len(ROW_CENTERS))
+        ]
+        # Own generator, so adding link behaviour didn't reshuffle the emails above
+        links = random.Random(f"links-{seed}")
+        for email in self.emails:
+            email["http"] = links.choices(("one_click", "visit", "form"), weights=http_modes)[0]
+        bounces = random.Random(f"redirects-{seed}")
+        for email in self.emails:
+            email["redirects"] = bounces.randint(*redirects) if isinstance(redirects, tuple) else redirects
+        footers = random.Random(f"footers-{seed}")
+        for email in self.emails:
+            email["lift"] = footers.randint(*link_lift) if isinstance(link_lift, tuple) else link_lift
+
+        self._images = {}
+        self._encoded = OrderedDict()
+        self._body = (None, None)
+        self.state, self.list_state = "launcher", "inbox"
+        self.background = None  # Gmail screen kept while another app is in front
+        self.page = self.email = self.scroll = self.depth = 0
+        self._shown = self._previous = self._key()
+        self._changed_at = -anim
+
+    # --- frames ---
+    def _image(self, name):
+        if name not in self._images:
+            self._images[name] = Image.open(f"{OUTPUT_FOLDER}/{name}").convert("RGBA")
+        return self._images[name]
+
+    def _key(self):
+        if self.state == "promotions":
+            return ("promotions", self.page)
+        if self.state in ("email", "footer", "link_menu"):
+            return ("link_menu" if self.state == "link_menu" else "email", self.email, self.scroll)
+        return (self.state,)
+
+    # --- the open email ---
+    def _max_scroll(self):
+        return self.emails[self.email]["length"] * SCROLL_UNIT
+
+    def _reading(self):
+        """email, or footer once scrolled to the bottom."""
+        return "footer" if self.scroll >= self._max_scroll() else "email"
+
+    def _link_top(self):
+        """Row of the unsubscribe link in the open email's body."""
+        top, bottom = EMAIL_BAND
+        lift = min(self.emails[self.email]["lift"], self._max_scroll())
+        return self._max_scroll() - lift + UNSUBSCRIBE[1] - top
+
+    def _link_box(self):
+        """Screen box of the unsubscribe link if it is fully on screen, else None."""
+        if self.state not in ("email", "footer") or not self.emails[self.email]["unsubscribe"]:
+            return None
+        top, bottom = EMAIL_BAND
+        y = self._link_top() - self.scroll + top
+        height = UNSUBSCRIBE[3] - UNSUBSCRIBE[1]
+        if y < top or y + height > bottom:
+            return None
+        return (UNSUBSCRIBE[0], y, UNSUBSCRIBE[2], y + height)
+
+    def _email_body(self):
+        """The open email's body as one tall RGBA array (built once per email)."""
+        if self._body[0] != self.email:
+            email = self.emails[self.email]
+            top, bottom = EMAIL_BAND
+            height = bottom - top
+            lift = min(email["lift"], self._max_scroll())
+            footer = np.array(self._image(FRAMES["footer"]))[top:bottom]
+            if not email["unsubscribe"]:
+                left, link_top, right, link_bottom = UNSUBSCRIBE
+                footer[link_top - top:link_bottom - top, left:right] = footer[link_top - top, left - 8]
+            # Body pieces: the email frames, rolled so no two pieces look alike
+            pieces, rows = [], self._max_scroll() - lift
+            for k in range(rows // height + 1):
+                piece = np.array(self._image(FRAMES["email"][k % 2]))[top:bottom]
+                pieces.append(np.roll(piece, k * 97, axis=0) if k > 1 else piece)
+            # Legal small print below the link
+            tail = np.roll(np.array(self._image(FRAMES["email"][1]))[top:bottom], 311, axis=0)
+            tail = np.concatenate([tail] * (lift // height + 1))[:lift]
+            self._body = (self.email, np.concatenate([np.concatenate(pieces)[:rows], footer, tail]))
+        return self._body[1]
+
+    def _viewport(self, scroll):
+        img = np.array(self._image(FRAMES["email"][0]))
+        top, bottom = EMAIL_BAND
+        img[top:bottom] = self._email_body()[scroll:scroll + bottom - top]
+        return img
+
+    def _render(self, key):
+        if key[0] == "promotions":
+            img = self._image(FRAMES["promotions"])
+            if key[1]:
+                # Later pages: same layout, rows area shifted so the pixels differ
+                arr = np.array(img)
+                top, bottom = LIST_BAND
+                arr[top:bottom] = np.roll(arr[top:bottom], key[1] * 170, axis=0)
+                img = Image.fromarray(arr)
+            return img
+        if key[0] == "email":
+            return Image.fromarray(self._viewport(key[2]))
+        if key[0] == "link_menu":
+            # Popup over the email: dimmed background is enough to differ
+            return Image.fromarray((self._viewport(key[2]) // 2).astype(np.uint8))
+        return self._image(FRAMES[key[0]])
+
+    def frame(self, fmt="raw"):
+        """Encoded frame currently on screen (mid-animation: the old one)."""
+        key = self._shown if self.clock.monotonic() - self._changed_at >= self.anim else self._previous
+        if key[0] in ("email", "link_menu") and key[1] != self.email:
+            key = self._shown  # the previous email's body is gone; its frames were never grabbed anyway
+        if (key, fmt) not in self._encoded:
+            img = self._render(key)
+            self._encoded[(key, fmt)] = encode_raw(img) if fmt == "raw" else encode_png(img)
+            if len(self._encoded) > FRAME_CACHE:
+                self._encoded.popitem(last=False)
+        self._encoded.move_to_end((key, fmt))
+        return self._encoded[(key, fmt)]
+
+    @property
+    def size(self):
+        return self._image(FRAMES["inbox"]).size
+
+    def _go(self, state):
+        self.state = state
+        key = self._key()
+        if key != self._shown:
+            self._previous, self._shown = self._shown, key
+            self._changed_at = self.clock.monotonic()
+
+    # --- gestures ---
+    def tap(self, x, y):
+        self.stats["taps"] += 1
+        state = self.state
+        if state in ("inbox", "promotions") and _inside(HAMBURGER, x, y):
+            self.list_state = state
+            self._go("drawer")
+        elif state == "promotions" and x <= ROW_RIGHT:
+            for slot, center in enumerate(ROW_CENTERS):
+                if abs(y - center) <= ROW_HALF:
+                    self.email, self.scroll = self.page * len(ROW_CENTERS) + slot, 0
+                    self.opened.add(self.email)
+                    self.stats["opened"] += 1
+                    self._go("email")
+                    break
+        elif state == "drawer":
+            if _inside(DRAWER_PROMOTIONS, x, y):
+                self.page = 0
+                self._go("promotions")
+            elif x > DRAWER_EDGE:
+                self._go(self.list_state)
+        elif state in ("email", "footer") and self._link_box() and _inside(self._link_box(), x, y):
+            self.depth = self.emails[self.email]["redirects"] + 1
+            self._go("browser")
+        elif state == "browser" and _inside(CONFIRM, x, y):
+            self.unsubscribed.add(self.email)
+            self.depth += 1
+            self._go("confirmed")
+
+    def swipe(self, x1, y1, x2, y2, duration_ms):
+        self.stats["swipes"] += 1
+        if (x1, y1) == (x2, y2):
+            # Long-press: link popup on the unsubscribe link, nothing elsewhere
+            if (duration_ms >= 500 and self.link_url and self._link_box()
+                    and _inside(self._link_box(), x1, y1)):
+                self._go("link_menu")
+            return
+        down = y1 > y2  # finger moves up = content scrolls down
+        if self.state in ("email", "footer"):
+            distance = 2 * SCROLL_UNIT if duration_ms <= 100 else abs(y1 - y2)
+            if down:
+                self.scroll = min(self._max_scroll(), self.scroll + distance)
+            else:
+                self.scroll = max(0, self.scroll - distance)
+            self._go(self._reading())
+        elif self.state == "promotions":
+            page = min(self.pages - 1, self.page + 1) if down else max(0, self.page - 1)
+            if page != self.page:
+                self.page = page
+                self._go("promotions")
+
+    def key(self, keycode):
+        self.stats["keys"] += 1
+        state = self.state
+        if keycode == "KEYCODE_MOVE_END" and state == "email" and self.emails[self.email]["move_end"]:
+            self.scroll = self._max_scroll()
+            self._go("footer")
+        elif keycode == "KEYCODE_HOME" and state != "launcher":
+            self._leave()
+        elif keycode != "KEYCODE_BACK":
+            return
+        elif state == "link_menu":
+            self._go(self._reading())
+        elif state in ("browser", "confirmed"):
+            self.depth -= 1
+            self._go("browser" if self.depth > 0 else self._reading())
+        elif state in ("email", "footer"):
+            self._go("promotions")
+        elif state == "drawer":
+            self._go(self.list_state)
+        elif state == "promotions":
+            self._go("inbox")
+        elif state == "inbox":
+            self._leave()
+
+    def _leave(self):
+        """Gmail (or the browser over it) goes to the background."""
+        if self.state in ("browser", "confirmed"):
+            self.depth = 0
+            self.background = self._reading()
+        else:
+            self.background = self.state
+        self._go("launcher")
+
+    # --- adb surface ---
+    def _run(self, cmd):
+        """One shell command (also called line by line by the persistent FakeShell)."""
+        self.commands.append(cmd)
+        parts = cmd.split()
+        if not parts:
+            return
+        if parts[0] == "input":
+            self.clock.sleep(self.input_latency)
+            if parts[1] == "tap":
+                self.tap(int(parts[2]), int(parts[3]))
+            elif parts[1] == "swipe":
+                self.swipe(*(int(p) for p in parts[2:7]))
+            elif parts[1] == "keyevent":
+                for keycode in parts[2:]:
+                    self.key(keycode)
+        elif parts[0] == "monkey":
+            if self.state in ("browser", "confirmed"):
+                # The browser is its own app: Gmail comes back on top of it
+                self.depth = 0
+                self._go(self._reading())
+            elif self.state == "launcher":
+                if self.background is None:
+                    self.list_state = "inbox"
+                self._go(self.background or "inbox")
+                self.background = None
+        elif parts[:2] == ["am", "force-stop"]:
+            self.background = None
+            if self.state not in ("browser", "confirmed"):
+                self._go("launcher")
+        elif parts[0] == "sleep":
+            self.clock.sleep(float(parts[1]))
+
+    def _dump(self):
+        self.stats["dumps"] += 1
+        self.clock.sleep(self.dump_latency)
+        nodes = []
+        if self.tree_text:
+            if self.state == "drawer":
+                nodes.append(("Promotions", DRAWER_PROMOTIONS, True))
+            elif self.state in ("inbox", "promotions"):
+                nodes.append(("Promotions" if self.state == "promotions" else "Primary", LIST_HEADER, False))
+            elif self._link_box():
+                nodes.append(("unsubscribe", self._link_box(), True))
+            elif self.state == "browser":
+                nodes.append(("Confirm", CONFIRM, True))
+        if self.state == "link_menu":
+            nodes.append((self.link_url.format(email=self.email), (40, 700, 680, 760), True))
+        width, height = self.size
+        children = "".join(
+            f'<node text="{text}" content-desc="" clickable="{str(clickable).lower()}" '
+            f'bounds="[{l},{t}][{r},{b}]" />'
+            for text, (l, t, r, b), clickable in nodes
+        )
+        return (f"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+                f'<node text="" content-desc="" clickable="false" bounds="[0,0][{width},{height}]">'
+                f"{children}</node></hierarchy>").encode()
+
+    def shell(self, cmdargs, stream=False, timeout=None, encoding="utf-8", rstrip=True):
+        if isinstance(cmdargs, (list, tuple)):
+            cmdargs = " ".join(str(a) for a in cmdargs)
+        cmd = cmdargs.strip()
+        self.clock.sleep(self.shell_latency)
+        if stream:
+            return FakeShell(self)
+
+        if cmd == "screencap":
+            self.stats["screencaps"] += 1
+            out = self.frame("raw")
+        elif cmd == "screencap -p":
+            self.stats["screencaps"] += 1
+            out = self.frame("png")
+        elif cmd.startswith("uiautomator dump"):
+            out = self._dump()
+        elif cmd.startswith("dumpsys window"):
+            out = self._focus().encode()
+        elif cmd.startswith("dumpsys package"):
+            out = b"    versionName=2026.01.sim"
+        elif cmd == "wm size":
+            out = f"Physical size: {self.size[0]}x{self.size[1]}".encode()
+        else:
+            for part in cmd.split(";"):
+                self._run(part.strip())
+            out = b""
+
+        if encoding is None:
+            return out
+        return out.decode(encoding, errors="ignore")
+
+    def _focus(self):
+        """dumpsys window focus lines for the current screen."""
+        gmail = "com.google.android.gm/.ConversationListActivityGmail"
+        app = {"launcher": "com.sec.android.app.launcher/.activities.LauncherActivity",
+               "browser": "com.android.chrome/org.chromium.chrome.browser.ChromeTabbedActivity",
+               "confirmed": "com.android.chrome/org.chromium.chrome.browser.ChromeTabbedActivity",
+               }.get(self.state, gmail)
+        window = "PopupWindow:5e6f" if self.state == "link_menu" else app
+        return (f"  mCurrentFocus=Window{{3c4d u0 {window}}}\n"
+                f"  mFocusedApp=ActivityRecord{{7a8b u0 {app} t42}}")
+
+    # --- ground truth for the stub providers ---
+    def _rows(self):
+        rows = []
+        for slot, y in enumerate(ROW_CENTERS):
+            email = self.page * len(ROW_CENTERS) + slot
+            sender, subject = PAGE_ONE[slot] if self.page == 0 else (f"Sender {email}", f"Offer #{email}")
+            rows.append({"sender": sender, "subject": subject, "point": [250, y], "id": email})
+        return rows
+
+    def _analysis(self):
+        """Combined-analysis answer: screen type plus every target on screen."""
+        state = self.state
+        screen_type = {"inbox": "inbox_list", "promotions": "inbox_list", "drawer": "side_menu",
+                       "email": "email_open", "footer": "email_footer", "link_menu": "link_menu",
+                       "browser": "browser_page", "confirmed": "browser_page"}.get(state, "other")
+        targets = {}
+        if state in ("inbox", "promotions"):
+            targets["menu"] = {"point": list(_center(HAMBURGER)), "confidence": 0.95}
+        if state == "promotions":
+            targets["rows"] = [{"sender": r["sender"], "subject": r["subject"], "point": r["point"],
+                                "unread": r["id"] not in self.opened, "confidence": 0.9}
+                               for r in self._rows()]
+        elif state == "drawer":
+            targets["folders"] = [{"label": "Promotions", "point": list(_center(DRAWER_PROMOTIONS)),
+                                   "confidence": 0.9}]
+        elif self._link_box():
+            targets["unsubscribe"] = {"point": list(_center(self._link_box())), "link_text": "unsubscribe",
+                                      "url": None, "confidence": 0.85}
+        elif state == "browser":
+            targets["confirm"] = {"point": list(_center(CONFIRM)), "button_text": "Confirm", "confidence": 0.9}
+        return {"app": "Browser" if state in ("browser", "confirmed") else "Gmail",
+                "screen_type": screen_type,
+                "folder_name": "Promotions" if state == "promotions" else None,
+                "targets": targets}
+
+    def _find_link(self, image):
+        """Where the unsubscribe link's pixels are in a (stitched) image, if anywhere."""
+        left, top, right, bottom = UNSUBSCRIBE
+        link = np.asarray(self._image(FRAMES["footer"]).convert("L"))[top:bottom, left:right:4].astype(np.int16)
+        pixels = np.asarray(image.convert("L"))
+        if pixels.shape[1] != self.size[0] or pixels.shape[0] < len(link):
+            return None
+        windows = np.lib.stride_tricks.sliding_window_view(pixels[:, left:right:4].astype(np.int16), link.shape)
+        error = np.abs(windows[:, 0] - link).mean(axis=(1, 2))
+        y = int(error.argmin())
+        return [(left + right) // 2, y + len(link) // 2] if error[y] < 10 else None
+
+    def oracle(self, prompt, image):
+        """What a perfect vision model would answer for the screen on display (or the image sent)."""
+        if prompt.endswith(stitch.LONG_NOTE):
+            # A stitched capture isn't the screen on display: read the image itself
+            point = self._find_link(image)
+            return {"found": True, "point": point, "link_text": "unsubscribe"} if point else {"found": False}
+        image_size = image.size
+        base = prompt[:-len(roi.ROI_NOTE)] if prompt.endswith(roi.ROI_NOTE) else prompt
+        offset = (0, 0)
+        if base != prompt and base in self.regions:
+            offset = roi.crop_box(self.size, self.regions[base])[:2]
+
+        state = self.state
+        if "every target on it" in base:
+            return self._analysis()
+        if "What screen is this?" in base:
+            analysis = self._analysis()
+            return {"screen_type": analysis["screen_type"], "folder_name": analysis["folder_name"]}
+        if "hamburger menu icon" in base:
+            point = _center(HAMBURGER) if state in ("inbox", "promotions") else None
+            result = {"point": point}
+        elif 'Find the "Promotions" folder' in base:
+            result = {"point": _center(DRAWER_PROMOTIONS) if state == "drawer" else None,
+                      "label": "Promotions"}
+        elif "List EVERY email row" in base:
+            rows = self._rows() if state == "promotions" else []
+            return {"found": bool(rows), "rows": [{k: r[k] for k in ("sender", "subject", "point")} for r in rows]}
+        elif "Find a promotional email" in base:
+            rows = self._rows() if state == "promotions" else []
+            # Unread rows are bold; a model picks the first of those, else the top row
+            fresh = [r for r in rows if r["id"] not in self.opened] or rows
+            result = {"point": fresh[0]["point"] if fresh else None,
+                      "email_subject": fresh[0]["subject"] if fresh else ""}
+        elif '"Unsubscribe" or "opt-out"' in base:
+            box = self._link_box()
+            result = {"point": _center(box) if box else None, "link_text": "unsubscribe"}
+        elif "confirmation button" in base:
+            result = {"point": _center(CONFIRM) if state == "browser" else None, "button_text": "Confirm"}
+        else:
+            result = {"point": None}
+
+        point = result.pop("point")
+        if point is None:
+            return {"found": False, **result}
+        x, y = point[0] - offset[0], point[1] - offset[1]
+        if not (0 <= x <= image_size[0] and 0 <= y <= image_size[1]):
+            return {"found": False, **result}
+        return {"found": True, "point": [x, y], **result}
+
+
+# ============================================
+# STAND-IN UNSUBSCRIBE SERVER
+# ============================================
+class _UnsubscribeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling matters
+
+    def setup(self):
+        super().setup()
+        self.server.stats["connections"] += 1
+        self.server.pause(self.server.handshake)  # TCP + TLS set-up of a real ESP
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=""):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _email(self):
+        match = re.search(r"/u/(\d+)", self.path)
+        return int(match.group(1)) if match else None
+
+    def _handle(self, method):
+        server = self.server
+        server.stats["requests"] += 1
+        server.pause(server.latency)
+        email = self._email()
+        mode = server.mode(email)
+        if mode is None:
+            return self._reply(404, "not found")
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode()
+            if mode == "one_click" and "List-Unsubscribe=One-Click" in body:
+                server.unsubscribe(email)
+                return self._reply(200)
+            return self._reply(405, "method not allowed")
+        if mode == "visit":
+            server.unsubscribe(email)
+            return self._reply(200, "<h1>You have been unsubscribed.</h1>")
+        return self._reply(200, '<form method="post"><button>Confirm unsubscribe</button></form>')
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_GET(self):
+        self._handle("GET")
+
+
+class SimUnsubscribeServer(ThreadingHTTPServer):
+    """
+    Local stand-in for ESP unsubscribe endpoints, /u/<email>:
+    one_click takes the RFC 8058 POST, visit unsubscribes on GET, form
+    only serves a confirm form (needs the browser). `handshake` is charged
+    once per connection and `latency` per request, on `clock` if given.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, modes, clock=None, latency=0.15, handshake=0.1):
+        super().__init__(("127.0.0.1", 0), _UnsubscribeHandler)
+        self.modes = modes              # email id -> mode, or a callable
+        self.clock = clock
+        self.latency = latency
+        self.handshake = handshake
+        self.unsubscribed = set()
+        self.stats = {"connections": 0, "requests": 0}
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/u/{{email}}"
+
+    def mode(self, email):
+        if email is None:
+            return None
+        return self.modes(email) if callable(self.modes) else self.modes.get(email)
+
+    def pause(self, seconds):
+        (self.clock or _time).sleep(seconds)
+
+    def unsubscribe(self, email):
+        self.unsubscribed.add(email)
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ============================================
+# STUB PROVIDERS
+# ============================================
+class SimRateLimitError(Exception):
+    """A 429 from a stub provider: message plus response.headers."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Error code: 429 - rate limit exceeded, retry after {retry_after}s")
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+class StubVision:
+    """
+    One simulated provider. Answers come from SimGmail.oracle after a
+    random latency; `error_rate` and `rate_429` inject failures and
+    `rpm` enforces a per-minute quota on the simulated clock.
+    """
+
+    def __init__(self, name, device, clock, latency=0.8, jitter=0.3, error_rate=0.0,
+                 rate_429=0.0, rpm=None, seed=0):
+        self.name = name
+        self.device = device
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.rpm = rpm
+        self.stats = {"calls": 0, "errors": 0, "rate_limited": 0, "bytes": 0}
+        self._rng = random.Random(f"{name}-{seed}")
+        self._recent = deque()
+
+    def answer(self, prompt, payload_bytes, image):
+        self.stats["calls"] += 1
+        self.stats["bytes"] += payload_bytes + len(prompt.encode())
+        now = self.clock.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if (self.rpm and len(self._recent) >= self.rpm) or self._rng.random() < self.rate_429:
+            self.stats["rate_limited"] += 1
+            self.clock.sleep(0.05)
+            wait = 60 - (now - self._recent[0]) if self.rpm and len(self._recent) >= self.rpm else 2
+            raise SimRateLimitError(math.ceil(wait))
+        self._recent.append(now)
+
+        self.clock.sleep(max(0.05, self._rng.gauss(self.latency, self.jitter)))
+        if self._rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise RuntimeError(f"500 simulated {self.name} error")
+        return json.dumps(self.device.oracle(prompt, image))
+
+
+def _image(data):
+    return Image.open(io.BytesIO(data))  # lazy: only the header is read until pixels are needed
+
+
+class _VisionHandler(BaseHTTPRequestHandler):
+    """Groq chat completions and Gemini generateContent, answered by StubVision."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stats["connections"] += 1
+        self.server.pause(self.server.handshake)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/v1beta/models"):
+            return self._reply(200, {"models": [{"name": "models/gemini-2.0-flash-exp",
+                                                 "supportedGenerationMethods": ["generateContent"]}]})
+        self._reply(404, {"error": {"code": 404, "message": "not found"}})
+
+    def do_POST(self):
+        server = self.server
+        server.stats["requests"] += 1
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path.startswith("/openai/v1/chat/completions"):
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self._reply(401, {"error": {"message": "Invalid API Key"}})
+            content = body["messages"][0]["content"]
+            prompt, url = content[0]["text"], content[1]["image_url"]["url"]
+            vision, encoded = server.groq, url.split(",", 1)[1]
+            wrap = lambda text: {"choices": [{"message": {"role": "assistant", "content": text}}]}
+        elif ":generateContent" in self.path:
+            if not self.headers.get("x-goog-api-key"):
+                return self._reply(403, {"error": {"code": 403, "message": "API key not valid"}})
+            parts = body["contents"][0]["parts"]
+            prompt, encoded = parts[0]["text"], parts[1]["inline_data"]["data"]
+            vision = server.gemini
+            wrap = lambda text: {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                                 "finishReason": "STOP"}]}
+        else:
+            return self._reply(404, {"error": {"code": 404, "message": "not found"}})
+
+        try:
+            text = vision.answer(prompt, len(encoded), _image(base64.b64decode(encoded)))
+        except SimRateLimitError as e:
+            return self._reply(429, {"error": {"code": 429, "message": str(e)}}, dict(e.response.headers))
+        except RuntimeError as e:
+            return self._reply(500, {"error": {"code": 500, "message": str(e)}})
+        self._reply(200, wrap(text))
+
+
+class SimVisionServer(ThreadingHTTPServer):
+    """
+    Local stand-in for both provider APIs, so the real vision_api clients
+    (pooling, timeouts, error mapping) run in simulations. Answers come
+    from the two StubVision providers; `handshake` is charged once per
+    connection, on `clock` if given.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, groq, gemini, clock=None, handshake=0.0):
+        super().__init__(("127.0.0.1", 0), _VisionHandler)
+        self.groq = groq
+        self.gemini = gemini
+        self.clock = clock
+        self.handshake = handshake
+        self.stats = {"connections": 0, "requests": 0}
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def groq_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/openai/v1"
+
+    @property
+    def gemini_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1beta"
+
+    def pause(self, seconds):
+        (self.clock or _time).sleep(seconds)
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of a list of numbers."""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    return {f"p{p}": ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)] for p in points}
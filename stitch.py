@@ -0,0 +1,240 @@
+# stitch.py
+# ============================================
+# SCROLL-AND-STITCH LONG CAPTURE
+# Overlapping frames of one email, aligned and stitched into a tall image
+# ============================================
+import logging
+
+import numpy as np
+from PIL import Image
+
+import settle
+from frame import ScreenFrame
+
+logger = logging.getLogger(__name__)
+
+CONTENT_BAND = (0.12, 0.83)   # scrolling part of an open email (toolbar above, reply bar below)
+COLUMN_STEP = 4               # every 4th column is plenty to align rows (720 -> 180)
+MIN_OVERLAP = 0.2             # an alignment must share at least this much of the band
+MAX_RMS = 14.0                # grey-level RMS above which two strips don't match at all
+TIE_RMS = 1.5                 # alignments this close to the best are ties (blank areas)
+EDGE_MARGIN = 60              # keep a tap at least this far from the band edges
+STILL_ROWS = 2                # a drag that moved fewer rows than this hit the top
+
+LONG_NOTE = """
+NOTE: This image is NOT one screen. It is several screens of the SAME email,
+captured while scrolling and stitched top to bottom into one tall image
+(720 pixels wide, much taller than the screen). Search all of it.
+Return "point" in pixel coordinates of THIS tall image (top-left is [0, 0]).
+"""
+
+
+def with_long_note(prompt):
+    """Prompt variant used for stitched long captures."""
+    return prompt + LONG_NOTE
+
+
+def band_box(height, band=CONTENT_BAND):
+    """(top, bottom) screen rows of the scrolling content."""
+    return int(height * band[0]), int(height * band[1])
+
+
+def rows(source):
+    """Greyscale float rows of an RGBA/RGB array (every COLUMN_STEP-th column)."""
+    arr = np.asarray(source)[:, ::COLUMN_STEP, :3].astype(np.float64)
+    return (arr[..., 0] * 2 + arr[..., 1] * 5 + arr[..., 2]) / 8
+
+
+def offset(upper, lower, expected=None, min_overlap=None):
+    """
+    How far down `lower` starts inside `upper` (both row arrays from rows()):
+    the s where lower[i] == upper[s + i] over their overlap.
+
+    Every shift is scored at once: the squared difference expands into
+    row energies (cumulative sums) minus a cross-correlation of the two
+    strips, computed for all shifts with one FFT per strip. Shifts within
+    TIE_RMS of the best are ties (blank areas match anywhere); the one
+    nearest `expected` (e.g. the drag distance) wins.
+    Returns (shift, rms) or None if nothing overlaps convincingly.
+    """
+    hu, hl = len(upper), len(lower)
+    if min_overlap is None:
+        min_overlap = max(1, int(min(hu, hl) * MIN_OVERLAP))
+    if hu < min_overlap or hl < min_overlap or upper.shape[1] != lower.shape[1]:
+        return None
+
+    size = hu + hl
+    spectrum = np.fft.rfft(upper, size, axis=0) * np.fft.rfft(lower, size, axis=0).conj()
+    cross = np.fft.irfft(spectrum.sum(axis=1), size)[:hu]
+
+    upper_energy = np.concatenate(([0.0], np.cumsum((upper ** 2).sum(axis=1))))
+    lower_energy = np.concatenate(([0.0], np.cumsum((lower ** 2).sum(axis=1))))
+    shifts = np.arange(hu)
+    overlap = np.minimum(hl, hu - shifts)
+    ssd = upper_energy[shifts + overlap] - upper_energy[shifts] + lower_energy[overlap] - 2 * cross
+    rms = np.sqrt(np.maximum(ssd, 0) / (overlap * upper.shape[1]))
+    rms[overlap < min_overlap] = np.inf
+
+    best = float(rms.min())
+    if best > MAX_RMS:
+        return None
+    ties = np.flatnonzero(rms <= best + TIE_RMS)
+    shift = int(ties[np.argmin(np.abs(ties - expected))] if expected is not None else rms.argmin())
+    return shift, float(rms[shift])
+
+
+class LongCapture:
+    """
+    Content strips of one scrolling view, each at its position in the
+    stitched image (y of the strip's top row). Strips are added while
+    scrolling up; finish() renumbers them from the topmost one.
+    """
+
+    def __init__(self, band):
+        self.band = band            # (top, bottom) screen rows the strips come from
+        self.strips = []            # RGBA arrays
+        self.rows = []
+        self.positions = []
+        self.reached_top = False
+        self._image = self._rows = None
+
+    @property
+    def band_height(self):
+        return self.band[1] - self.band[0]
+
+    @property
+    def current(self):
+        """Position of the screen on display (the last strip added)."""
+        return self.positions[-1]
+
+    @property
+    def height(self):
+        return max(self.positions) + self.band_height if self.positions else 0
+
+    def strip(self, frame):
+        return np.asarray(ScreenFrame.wrap(frame).array)[self.band[0]:self.band[1]]
+
+    def add(self, strip, position):
+        self.strips.append(strip)
+        self.rows.append(rows(strip))
+        self.positions.append(position)
+        self._image = self._rows = None
+
+    def finish(self):
+        top = min(self.positions)
+        self.positions = [p - top for p in self.positions]
+        return self
+
+    @property
+    def image(self):
+        """The stitched tall image (PIL)."""
+        if self._image is None:
+            canvas = np.zeros((self.height, self.strips[0].shape[1], 4), dtype=np.uint8)
+            canvas[..., 3] = 255
+            for strip, position in sorted(zip(self.strips, self.positions), key=lambda s: s[1]):
+                canvas[position:position + len(strip), :, :strip.shape[2]] = strip
+            self._image = Image.fromarray(canvas, "RGBA")
+        return self._image
+
+    def tiles(self, max_height, overlap):
+        """The stitched image as ScreenFrames no taller than max_height, with their y offsets."""
+        image = self.image
+        if image.height <= max_height:
+            return [ScreenFrame(image)]
+        tiles, top = [], 0
+        while True:
+            bottom = min(image.height, top + max_height)
+            tiles.append(ScreenFrame(image.crop((0, top, image.width, bottom)), (0, top)))
+            if bottom == image.height:
+                return tiles
+            top = bottom - overlap
+
+    def locate(self, frame, expected=None):
+        """Position of a screen's content strip in the stitched image, or None."""
+        if self._rows is None:
+            self._rows = rows(np.asarray(self.image))
+        found = offset(self._rows, rows(self.strip(frame)), expected,
+                       min_overlap=int(self.band_height * MIN_OVERLAP))
+        return found and found[0]
+
+    def to_screen(self, point, position):
+        """Stitched point -> screen point while the view shows `position`; None if off screen."""
+        y = self.band[0] + point[1] - position
+        if not self.band[0] + EDGE_MARGIN <= y <= self.band[1] - EDGE_MARGIN:
+            return None
+        return [int(point[0]), int(y)]
+
+
+def _drag(device, drag, dy, before):
+    """One drag, then wait for the view to move and settle. False = nothing moved."""
+    drag(dy)
+    if not settle.wait_for_change(device, before, timeout=1.0):
+        return False
+    settle.wait_until_stable(device, timeout=1.5, quiet=0.15)
+    return True
+
+
+def capture_up(device, grab, drag, screens=3, step=None):
+    """
+    Long capture from the screen on display upwards: grab, drag the
+    content down by `step` rows, grab again, ... `screens` frames in all,
+    each aligned to the previous one by offset(). Stops early at the top
+    of the view (nothing moved) or if a drag overshot the overlap.
+    `grab()` returns a ScreenFrame; `drag(dy)` moves a finger dy rows
+    (positive = down, towards the top of the content) without flinging.
+    Returns a finished LongCapture, or None if nothing could be grabbed.
+    """
+    frame = grab()
+    if frame is None:
+        return None
+    capture = LongCapture(band_box(frame.height))
+    step = step or capture.band_height // 2
+    capture.add(capture.strip(frame), 0)
+
+    for _ in range(screens - 1):
+        if not _drag(device, drag, step, frame):
+            capture.reached_top = True
+            break
+        frame = grab()
+        if frame is None:
+            break
+        strip = capture.strip(frame)
+        found = offset(rows(strip), capture.rows[-1], expected=step)
+        if found is None:
+            logger.debug("Long capture lost the overlap, stitching what we have")
+            _drag(device, drag, -step, frame)
+            break
+        if found[0] < STILL_ROWS:
+            capture.reached_top = True
+            break
+        capture.add(strip, capture.current - found[0])
+    return capture.finish()
+
+
+def bring_into_view(device, capture, point, grab, drag, moves=3):
+    """
+    Scroll so a stitched-image point is on screen, checking where the view
+    really is (locate) before the first and after every drag.
+    Returns (frame, screen point), or (None, None) if the view couldn't be
+    found in the capture.
+    """
+    frame = grab()
+    position = frame and capture.locate(frame, expected=capture.current)
+    if position is None:
+        return None, None
+    for _ in range(moves + 1):
+        target = capture.to_screen(point, position)
+        if target is not None:
+            return frame, target
+        # Centre the point in the band, one drag of at most a band's height
+        wanted = min(max(0, point[1] - capture.band_height // 2), capture.height - capture.band_height)
+        limit = capture.band_height - 2 * EDGE_MARGIN
+        dy = int(max(-limit, min(limit, position - wanted)))
+        _drag(device, drag, dy, frame)
+        frame = grab()
+        if frame is None:
+            return None, None
+        position = capture.locate(frame, expected=position - dy)
+        if position is None:
+            return None, None
+    return None, None
@@ -0,0 +1,109 @@
+# template_match.py
+# ============================================
+# LOCAL ICON MATCHER
+# Normalized cross-correlation on a downscaled grey frame
+# ============================================
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+SCALE = 0.5          # match at half resolution
+THRESHOLD = 0.75     # NCC score needed to trust a local match
+
+# Icon templates (cut from Agent-output frames) and the fraction of the
+# screen (left, top, right, bottom) they can appear in.
+TEMPLATES = {
+    "hamburger": {"file": "hamburger.png", "window": (0.0, 0.0, 0.25, 0.15)},
+    "back_arrow": {"file": "back_arrow.png", "window": (0.0, 0.0, 0.25, 0.15)},
+    "compose_fab": {"file": "compose_fab.png", "window": (0.4, 0.7, 1.0, 0.95)},
+}
+
+_loaded = {}
+
+
+def _grey(img, scale):
+    if img.mode != "L":
+        img = img.convert("L")
+    if scale != 1:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32)
+
+
+def load_template(name):
+    """Zero-mean, unit-norm template array (cached)."""
+    if name not in _loaded:
+        spec = TEMPLATES[name]
+        arr = _grey(Image.open(os.path.join(TEMPLATE_FOLDER, spec["file"])), SCALE)
+        arr = arr - arr.mean()
+        _loaded[name] = arr / (np.linalg.norm(arr) or 1.0)
+    return _loaded[name]
+
+
+def _box_sums(arr, shape):
+    """Sum of every shape-sized box in `arr`, via an integral image."""
+    h, w = shape
+    ii = np.pad(arr, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+
+
+def ncc(window, template):
+    """
+    Normalized cross-correlation of a zero-mean, unit-norm template at
+    every offset of `window`. Returns an (H-h+1, W-w+1) map in [-1, 1].
+    The correlation runs through an FFT and the per-patch norms through
+    integral images, so cost barely depends on template size.
+    """
+    h, w = template.shape
+    H, W = window.shape
+    size = (H + h - 1, W + w - 1)
+    spectrum = np.fft.rfft2(window, size) * np.fft.rfft2(template[::-1, ::-1], size)
+    numerator = np.fft.irfft2(spectrum, size)[h - 1:H, w - 1:W]
+
+    n = h * w
+    sums = _box_sums(window.astype(np.float64), template.shape)
+    squares = _box_sums(window.astype(np.float64) ** 2, template.shape)
+    norms = np.sqrt(np.maximum(squares - sums * sums / n, 0.0))
+    # Flat patches (no texture at all) can't match an icon
+    return np.where(norms > 1.0, numerator / np.maximum(norms, 1.0), 0.0)
+
+
+def match(image, name, threshold=THRESHOLD):
+    """
+    Find icon `name` in a PIL image (or ScreenFrame).
+    Returns an analyze_screen-shaped dict with full-screen coordinates,
+    or None when the best score is under `threshold`.
+    """
+    if hasattr(image, "image"):
+        image = image.image
+    template = load_template(name)
+    left, top, right, bottom = TEMPLATES[name]["window"]
+    box = (int(left * image.width), int(top * image.height),
+           int(right * image.width), int(bottom * image.height))
+
+    window = _grey(image.crop(box), SCALE)
+    if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+        return None
+
+    scores = ncc(window, template)
+    y, x = np.unravel_index(np.argmax(scores), scores.shape)
+    score = float(scores[y, x])
+    if score < threshold:
+        return None
+
+    th, tw = template.shape
+    cx = box[0] + (x + tw / 2) / SCALE
+    cy = box[1] + (y + th / 2) / SCALE
+    return {
+        "found": True,
+        "point": [int(cx), int(cy)],
+        "confidence": "high" if score >= 0.9 else "medium",
+        "score": round(score, 3),
+        "source": "template",
+    }
@@ -0,0 +1,227 @@
+# tracing.py
+# ============================================
+# PIPELINE TRACING + METRICS
+# Spans to a JSONL trace, counters to a Prometheus textfile
+# ============================================
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "declutter"
+
+# Open spans of the current thread or asyncio task, innermost last. Tasks
+# copy it from whoever started them, so a coroutine's spans nest under the
+# caller's even when they run on another thread's event loop.
+_open_spans = contextvars.ContextVar("open_spans", default=())
+
+
+class _NullSpan:
+    """Shared do-nothing span handed out while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects spans and counters for one process.
+
+    Finished spans are appended to `trace_path` as one JSON object per
+    line (name, start, seconds, thread, id, parent, attrs). Span time per
+    stage and every counter are kept in memory and written as a
+    Prometheus textfile snapshot to `metrics_path` on flush().
+    """
+
+    def __init__(self, trace_path=None, metrics_path=None):
+        self.enabled = True
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.counters = {}      # (name, labels) -> value
+        self.stages = {}        # span name -> [count, seconds]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._file = None
+        if trace_path:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+            self._file = open(trace_path, "a", buffering=1 << 16)
+
+    def record(self, span):
+        with self._lock:
+            stage = self.stages.setdefault(span.name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += span.seconds
+            if self._file is not None:
+                self._file.write(json.dumps({
+                    "name": span.name,
+                    "start": round(span.start, 6),
+                    "seconds": round(span.seconds, 6),
+                    "thread": threading.current_thread().name,
+                    "id": span.id,
+                    "parent": span.parent,
+                    "attrs": span.attrs,
+                }) + "\n")
+
+    def count(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus(self):
+        """Current counters and stage timings in Prometheus text format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            stages = sorted(self.stages.items())
+
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value:g}" if labels else f"{metric} {value:g}")
+
+        if stages:
+            metric = f"{PREFIX}_stage_seconds"
+            lines.append(f"# HELP {metric} Time spent per pipeline stage")
+            lines.append(f"# TYPE {metric} summary")
+            for name, (count, seconds) in stages:
+                lines.append(f'{metric}_sum{{stage="{name}"}} {seconds:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if self.metrics_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.metrics_path)), exist_ok=True)
+                tmp = self.metrics_path + ".tmp"
+                with open(tmp, "w") as f:
+                    f.write(self.prometheus())
+                os.replace(tmp, self.metrics_path)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not write metrics: {e}")
+
+
+class Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent = None
+
+    def set(self, **attrs):
+        """Attach attributes learned inside the span (e.g. result, bytes)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _open_spans.get()
+        self.parent = stack[-1].id if stack else None
+        self._token = _open_spans.set(stack + (self,))
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        try:
+            _open_spans.reset(self._token)
+        except ValueError:
+            pass  # exited in another context than it was entered in
+        self.tracer.record(self)
+        return False
+
+
+_tracer = None
+
+
+def configure(enabled, trace_path=None, metrics_path=None):
+    """Turn tracing on (new Tracer) or off. Returns the active tracer or None."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.flush()
+    _tracer = Tracer(trace_path, metrics_path) if enabled else None
+    return _tracer
+
+
+def from_env(folder):
+    """TRACE=1 enables; TRACE_FILE / METRICS_FILE override the output paths."""
+    enabled = os.environ.get("TRACE", "0").lower() in ("1", "true", "on", "yes")
+    return configure(
+        enabled,
+        os.environ.get("TRACE_FILE", os.path.join(folder, "trace.jsonl")),
+        os.environ.get("METRICS_FILE", os.path.join(folder, "metrics.prom")),
+    )
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; a shared no-op when tracing is off."""
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, name, attrs)
+
+
+def traced(name):
+    """Decorator form of span(); costs one global lookup when tracing is off."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                if _tracer is None:
+                    return await fn(*args, **kwargs)
+                with Span(_tracer, name, {}):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with Span(_tracer, name, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, value=1, **labels):
+    if _tracer is not None:
+        _tracer.count(name, value, labels)
+
+
+def sleep(seconds):
+    """time.sleep that also adds to the sleep_seconds counter."""
+    if _tracer is not None:
+        _tracer.count("sleep_seconds", seconds, {})
+    time.sleep(seconds)
+
+
+def flush():
+    if _tracer is not None:
+        _tracer.flush()
@@ -0,0 +1,128 @@
+# unsubscribe_http.py
+# ============================================
+# HOST-SIDE UNSUBSCRIBE
+# RFC 8058 one-click POST or confirmation GET, no on-device browser
+# ============================================
+import logging
+import re
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import ratelimit
+
+logger = logging.getLogger(__name__)
+
+DONE = "done"
+NEEDS_BROWSER = "needs_browser"     # page wants a click we can't make from here
+FAILED = "failed"
+
+# RFC 8058: POST this form body to the List-Unsubscribe URL
+ONE_CLICK_BODY = {"List-Unsubscribe": "One-Click"}
+USER_AGENT = "Mozilla/5.0 (Linux; Android 13) DeclutterDroid/1.0"
+CONFIRMED_RE = re.compile(
+    r"(have been|successfully|now|been) (unsubscribed|removed|opted[ -]out)"
+    r"|unsubscribed successfully|no longer (receive|get)",
+    re.IGNORECASE,
+)
+MAX_BODY = 256 * 1024               # confirmation text is near the top of any page
+
+
+def _confirmed(response):
+    """2xx and the page says it's done."""
+    return 200 <= response.status_code < 300 and bool(CONFIRMED_RE.search(response.text[:MAX_BODY]))
+
+
+def _one_click_accepted(response):
+    """
+    2xx to the one-click POST with no page to read: 202/204, an empty body
+    or a non-HTML one. That is an RFC 8058 endpoint taking the request; an
+    HTML page only counts if it confirms.
+    """
+    if not 200 <= response.status_code < 300:
+        return False
+    if response.status_code in (202, 204) or not response.content.strip():
+        return True
+    return "html" not in response.headers.get("Content-Type", "").lower() or _confirmed(response)
+
+
+class Unsubscriber:
+    """
+    Performs unsubscribe links from the host over one pooled keep-alive
+    session, instead of opening them in the phone's browser.
+
+    Each URL first gets an RFC 8058 one-click POST; endpoints that don't
+    take it get a GET, which counts only if the page confirms. Anything
+    else (a form to fill in, a captcha, a page that says nothing, errors)
+    is NEEDS_BROWSER or FAILED and the caller taps the link on the device
+    as before.
+
+    `max_concurrency` bounds requests in flight across fleet workers;
+    every domain has its own TokenBucket of `domain_rpm` requests/min so a
+    run full of one sender's mail doesn't hammer its ESP.
+    """
+
+    def __init__(self, max_concurrency=4, domain_rpm=20, timeout=10.0, admission_timeout=5.0,
+                 session=None):
+        self.timeout = (min(3.05, timeout), timeout)    # (connect, read)
+        self.domain_rpm = domain_rpm
+        self.admission_timeout = admission_timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.stats = {"one_click": 0, "confirmed": 0, "needs_browser": 0, "failed": 0, "throttled": 0}
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._domains:
+                self._domains[host] = ratelimit.TokenBucket(self.domain_rpm, capacity=max(1, self.domain_rpm // 6))
+            return self._domains[host]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def unsubscribe(self, url):
+        """Returns (DONE | NEEDS_BROWSER | FAILED, short reason)."""
+        parsed = urlparse(url or "")
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return FAILED, "not a web link"
+        if not self._bucket(parsed.hostname).acquire(1, timeout=self.admission_timeout):
+            self._count("throttled")
+            return NEEDS_BROWSER, f"{parsed.hostname} rate limit"
+
+        with self._slots:
+            try:
+                response = self.session.post(url, data=ONE_CLICK_BODY, timeout=self.timeout)
+                if _one_click_accepted(response):
+                    self._count("one_click")
+                    return DONE, f"one-click POST, HTTP {response.status_code}"
+                if response.status_code == 429:
+                    self._count("throttled")
+                    return NEEDS_BROWSER, "HTTP 429"
+                # Not a one-click endpoint: a plain visit may be enough
+                response = self.session.get(url, timeout=self.timeout)
+                if _confirmed(response):
+                    self._count("confirmed")
+                    return DONE, f"GET, HTTP {response.status_code}"
+                self._count("needs_browser")
+                return NEEDS_BROWSER, f"HTTP {response.status_code}, page needs a click"
+            except requests.RequestException as e:
+                self._count("failed")
+                return FAILED, type(e).__name__
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['one_click']} one-click, {s['confirmed']} by visit, {s['needs_browser']} to browser, "
+                f"{s['failed']} failed, {s['throttled']} throttled")
+
+    def close(self):
+        self.session.close()
@@ -1,6 +1,12 @@
 import adbutils
-import time
+import atexit
+import os
 import logging
+import threading
+
+import settle
+import tracing
+from input_channel import InputChannel, Script
 
 logger = logging.getLogger(__name__)
 
@@ -14,31 +20,89 @@ def get_device():
         logger.error(f"ADB Error: {e}")
         return None
 
+@tracing.traced("adb.launch_app")
 def launch_app(device, package_name):
+    """Cold-start the app; returns once its first screen has drawn and settled."""
     logger.info(f"Restarting {package_name}...")
+    before = settle.grab_signature(device)
     device.shell(f"am force-stop {package_name}")
-    time.sleep(1)
     device.shell(f"monkey -p {package_name} -c android.intent.category.LAUNCHER 1")
-    time.sleep(3)
+    settle.wait_for_change(device, before, timeout=5)
+    settle.wait_until_stable(device, timeout=8, quiet=0.8)
+
+def resume_app(device, package_name):
+    """Bring the app back to the front where it was left (no restart)."""
+    logger.info(f"Resuming {package_name}...")
+    device.shell(f"monkey -p {package_name} -c android.intent.category.LAUNCHER 1")
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+def _enabled(name, default):
+    return os.environ.get(name, default).lower() not in ("0", "false", "off", "no")
 
+def input_channel(device):
+    """
+    Shared input channel for this device. By default it keeps one adb shell
+    open for all gestures; ADB_INPUT_CHANNEL=0 goes back to a new shell per
+    batch, ADB_SENDEVENT=1 injects taps/swipes with sendevent.
+    """
+    with _channels_lock:
+        channel = stale = _channels.get(device.serial)
+        if channel is None or channel.device is not device:
+            channel = InputChannel(device,
+                                   persistent=_enabled("ADB_INPUT_CHANNEL", "1"),
+                                   sendevent=_enabled("ADB_SENDEVENT", "0"))
+            _channels[device.serial] = channel
+        else:
+            stale = None
+    if stale is not None:
+        stale.close()   # a reconnected device: don't leave its old shell open
+    return channel
+
+def close_channels():
+    """Close every device's persistent input shell."""
+    with _channels_lock:
+        channels = list(_channels.values())
+        _channels.clear()
+    for channel in channels:
+        channel.close()
+
+atexit.register(close_channels)
+
+def run_gestures(device, script):
+    """Run a Script of taps/swipes/keys/pauses in one round-trip."""
+    return input_channel(device).run(script)
+
+@tracing.traced("adb.tap")
 def input_tap(device, x, y):
-    device.shell(f"input tap {x} {y}")
+    run_gestures(device, Script().tap(x, y))
 
+@tracing.traced("adb.swipe")
 def input_swipe(device, x1, y1, x2, y2, duration_ms):
-    device.shell(f"input swipe {x1} {y1} {x2} {y2} {duration_ms}")
+    run_gestures(device, Script().swipe(x1, y1, x2, y2, duration_ms))
 
+@tracing.traced("adb.text")
 def input_text(device, text):
     safe_text = text.replace(" ", "%s") 
     device.shell(f"input text '{safe_text}'")
 
+@tracing.traced("adb.back")
 def press_back(device):
     """Press the Android back button."""
-    device.shell("input keyevent KEYCODE_BACK")
+    run_gestures(device, Script().key("KEYCODE_BACK"))
+
+@tracing.traced("adb.move_end")
+def press_move_end(device):
+    """Press MOVE_END (jumps to the bottom of views that support it)."""
+    run_gestures(device, Script().key("KEYCODE_MOVE_END"))
 
+@tracing.traced("adb.home")
 def press_home(device):
     """Press the Android home button."""
-    device.shell("input keyevent KEYCODE_HOME")
+    run_gestures(device, Script().key("KEYCODE_HOME"))
 
+@tracing.traced("adb.recent")
 def press_recent(device):
     """Press the Android recent apps button."""
-    device.shell("input keyevent KEYCODE_APP_SWITCH")
\ No newline at end of file
+    run_gestures(device, Script().key("KEYCODE_APP_SWITCH"))
@@ -0,0 +1,215 @@
+# vision_api.py
+# ============================================
+# PROVIDER HTTP CLIENTS
+# Pooled keep-alive connections, explicit timeouts, async-native calls
+# ============================================
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+MAX_TOKENS = 500
+# A sync caller gives up after this long. Far beyond admission waits plus
+# a full provider fallback chain, so only a stuck loop ever hits it.
+RUN_TIMEOUT = 300.0
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def loop():
+    """The shared event loop sync callers' requests run on (started on first use)."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="vision-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run(coro, timeout=RUN_TIMEOUT):
+    """
+    Sync facade: run `coro` on the shared loop and wait for its result.
+    Calls from many threads (fleet workers) overlap there on the same
+    connection pools. The caller's context (trace spans) goes along.
+    Raises TimeoutError (and cancels `coro`) after `timeout` seconds.
+    """
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("vision_api.run() called on the event loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop())
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"vision call still running after {timeout:g}s, event loop stuck?") from None
+
+
+def shutdown():
+    """Close every client's connections on the shared loop and stop it."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        running, thread = _loop, _loop_thread
+        _loop = _loop_thread = None
+    if running is None:
+        return
+    asyncio.run_coroutine_threadsafe(_close_all(), running).result(timeout=5)
+    running.call_soon_threadsafe(running.stop)
+    thread.join(timeout=5)
+    running.close()
+
+
+_apis = []
+
+
+async def _close_all():
+    for api in list(_apis):
+        await api.aclose()
+
+
+class APIError(Exception):
+    """
+    Non-2xx answer. `status_code` and `response.headers` are what
+    ratelimit.is_rate_limit / retry_after read.
+    """
+
+    def __init__(self, provider, response):
+        self.status_code = response.status_code
+        self.response = response
+        super().__init__(f"Error code: {response.status_code} - {provider}: {response.text[:300]}")
+
+
+class VisionAPI:
+    """
+    One provider's REST API over long-lived httpx clients: keep-alive
+    pools of `max_connections`, `connect_timeout` to reach the host and
+    `timeout` for everything else. aanalyze() is the native coroutine;
+    analyze() is the blocking form for sync code. A client is built per
+    event loop, since httpx async clients can't be shared between loops.
+    httpx itself is only imported when the first client is built.
+    """
+
+    name = "provider"
+
+    def __init__(self, api_key, base_url, timeout=30.0, connect_timeout=5.0, max_connections=8):
+        import httpx
+
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections, keepalive_expiry=120)
+        self._clients = {}
+        self._lock = threading.Lock()
+        _apis.append(self)
+
+    def headers(self):
+        return {}
+
+    def _http(self):
+        import httpx
+
+        running = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(running)
+            if client is None:
+                client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers(),
+                                           timeout=self.timeout, limits=self.limits)
+                self._clients[running] = client
+            return client
+
+    async def _send(self, method, path, **kwargs):
+        response = await self._http().request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise APIError(self.name, response)
+        return response
+
+    async def aanalyze(self, model, prompt, image, max_tokens=MAX_TOKENS):
+        """
+        One vision request. `image` is {"mime_type", "data" (base64)}.
+        Returns (reply text, response headers).
+        """
+        path, body = self.request(model, prompt, image, max_tokens)
+        response = await self._send("POST", path, json=body)
+        return self.reply(response.json()), response.headers
+
+    def analyze(self, model, prompt, image, max_tokens=MAX_TOKENS):
+        """Blocking aanalyze(), run on the shared loop."""
+        return run(self.aanalyze(model, prompt, image, max_tokens))
+
+    async def aclose(self):
+        """Close the client of the running loop."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+class GroqAPI(VisionAPI):
+    """Groq's OpenAI-compatible chat completions."""
+
+    name = "groq"
+
+    def __init__(self, api_key, base_url=GROQ_BASE_URL, **kwargs):
+        super().__init__(api_key, base_url, **kwargs)
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def request(self, model, prompt, image, max_tokens):
+        url = f"data:{image['mime_type']};base64,{image['data']}"
+        return "/chat/completions", {
+            "model": model,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": url}},
+                ],
+            }],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.1,
+            "max_tokens": max_tokens,
+        }
+
+    def reply(self, data):
+        return data["choices"][0]["message"]["content"]
+
+
+class GeminiAPI(VisionAPI):
+    """Gemini generateContent (Generative Language REST API)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key, base_url=GEMINI_BASE_URL, **kwargs):
+        super().__init__(api_key, base_url, **kwargs)
+
+    def headers(self):
+        return {"x-goog-api-key": self.api_key}
+
+    def request(self, model, prompt, image, max_tokens):
+        return f"/models/{model}:generateContent", {
+            "contents": [{"role": "user", "parts": [
+                {"text": prompt},
+                {"inline_data": {"mime_type": image["mime_type"], "data": image["data"]}},
+            ]}],
+            "generationConfig": {"responseMimeType": "application/json", "maxOutputTokens": max_tokens},
+        }
+
+    def reply(self, data):
+        parts = data["candidates"][0]["content"]["parts"]
+        return "".join(part.get("text", "") for part in parts)
+
+    async def alist_models(self):
+        """[{"name", "supportedGenerationMethods", ...}] for this key."""
+        response = await self._send("GET", "/models", params={"pageSize": 1000})
+        return response.json().get("models", [])
+
+    def list_models(self):
+        return run(self.alist_models())
@@ -0,0 +1,197 @@
+# vision_cache.py
+# ============================================
+# PERCEPTUAL-HASH RESPONSE CACHE FOR analyze_screen
+# LRU + per-prompt TTL in memory, optional SQLite tier on disk
+# ============================================
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 16x16 difference hash = 256 bits. A 64-bit hash can't tell two
+# inbox lists apart; 256 bits still ignores clock/battery changes.
+HASH_SIZE = 16
+
+
+def perceptual_hash(pil_image, hash_size=HASH_SIZE):
+    """Difference hash of the downscaled grayscale frame, as an int."""
+    small = pil_image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def prompt_key(prompt, scope=""):
+    """`scope` separates answers that can't be shared, e.g. screen resolutions."""
+    text = f"{scope}\n{prompt}" if scope else prompt
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def is_cacheable(result):
+    """Only remember answers that found something - misses should be retried."""
+    return isinstance(result, dict) and result.get("found", True) is not False
+
+
+class VisionCache:
+    """
+    Remembers analyze_screen results keyed on (prompt, perceptual hash).
+
+    A lookup hits when a stored hash for the same prompt is within
+    `tolerance` bits and younger than the prompt's TTL. The memory tier
+    is an LRU of `capacity` entries; `db_path` adds a SQLite tier that
+    survives restarts.
+    """
+
+    def __init__(self, capacity=256, tolerance=6, default_ttl=3600, ttls=None, db_path=None):
+        self.capacity = capacity
+        self.tolerance = tolerance
+        self.default_ttl = default_ttl
+        self.ttls = {prompt_key(p): ttl for p, ttl in (ttls or {}).items()}
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+        self._entries = OrderedDict()  # (key, phash) -> (created, result)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # --- disk tier ---
+    def _open_db(self, db_path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "prompt TEXT, phash TEXT, created REAL, result TEXT, "
+                "PRIMARY KEY (prompt, phash))"
+            )
+            oldest = time.time() - max([self.default_ttl, *self.ttls.values()])
+            self._db.execute("DELETE FROM responses WHERE created < ?", (oldest,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Vision cache DB unavailable: {e}")
+            self._db = None
+
+    def _disk_lookup(self, key, phash, now, ttl):
+        rows = self._db.execute(
+            "SELECT phash, created, result FROM responses WHERE prompt = ? AND created >= ?",
+            (key, now - ttl),
+        ).fetchall()
+        best = None
+        for hex_hash, created, result in rows:
+            distance = hamming(phash, int(hex_hash, 16))
+            if distance <= self.tolerance and (best is None or distance < best[0]):
+                best = (distance, int(hex_hash, 16), created, result)
+        if best is None:
+            return None
+        _, stored_hash, created, result = best
+        data = json.loads(result)
+        self._remember(key, stored_hash, created, data)
+        return data
+
+    # --- memory tier ---
+    def _ttl(self, prompt):
+        return self.ttls.get(prompt_key(prompt), self.default_ttl)
+
+    def _remember(self, key, phash, created, result):
+        self._entries[(key, phash)] = (created, result)
+        self._entries.move_to_end((key, phash))
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, prompt, pil_image=None, phash=None, scope=""):
+        """Return a copy of a cached result, or None."""
+        key = prompt_key(prompt, scope)
+        ttl = self._ttl(prompt)
+        if ttl <= 0:
+            return None
+        if phash is None:
+            phash = perceptual_hash(pil_image)
+        now = time.time()
+
+        with self._lock:
+            best = None
+            for (k, stored), (created, result) in self._entries.items():
+                if k != key or now - created > ttl:
+                    continue
+                distance = hamming(phash, stored)
+                if distance <= self.tolerance and (best is None or distance < best[0]):
+                    best = (distance, (k, stored), result)
+
+            if best is not None:
+                self._entries.move_to_end(best[1])
+                self.stats["hits"] += 1
+                return copy.deepcopy(best[2])
+
+            if self._db is not None:
+                data = self._disk_lookup(key, phash, now, ttl)
+                if data is not None:
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                    return copy.deepcopy(data)
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, prompt, result, pil_image=None, phash=None, scope=""):
+        key = prompt_key(prompt, scope)
+        if self._ttl(prompt) <= 0 or not is_cacheable(result):
+            return
+        if phash is None:
+            phash = perceptual_hash(pil_image)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, phash, now, copy.deepcopy(result))
+            self.stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                        (key, format(phash, "x"), now, json.dumps(result)),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Vision cache write failed: {e}")
+
+    def invalidate(self, prompt, pil_image=None, phash=None, scope=""):
+        """Drop answers for this prompt near this hash (e.g. the tap did nothing)."""
+        key = prompt_key(prompt, scope)
+        if phash is None:
+            phash = perceptual_hash(pil_image)
+
+        with self._lock:
+            stale = [k for k in self._entries
+                     if k[0] == key and hamming(phash, k[1]) <= self.tolerance]
+            for k in stale:
+                del self._entries[k]
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT phash FROM responses WHERE prompt = ?", (key,)
+                ).fetchall()
+                for (hex_hash,) in rows:
+                    if hamming(phash, int(hex_hash, 16)) <= self.tolerance:
+                        self._db.execute(
+                            "DELETE FROM responses WHERE prompt = ? AND phash = ?", (key, hex_hash)
+                        )
+                self._db.commit()
+
+    def summary(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = (self.stats["hits"] / lookups * 100) if lookups else 0.0
+        return (f"{self.stats['hits']}/{lookups} hits ({rate:.0f}%), "
+                f"{self.stats['disk_hits']} from disk - {self.stats['hits']} API calls avoided")